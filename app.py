@@ -1,15 +1,35 @@
-import os, io, json, uuid, datetime, random, smtplib, time
+import os, io, re, csv, sys, copy, json, fnmatch, contextvars, gzip, zlib, math, uuid, hashlib, mimetypes, bisect, datetime, random, smtplib, time, sqlite3, threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+import multiprocessing
+from contextlib import contextmanager
 from urllib.parse import quote
 from email.mime.text import MIMEText
 from email.utils import formataddr
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, safe_join
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask import Flask, request, render_template, redirect, url_for, send_file, flash, jsonify, abort, session
+from flask import Flask, request, render_template, redirect, url_for, send_file, flash, jsonify, abort, session, g, Response, stream_with_context, stream_template, has_request_context
 import boto3
+import click
 from botocore.config import Config  # timeout/retry 설정
-from openpyxl import Workbook
-from functools import wraps
-from botocore.exceptions import ClientError
+from openpyxl import Workbook, load_workbook
+from docx import Document
+import numpy as np
+from functools import wraps, lru_cache
+from botocore.exceptions import ClientError, HTTPClientError, ConnectionError as BotoConnectionError
+try:
+    import orjson  # 선택: 설치되어 있으면 더 빠른 JSON 코덱 사용
+except ImportError:
+    orjson = None
+try:
+    import brotli  # 선택: 설치되어 있으면 Accept-Encoding: br 응답 지원
+except ImportError:
+    brotli = None
+try:
+    from PIL import Image  # 도면 타일 생성 (없으면 업로드만 비활성)
+except ImportError:
+    Image = None
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "dev-only-change-me")
@@ -37,6 +57,13 @@ USERS_KEY = CATALOG_PREFIX + "auth/users.json"
 INVITES_KEY = CATALOG_PREFIX + "auth/invites.json"
 # ✅ 추가: 메일 이벤트 로그 저장 경로(prefix)
 MAIL_LOG_PREFIX = CATALOG_PREFIX + "logs/mail/"
+# 메일 다이제스트 큐 / 발송 장부(cooldown)
+DIGEST_QUEUE_KEY = CATALOG_PREFIX + "logs/digest/queue.json"
+DIGEST_SENT_KEY = CATALOG_PREFIX + "logs/digest/sent.json"
+# 컴플라이언스 리포트(DOCX/XLSX) 산출물: reports/{ship}/{rev}/..., reports/fleet/{rev}/...
+REPORTS_PREFIX = CATALOG_PREFIX + "reports/"
+# 방폭/IP 컴플라이언스 규칙
+COMPLIANCE_RULES_KEY = CATALOG_PREFIX + "rules/compliance.json"
 
 # 카탈로그 자동 생성
 AUTO_CREATE_CATALOG = os.getenv("AUTO_CREATE_CATALOG", "true").lower() == "true"
@@ -44,6 +71,95 @@ AUTO_CREATE_CATALOG = os.getenv("AUTO_CREATE_CATALOG", "true").lower() == "true"
 # QTY 자동 모드 (읽기만 하고 사용하지 않음)
 AUTO_QTY_ENABLED = os.getenv("AUTO_QTY_ENABLED", "true").lower() == "true"
 
+# 상태 경고 메일을 수신자별 다이제스트로 묶어 발송 (worker마다 DIGEST_FLUSH_INTERVAL_SECONDS 주기로 window 지난 큐 발송)
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "true").lower() == "true"
+DIGEST_WINDOW_MINUTES = int(os.getenv("DIGEST_WINDOW_MINUTES", "60"))
+DIGEST_COOLDOWN_HOURS = int(os.getenv("DIGEST_COOLDOWN_HOURS", "24"))
+DIGEST_FLUSH_INTERVAL_SECONDS = float(os.getenv("DIGEST_FLUSH_INTERVAL_SECONDS", "300"))
+
+# 로컬 SQLite (legacy submissions 테이블 + 이벤트 등)
+DATA_DB_PATH = os.getenv("DATA_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data.db"))
+
+# 관리자 대시보드 실시간 갱신(SSE)
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "1"))
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "25"))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "2000"))
+SSE_EVENT_RETENTION = int(os.getenv("SSE_EVENT_RETENTION", "5000"))
+
+# 카탈로그 변경 저널(델타 동기화)
+JOURNAL_MAX_ENTRIES = int(os.getenv("JOURNAL_MAX_ENTRIES", "200"))
+JOURNAL_MAX_CHANGES_PER_REV = int(os.getenv("JOURNAL_MAX_CHANGES_PER_REV", "500"))
+JOURNAL_MAX_BYTES = int(os.getenv("JOURNAL_MAX_BYTES", str(256 * 1024)))          # 저널 파일 전체 상한(직렬화 기준)
+JOURNAL_MAX_ENTRY_BYTES = int(os.getenv("JOURNAL_MAX_ENTRY_BYTES", str(32 * 1024)))  # 한 rev 변경분이 이보다 크면 reset으로 기록
+
+# 카탈로그 버전 히스토리: 스냅샷 간 최대 델타 수 / 호선당 보관 버전 수
+HISTORY_SNAPSHOT_EVERY = int(os.getenv("HISTORY_SNAPSHOT_EVERY", "50"))
+HISTORY_MAX_VERSIONS = int(os.getenv("HISTORY_MAX_VERSIONS", "1000"))
+
+# 배치 수정 API 1회 요청당 최대 항목 수
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+# 전체 카탈로그 병렬 로드 스레드 수
+CATALOG_FETCH_THREADS = int(os.getenv("CATALOG_FETCH_THREADS", "8"))
+
+# 자동완성 색인 전체 재구축 주기(초) - 다른 worker의 저장분 반영용
+SUGGEST_REBUILD_SECONDS = int(os.getenv("SUGGEST_REBUILD_SECONDS", "600"))
+# worker 간 공유 캐시(카탈로그/연락처): SQLite 파일, 최대 크기, 재검증 주기(초)
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "true").lower() == "true"
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache.db"))
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SHARED_CACHE_REVALIDATE_SECONDS = float(os.getenv("SHARED_CACHE_REVALIDATE_SECONDS", "30"))
+
+# SQL 미러(data.db) ETag 재동기화 주기(초)
+MIRROR_RECONCILE_SECONDS = int(os.getenv("MIRROR_RECONCILE_SECONDS", "300"))
+# legacy 제출 파일(S3) prefix
+LEGACY_SUBMISSIONS_PREFIX = os.getenv("LEGACY_SUBMISSIONS_PREFIX", "submissions/")
+
+# JSON 저장 포맷: compact(기본) + 선택적 gzip(Content-Encoding: gzip)
+S3_JSON_GZIP = os.getenv("S3_JSON_GZIP", "false").lower() == "true"
+S3_JSON_GZIP_MIN_BYTES = int(os.getenv("S3_JSON_GZIP_MIN_BYTES", "1024"))
+S3_JSON_GZIP_LEVEL = int(os.getenv("S3_JSON_GZIP_LEVEL", "6"))
+
+# 도면 뷰어: 타일 크기/JPEG 품질, 포인트 공간 색인 격자 크기(원본 px), 뷰포트당 최대 포인트(초과 시 클러스터)
+VIZ_TILE_SIZE = int(os.getenv("VIZ_TILE_SIZE", "256"))
+VIZ_TILE_QUALITY = int(os.getenv("VIZ_TILE_QUALITY", "80"))
+VIZ_MAX_PIXELS = int(os.getenv("VIZ_MAX_PIXELS", str(40_000_000)))     # 업로드 도면 최대 픽셀 수 (초과 시 거절)
+VIZ_TILE_JOBS = int(os.getenv("VIZ_TILE_JOBS", "1"))                   # worker당 동시 타일 생성 작업 수 (백그라운드)
+SPATIAL_CELL_SIZE = int(os.getenv("SPATIAL_CELL_SIZE", "256"))
+SPATIAL_MAX_POINTS = int(os.getenv("SPATIAL_MAX_POINTS", "2000"))
+
+# HTTP 응답 압축 (HTML/JSON/CSV)
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
+COMPRESS_STREAM_FLUSH_BYTES = int(os.getenv("COMPRESS_STREAM_FLUSH_BYTES", "16384"))
+COMPRESS_MIMETYPES = {"text/html", "application/json", "text/csv", "text/plain", "text/css", "application/javascript"}
+
+# 컴플라이언스 리포트: 재생성 프로세스 수, 저장 후 백그라운드 재생성까지 대기(초, 연속 저장을 1회로 묶음)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+REPORT_REFRESH_DELAY_SECONDS = float(os.getenv("REPORT_REFRESH_DELAY_SECONDS", "30"))
+# 재생성 대상 항목 수가 이보다 적으면 프로세스 풀 없이 현재 프로세스에서 렌더 (spawn 기동 비용이 렌더보다 큼)
+REPORT_PROCESS_MIN_ITEMS = int(os.getenv("REPORT_PROCESS_MIN_ITEMS", "20000"))
+# 등급 문자열 해석 캐시 크기(서로 다른 문자열 수), 컴플라이언스 규칙 재읽기 주기(초)
+GRADE_PARSE_CACHE_SIZE = int(os.getenv("GRADE_PARSE_CACHE_SIZE", "8192"))
+COMPLIANCE_RULES_TTL = float(os.getenv("COMPLIANCE_RULES_TTL", "30"))
+
+# S3 호출 예산: 요청당 S3 총 허용 시간(초, 0이면 무제한), 시도당 읽기 타임아웃 상한(초)
+S3_REQUEST_BUDGET_SECONDS = float(os.getenv("S3_REQUEST_BUDGET_SECONDS", "8"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "5"))
+# 작은 JSON GET hedge: 최근 p95(표본 부족 시 S3_HEDGE_AFTER_MS) 안에 응답이 없으면 같은 GET 1회 추가
+S3_HEDGE_ENABLED = os.getenv("S3_HEDGE_ENABLED", "true").lower() == "true"
+S3_HEDGE_AFTER_MS = float(os.getenv("S3_HEDGE_AFTER_MS", "250"))
+S3_HEDGE_THREADS = int(os.getenv("S3_HEDGE_THREADS", "16"))
+# 서킷 브레이커: 연속 일시 장애 N회면 cooldown(초) 동안 S3 호출 없이 즉시 실패 (읽기는 공유 캐시의 마지막 정상본으로)
+S3_BREAKER_FAILURES = int(os.getenv("S3_BREAKER_FAILURES", "5"))
+S3_BREAKER_COOLDOWN_SECONDS = float(os.getenv("S3_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# 조건부 쓰기(IfMatch) 충돌 시 재시도 횟수 (큐/장부/저널/히스토리 인덱스)
+S3_CAS_RETRIES = int(os.getenv("S3_CAS_RETRIES", "8"))
+
 # 진단/부트스트랩용 토큰 (선택)
 BOOT_TOKEN = os.getenv("BOOT_TOKEN", "")
 
@@ -52,8 +168,8 @@ _BOTO_CONFIG = Config(
     region_name=S3_REGION,
     retries={"max_attempts": 3, "mode": "standard"},
     signature_version="s3v4",
-    connect_timeout=5,
-    read_timeout=10,
+    connect_timeout=min(5, S3_READ_TIMEOUT),
+    read_timeout=S3_READ_TIMEOUT,
 )
 
 # === First-Visit Guard ===
@@ -63,20 +179,279 @@ def _first_visit_guard():
         return None
     if session.get("first_visit_done"):
         return None
-    exempt = {"login", "auth_complete", "static", "health", "file_redirect", "file_inline"}
+    exempt = {"login", "auth_complete", "static", "health", "ready", "file_redirect", "file_inline"}
     if request.endpoint in exempt or (request.path or "").startswith("/static/"):
         return None
     next_path = request.full_path if request.query_string else request.path
     return redirect(url_for("login", next=next_path))
 
-def s3_client():
-    return boto3.client(
+# ================== S3 호출 예산 / 서킷 브레이커 ==================
+# - 요청마다 S3_REQUEST_BUDGET_SECONDS 예산(ContextVar 마감 시각). 남은 예산이 적으면
+#   (1) 읽기 타임아웃이 짧은 client 사용, (2) 재시도 대신 즉시 S3Unavailable
+# - 연속 일시 장애(연결/타임아웃/5xx/throttle)가 S3_BREAKER_FAILURES 회면 open -> cooldown 동안 호출 없이 실패
+#   cooldown 후 1건만 시험(half-open), 성공하면 closed
+# - 실패/없음 구분: 없음(NoSuchKey)은 default, 장애는 S3Unavailable (실패한 읽기로 쓰기를 진행하지 않도록)
+class S3Unavailable(Exception):
+    """S3 일시 장애, 요청 예산 초과, 서킷 open"""
+
+_S3_DEADLINE = contextvars.ContextVar("s3_deadline", default=None)
+_S3_TRANSIENT_CODES = {"SlowDown", "Throttling", "ThrottlingException", "RequestTimeout", "RequestTimeTooSkewed",
+                       "InternalError", "ServiceUnavailable", "500", "502", "503", "504"}
+
+def s3_budget_left():
+    """현재 컨텍스트의 남은 S3 예산(초). 예산 없음(백그라운드 등)이면 None"""
+    d = _S3_DEADLINE.get()
+    return None if d is None else d - time.monotonic()
+
+@contextmanager
+def s3_budget(seconds):
+    """블록 안 S3 호출 전체의 시간 예산 (바깥 예산이 더 짧으면 그쪽 유지)"""
+    d = time.monotonic() + seconds; cur = _S3_DEADLINE.get()
+    token = _S3_DEADLINE.set(d if cur is None else min(cur, d))
+    try:
+        yield
+    finally:
+        _S3_DEADLINE.reset(token)
+
+def s3_budget_seconds(seconds):
+    """라우트별 예산 지정 (None = 무제한: 내보내기/리포트/스트림 등 오래 걸리는 작업)"""
+    def deco(fn):
+        fn._s3_budget = seconds
+        return fn
+    return deco
+
+def _s3_missing(e) -> bool:
+    return isinstance(e, ClientError) and str(e.response.get("Error", {}).get("Code")) in ("NoSuchKey", "404")
+
+def _s3_transient(e) -> bool:
+    if isinstance(e, (S3Unavailable, HTTPClientError, BotoConnectionError)):
+        return True
+    if isinstance(e, ClientError):
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return status >= 500 or str(e.response.get("Error", {}).get("Code")) in _S3_TRANSIENT_CODES
+    return False
+
+class _CircuitBreaker:
+    """closed -> (연속 실패 N회) open -> (cooldown) half-open: 1건만 통과 -> 성공 closed / 실패 open"""
+    def __init__(self, failures, cooldown):
+        self.failures = failures; self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.state = "closed"; self.fails = 0; self.opened_at = 0.0; self._probing = False
+        self.opened = 0; self.rejected = 0
+
+    def is_open(self) -> bool:
+        return self.state == "open" and time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half-open"; self._probing = False
+            if self.state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"; self.fails = 0; self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.fails += 1; self._probing = False
+            if self.state == "half-open" or self.fails >= self.failures:
+                if self.state != "open":
+                    self.opened += 1
+                    print(f"[WARN] S3 circuit open ({self.fails} consecutive failures)")
+                self.state = "open"; self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        left = self.cooldown - (time.monotonic() - self.opened_at) if self.state == "open" else 0
+        return {"state": self.state, "consecutive_failures": self.fails, "opened": self.opened,
+                "rejected": self.rejected, "cooldown_left": round(max(0.0, left), 1)}
+
+_S3_BREAKER = _CircuitBreaker(S3_BREAKER_FAILURES, S3_BREAKER_COOLDOWN_SECONDS)
+
+def _s3_call(fn, *args, **kw):
+    """예산/브레이커 확인 후 호출. 일시 장애는 S3Unavailable로 올리고 브레이커에 반영 (NoSuchKey 등은 정상 응답)"""
+    left = s3_budget_left()
+    if left is not None and left <= 0:
+        raise S3Unavailable("S3 request budget exhausted")
+    if not _S3_BREAKER.allow():
+        raise S3Unavailable("S3 circuit open")
+    try:
+        out = fn(*args, **kw)
+    except Exception as e:
+        if _s3_transient(e):
+            _S3_BREAKER.failure()
+            if isinstance(e, S3Unavailable): raise
+            raise S3Unavailable(str(e)) from e
+        _S3_BREAKER.success()
+        raise
+    _S3_BREAKER.success()
+    return out
+
+def _s3_gate(**kw):
+    """before-call: 브레이커 open 동안은 직접 호출(s3_client().xxx)도 네트워크 없이 실패"""
+    if _S3_BREAKER.is_open():
+        raise S3Unavailable("S3 circuit open")
+
+def _s3_retry_budget(attempts=None, response=None, caught_exception=None, **kw):
+    """needs-retry: 재시도할 상황에서 남은 예산이 (backoff 상한 + 최소 1회 시도)보다 적으면 재시도 없이 실패"""
+    if caught_exception is not None:
+        transient = _s3_transient(caught_exception)
+    else:
+        http, parsed = response if response else (None, {})
+        transient = bool(http is not None and (http.status_code >= 500 or str((parsed or {}).get("Error", {}).get("Code")) in _S3_TRANSIENT_CODES))
+    left = s3_budget_left()
+    if transient and left is not None and left < 2 ** ((attempts or 1) - 1) + 0.5:
+        raise S3Unavailable(f"S3 deadline reached after {attempts} attempt(s)")
+    return None
+
+_S3_CLIENT = {"pid": None, "client": None, "by_timeout": {}}
+_S3_CLIENT_LOCK = threading.Lock()
+
+def _new_s3_client(read_timeout):
+    cfg = _BOTO_CONFIG if read_timeout >= S3_READ_TIMEOUT else _BOTO_CONFIG.merge(
+        Config(read_timeout=read_timeout, connect_timeout=min(read_timeout, _BOTO_CONFIG.connect_timeout)))
+    c = boto3.client(
         "s3",
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
         region_name=S3_REGION,
-        config=_BOTO_CONFIG
+        config=cfg
     )
+    c.meta.events.register("before-call.s3", _s3_gate)
+    c.meta.events.register_first("needs-retry.s3", _s3_retry_budget)
+    return c
+
+def s3_client():
+    """
+    프로세스당 재사용 (boto3 client는 thread-safe, 연결 풀 유지). fork 후에는 새로 생성
+    남은 요청 예산이 S3_READ_TIMEOUT보다 적으면 읽기 타임아웃을 그만큼 줄인 client (1초 단위로 캐시)
+    """
+    if _S3_CLIENT["pid"] != os.getpid():
+        with _S3_CLIENT_LOCK:
+            if _S3_CLIENT["pid"] != os.getpid():
+                _S3_CLIENT["client"] = _new_s3_client(S3_READ_TIMEOUT)
+                _S3_CLIENT["by_timeout"] = {}
+                _S3_CLIENT["pid"] = os.getpid()
+    left = s3_budget_left()
+    if left is None or left >= S3_READ_TIMEOUT:
+        return _S3_CLIENT["client"]
+    t = max(1, int(left))
+    c = _S3_CLIENT["by_timeout"].get(t)
+    if c is None:
+        with _S3_CLIENT_LOCK:
+            c = _S3_CLIENT["by_timeout"].get(t) or _S3_CLIENT["by_timeout"].setdefault(t, _new_s3_client(t))
+    return c
+
+# ---------- 작은 GET hedge ----------
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=S3_HEDGE_THREADS, thread_name_prefix="s3-hedge")
+_GET_LATENCY = deque(maxlen=200)
+_HEDGE_STATS = {"gets": 0, "hedged": 0, "hedge_wins": 0}
+
+def _hedge_delay() -> float:
+    lat = sorted(_GET_LATENCY)
+    if len(lat) < 20:
+        return S3_HEDGE_AFTER_MS / 1000.0
+    return max(0.05, lat[int(len(lat) * 0.95) - 1])
+
+def _s3_get_bytes(key, **kw) -> tuple:
+    """
+    JSON 문서 같은 작은 GET -> (응답 메타, 본문 bytes)
+    hedge 지연(p95) 안에 응답이 없으면 같은 GET을 1번 더 보내 먼저 끝난 쪽 사용. 전체 대기는 남은 예산까지
+    """
+    s3 = s3_client()
+    def _get():
+        t0 = time.perf_counter()
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=key, **kw)
+        body = obj["Body"].read()
+        _GET_LATENCY.append(time.perf_counter() - t0)
+        return obj, body
+    if not S3_HEDGE_ENABLED:
+        return _get()
+    _HEDGE_STATS["gets"] += 1
+    futs = [_HEDGE_POOL.submit(contextvars.copy_context().run, _get)]
+    left = s3_budget_left()
+    delay = _hedge_delay()
+    done, _ = wait(futs, timeout=delay if left is None else max(0.0, min(delay, left)))
+    if not done and (left is None or left > delay):
+        futs.append(_HEDGE_POOL.submit(contextvars.copy_context().run, _get)); _HEDGE_STATS["hedged"] += 1
+    pending = set(futs); err = None
+    while pending:
+        left = s3_budget_left()
+        done, pending = wait(pending, timeout=None if left is None else max(0.0, left), return_when=FIRST_COMPLETED)
+        if not done:
+            raise S3Unavailable(f"S3 request budget exhausted key={key}")
+        for f in done:
+            e = f.exception()
+            if e is None:
+                if f is not futs[0]: _HEDGE_STATS["hedge_wins"] += 1
+                return f.result()
+            if not _s3_transient(e): raise e
+            err = e
+    raise err
+
+def s3_resilience_stats() -> dict:
+    lat = sorted(_GET_LATENCY)
+    pct = lambda q: round(lat[max(0, int(len(lat) * q) - 1)] * 1000, 1) if lat else None
+    return {"breaker": _S3_BREAKER.snapshot(), "hedge": {**_HEDGE_STATS, "delay_ms": round(_hedge_delay() * 1000, 1)},
+            "get_latency_ms": {"samples": len(lat), "p50": pct(0.5), "p95": pct(0.95)},
+            "budget_seconds": S3_REQUEST_BUDGET_SECONDS, "read_timeout": S3_READ_TIMEOUT}
+
+# ---------- stale(마지막 정상본) 표시 ----------
+def _mark_stale(key, validated_at):
+    print(f"[WARN] serving stale copy key={key} (validated {int(time.time() - validated_at)}s ago)")
+    if has_request_context():
+        g.setdefault("s3_stale", {})[key] = validated_at
+
+def is_stale(key=None) -> bool:
+    """이번 요청에서 (key를) S3 대신 공유 캐시의 마지막 정상본으로 읽었는지"""
+    st = g.get("s3_stale") if has_request_context() else None
+    return bool(st) if key is None else bool(st and key in st)
+
+@app.before_request
+def _start_s3_budget():
+    fn = app.view_functions.get(request.endpoint) if request.endpoint else None
+    seconds = getattr(fn, "_s3_budget", S3_REQUEST_BUDGET_SECONDS)
+    if seconds:
+        g._s3_budget_token = _S3_DEADLINE.set(time.monotonic() + seconds)
+
+@app.teardown_request
+def _end_s3_budget(exc=None):
+    token = g.pop("_s3_budget_token", None)
+    if token is not None:
+        try: _S3_DEADLINE.reset(token)
+        except ValueError: _S3_DEADLINE.set(None)
+
+@app.after_request
+def _flag_stale_response(resp):
+    if is_stale():
+        resp.headers["Warning"] = '110 - "Response is Stale"'
+        resp.headers["X-Data-Stale"] = "1"
+    return resp
+
+@app.context_processor
+def _inject_stale():
+    return {"data_stale": is_stale()}
+
+@app.errorhandler(S3Unavailable)
+@app.errorhandler(ClientError)
+@app.errorhandler(HTTPClientError)
+@app.errorhandler(BotoConnectionError)
+def handle_s3_unavailable(e):
+    """헬퍼를 거치지 않은 직접 호출(s3_client().xxx)의 일시 장애도 503으로. 그 밖의 S3 오류는 원래대로 500"""
+    if not _s3_transient(e):
+        raise e
+    print("[WARN] storage unavailable:", e)
+    retry = str(int(S3_BREAKER_COOLDOWN_SECONDS))
+    if request.path.startswith(("/api/", "/diag/")) or request.is_json or request.accept_mimetypes.best == "application/json":
+        return jsonify({"ok": False, "error": "storage unavailable", "detail": str(e)}), 503, {"Retry-After": retry}
+    return Response("저장소(S3) 응답이 지연되고 있습니다. 잠시 후 다시 시도해 주세요.", status=503,
+                    mimetype="text/plain", headers={"Retry-After": retry})
 
 def sts_client():
     return boto3.client(
@@ -95,50 +470,236 @@ def presigned_url(key, expires=3600*24*7):
         ExpiresIn=expires
     )
 
+# ================ JSON 직렬화 ================
+def json_dumps_bytes(data) -> bytes:
+    """공백 없는 compact JSON(UTF-8). orjson이 있으면 사용, 비문자열 키 등은 표준 json으로 fallback"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def json_loads_bytes(raw):
+    """compact/pretty(indent=2) 구분 없이 읽음. gzip 매직바이트면 먼저 해제"""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+def _encode_json_body(data, allow_gzip=True):
+    """-> (body bytes, put_object 추가 인자)"""
+    body = json_dumps_bytes(data)
+    extra = {}
+    if allow_gzip and S3_JSON_GZIP and len(body) >= S3_JSON_GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=S3_JSON_GZIP_LEVEL, mtime=0)
+        extra["ContentEncoding"] = "gzip"
+    return body, extra
+
+def read_json_object(obj):
+    """s3.get_object 응답 -> JSON"""
+    return json_loads_bytes(obj["Body"].read())
+
+def serialization_report(docs: dict, repeat: int = 5) -> dict:
+    """
+    key -> data 묶음에 대해 포맷별 크기/인코딩·디코딩 시간(ms) 비교
+    pretty = 기존 indent=2, compact = json_dumps_bytes, gzip = compact + gzip
+    """
+    def _timeit(fn):
+        t0 = time.perf_counter()
+        for _ in range(repeat): out = fn()
+        return out, (time.perf_counter() - t0) * 1000.0 / repeat
+
+    rows = []; total = {"pretty": 0, "compact": 0, "gzip": 0}
+    for key, data in (docs or {}).items():
+        pretty, enc_pretty = _timeit(lambda: json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8"))
+        compact, enc_compact = _timeit(lambda: json_dumps_bytes(data))
+        gz, enc_gzip = _timeit(lambda: gzip.compress(compact, compresslevel=S3_JSON_GZIP_LEVEL, mtime=0))
+        _, dec_pretty = _timeit(lambda: json.loads(pretty.decode("utf-8")))
+        _, dec_compact = _timeit(lambda: json_loads_bytes(compact))
+        _, dec_gzip = _timeit(lambda: json_loads_bytes(gz))
+        rows.append({
+            "key": key,
+            "bytes": {"pretty": len(pretty), "compact": len(compact), "gzip": len(gz)},
+            "encode_ms": {"pretty": round(enc_pretty, 3), "compact": round(enc_compact, 3), "gzip": round(enc_compact + enc_gzip, 3)},
+            "decode_ms": {"pretty": round(dec_pretty, 3), "compact": round(dec_compact, 3), "gzip": round(dec_gzip, 3)},
+        })
+        total["pretty"] += len(pretty); total["compact"] += len(compact); total["gzip"] += len(gz)
+    saved = {k: (round(100.0 * (1 - total[k] / total["pretty"]), 1) if total["pretty"] else 0.0) for k in ("compact", "gzip")}
+    return {"codec": "orjson" if orjson is not None else "json", "docs": rows, "total_bytes": total, "saved_pct": saved}
+
 # ================ 공통 유틸 ================
 def s3_get_json(key, default=None):
-    s3 = s3_client()
+    """없으면 default. 장애(연결/타임아웃/5xx/예산 초과/브레이커 open)는 S3Unavailable"""
     try:
-        obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-        return json.loads(obj["Body"].read().decode("utf-8"))
-    except Exception:
+        obj, body = _s3_call(_s3_get_bytes, key)
+    except ClientError as e:
+        if _s3_missing(e): return default
+        raise
+    try:
+        return json_loads_bytes(body)
+    except ValueError as e:
+        print(f"[WARN] invalid JSON key={key}: {e}")
         return default
 
 def s3_put_json(key, data):
+    if is_stale(key):
+        # 마지막 정상본(stale)을 바탕으로 만든 데이터로 최신본을 덮어쓰지 않음
+        raise S3Unavailable(f"refusing write: {key} was read from a stale copy in this request")
     s3 = s3_client()
+    _SINGLE_FLIGHT.forget(key)
     try:
-        s3.put_object(
+        body, extra = _encode_json_body(data)
+        resp = _s3_call(s3.put_object,
             Bucket=S3_BUCKET,
             Key=key,
-            Body=json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8"),
-            ContentType="application/json",
-            CacheControl="no-cache, no-store, must-revalidate"
+            Body=body,
+            ContentType="application/json; charset=utf-8",
+            CacheControl="no-cache, no-store, must-revalidate",
+            **extra
         )
     except Exception as e:
         print(f"[ERROR] s3_put_json failed key={key}: {e}")
         raise
+    etag = resp.get("ETag")
+    _after_put_json(key, data, etag)
+    return etag
+
+def _after_put_json(key, data, etag):
+    """쓰기 직후 공통: 해석기 캐시 무효화 + 공유 캐시 write-through"""
+    if key == CONTACTS_KEY:
+        _invalidate_contact_resolver()
+    elif key == COMPLIANCE_RULES_KEY:
+        _COMPLIANCE_RULES["at"] = 0.0
+    if _shared_cacheable(key):
+        try:
+            shared_cache_put(key, data, etag)
+        except Exception as e:
+            print(f"[WARN] shared cache write-through failed key={key}: {e}")
+            try: shared_cache_invalidate(key)
+            except Exception: pass
+
+class S3WriteConflict(Exception):
+    """조건부 쓰기가 S3_CAS_RETRIES 번 모두 다른 쓰기와 충돌"""
+
+def _s3_precondition_failed(e) -> bool:
+    err = e.response.get("Error", {})
+    return str(err.get("Code")) in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409") \
+        or e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") in (409, 412)
+
+def s3_update_json(key, fn, default=None, retries=None, pass_etag=False):
+    """
+    조건부 read-modify-write: GET(ETag) -> fn(data) -> PUT(IfMatch=ETag, 없던 키면 IfNoneMatch="*")
+    사이에 다른 worker/호스트가 썼으면(412/409) 다시 읽어 fn 재적용. fn은 재시도마다 새 data로 호출되며
+    None을 반환하면 쓰지 않음 -> (최종 data, ETag). pass_etag면 fn(data, 읽은 ETag 또는 None)
+    """
+    if is_stale(key):
+        raise S3Unavailable(f"refusing write: {key} was read from a stale copy in this request")
+    s3 = s3_client()
+    retries = S3_CAS_RETRIES if retries is None else retries
+    for attempt in range(retries):
+        try:
+            obj, body = _s3_call(_s3_get_bytes, key)
+            etag = obj.get("ETag")
+            try:
+                data = json_loads_bytes(body)
+            except ValueError as e:
+                print(f"[WARN] invalid JSON key={key}, replacing: {e}")
+                data = copy.deepcopy(default)
+        except ClientError as e:
+            if not _s3_missing(e): raise
+            etag, data = None, copy.deepcopy(default)
+        new = fn(data, etag) if pass_etag else fn(data)
+        if new is None:
+            return data, etag
+        body, extra = _encode_json_body(new)
+        try:
+            resp = _s3_call(s3.put_object, Bucket=S3_BUCKET, Key=key, Body=body,
+                            ContentType="application/json; charset=utf-8",
+                            CacheControl="no-cache, no-store, must-revalidate",
+                            **extra, **({"IfMatch": etag} if etag else {"IfNoneMatch": "*"}))
+        except ClientError as e:
+            if not _s3_precondition_failed(e): raise
+            time.sleep(random.uniform(0.01, 0.05) * (attempt + 1))
+            continue
+        _SINGLE_FLIGHT.forget(key)
+        _after_put_json(key, new, resp.get("ETag"))
+        return new, resp.get("ETag")
+    raise S3WriteConflict(f"{key}: {retries} conditional writes lost to concurrent writers")
+
+# ---------- Single-flight (동일 키 동시 로드 합치기) ----------
+class _SingleFlight:
+    """
+    같은 키에 대한 동시 요청은 먼저 온 1개만 실제로 fetch, 나머지는 그 결과를 기다려 공유.
+    결과는 호출자가 수정할 수 있으므로 대기자에게는 deepcopy를 전달.
+    """
+    class _Call:
+        __slots__ = ("done", "result", "error", "waiters")
+        def __init__(self):
+            self.done = threading.Event(); self.result = None; self.error = None; self.waiters = 0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.issued = 0; self.coalesced = 0; self.errors = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1; self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = self._Call(); self.issued += 1
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None: raise call.error
+            return copy.deepcopy(call.result)
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self._lock: self.errors += 1
+            raise
+        finally:
+            self.forget(key, call)
+            call.done.set()
+        # done 이후엔 대기자가 더 붙지 않음 -> 대기자가 있으면 원본은 그들의 deepcopy용으로 두고 leader도 사본 사용
+        return copy.deepcopy(call.result) if call.waiters else call.result
+
+    def forget(self, key, call=None):
+        """쓰기 후 호출: 진행 중인(쓰기 이전) fetch에 새 요청이 합류하지 않도록 분리"""
+        with self._lock:
+            if call is None or self._calls.get(key) is call:
+                self._calls.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.issued + self.coalesced
+            return {"issued": self.issued, "coalesced": self.coalesced, "errors": self.errors,
+                    "in_flight": len(self._calls), "coalesced_ratio": round(self.coalesced / total, 3) if total else 0.0}
+
+_SINGLE_FLIGHT = _SingleFlight()
 
 # ✅ 추가: 리스트 JSON 전용 get/put + 메일 이벤트 로그 유틸
 def _s3_get_json_list(key):
-    try:
-        obj = s3_client().get_object(Bucket=S3_BUCKET, Key=key)
-        body = obj["Body"].read().decode("utf-8")
-        data = json.loads(body)
-        return data if isinstance(data, list) else []
-    except ClientError as e:
-        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
-            return []
-        raise
-    except Exception:
-        return []
+    """없으면 []. 읽기 장애는 S3Unavailable (빈 목록으로 덮어쓰지 않도록)"""
+    data = s3_get_json(key, default=[])
+    return data if isinstance(data, list) else []
 
 def _s3_put_json_list(key, data_list):
+    body, extra = _encode_json_body(data_list)
     s3_client().put_object(
         Bucket=S3_BUCKET,
         Key=key,
-        Body=json.dumps(data_list, ensure_ascii=False).encode("utf-8"),
+        Body=body,
         ContentType="application/json; charset=utf-8",
-        CacheControl="no-cache, no-store, must-revalidate"
+        CacheControl="no-cache, no-store, must-revalidate",
+        **extra
     )
 
 def log_mail_event(ship: str, category: str, action: str, result: str, purpose: str = None, extra: dict = None):
@@ -186,7 +747,8 @@ def append_activity_log(event: dict):
         try:
             obj = s3.get_object(Bucket=S3_BUCKET, Key=ACTIVITY_LOG_KEY)
             old = obj["Body"].read()
-        except Exception:
+        except ClientError as e:
+            if not _s3_missing(e): raise     # 읽기 실패 시 기존 로그를 덮어쓰지 않음
             old = b""
         line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
         s3.put_object(
@@ -232,8 +794,19 @@ def cleanup_bad_logs():
         except Exception as e:
             print("[WARN] cleanup_bad_logs failed:", e)
 
+def _load_shared(key, default, post=None):
+    """single-flight + 공유 캐시. leader가 마지막 정상본(stale)으로 읽었으면 합류한 요청에도 stale 표시"""
+    def _fetch():
+        data = s3_get_json_cached(key, default=default)
+        stale_at = g.get("s3_stale", {}).get(key) if has_request_context() else None
+        return (post(data) if post else data), stale_at
+    data, stale_at = _SINGLE_FLIGHT.do(key, _fetch)
+    if stale_at is not None and not is_stale(key):
+        _mark_stale(key, stale_at)
+    return data
+
 def get_contacts():
-    return s3_get_json(CONTACTS_KEY, default={"list": []})
+    return _load_shared(CONTACTS_KEY, {"list": []})
 
 def _normalize_contact(name, email, phone):
     name  = (name or "").strip()
@@ -241,6 +814,109 @@ def _normalize_contact(name, email, phone):
     phone = (phone or "").strip()
     return name, email, phone
 
+# ================== 담당자 참조 (contact id) ==================
+# 카탈로그에는 __owners__ = [contact id], item["responsible"] = contact id 만 저장하고
+# 이름/이메일/전화는 읽을 때 contacts.json에서 해석 -> 연락처 수정은 contacts.json 1건 쓰기로 끝남
+# - 연락처에 없는(해석 불가) 담당자는 dict 그대로 보관
+# - dedupe 등으로 합쳐진 id는 contacts["aliases"]로 살아남은 id에 연결
+CONTACT_RESOLVER_TTL = float(os.getenv("CONTACT_RESOLVER_TTL", "5"))
+_CONTACT_RESOLVER = {"at": 0.0, "by_id": {}, "by_name": {}, "by_email": {}}
+_CONTACT_RESOLVER_LOCK = threading.Lock()
+
+def _new_contact_id() -> str:
+    return "c_" + uuid.uuid4().hex[:12]
+
+def _ensure_contact_ids(data: dict) -> bool:
+    changed = False
+    for c in data.get("list") or []:
+        if isinstance(c, dict) and not c.get("id"):
+            c["id"] = _new_contact_id(); changed = True
+    return changed
+
+def _invalidate_contact_resolver():
+    _CONTACT_RESOLVER["at"] = 0.0
+
+def contact_resolver() -> dict:
+    """id/이름/이메일 -> 연락처. CONTACT_RESOLVER_TTL 동안 재사용 (이 프로세스의 contacts 쓰기는 즉시 무효화)"""
+    r = _CONTACT_RESOLVER
+    if time.time() - r["at"] < CONTACT_RESOLVER_TTL:
+        return r
+    with _CONTACT_RESOLVER_LOCK:
+        if time.time() - r["at"] < CONTACT_RESOLVER_TTL:
+            return r
+        r.update(_contact_index(get_contacts() or {}), at=time.time())
+    return r
+
+def _contact_index(data: dict) -> dict:
+    by_id, by_name, by_email = {}, {}, {}
+    for c in data.get("list") or []:
+        if not isinstance(c, dict) or not c.get("id"): continue
+        n, e, p = _normalize_contact(c.get("name"), c.get("email"), c.get("phone"))
+        rec = {"id": c["id"], "name": n, "email": e, "phone": p}
+        by_id[c["id"]] = rec
+        if n: by_name.setdefault(n, rec)
+        if e: by_email.setdefault(e, rec)
+    for old, new in (data.get("aliases") or {}).items():
+        if new in by_id: by_id.setdefault(old, by_id[new])
+    return {"by_id": by_id, "by_name": by_name, "by_email": by_email}
+
+def resolve_contact(ref) -> dict:
+    """contact id(또는 구형 dict) -> {"id","name","email","phone"} 사본"""
+    if isinstance(ref, dict): return dict(ref)
+    if not ref: return {}
+    rec = contact_resolver()["by_id"].get(ref)
+    return dict(rec) if rec else {"id": ref, "name": "", "email": "", "phone": ""}
+
+def resolve_contact_refs(catalog):
+    """저장형(id) 카탈로그의 담당자를 dict로 해석 (in-place, 같은 객체 반환)"""
+    if not isinstance(catalog, dict): return catalog
+    for block in catalog.values():
+        if not isinstance(block, dict): continue
+        if isinstance(block.get("__owners__"), list):
+            block["__owners__"] = [o for o in map(resolve_contact, block["__owners__"]) if o]
+        for eq, info in block.items():
+            if str(eq).startswith("__") or not isinstance(info, dict) or "responsible" not in info: continue
+            info["responsible"] = resolve_contact(info["responsible"])
+    return catalog
+
+def _contact_ref(o, r: dict):
+    """담당자 dict -> contact id (이름 우선, 이름 없으면 이메일로 매칭). 연락처에 없으면 dict 그대로"""
+    if not isinstance(o, dict): return o or ""
+    cid = o.get("id")
+    if cid and cid in r["by_id"]: return r["by_id"][cid]["id"]
+    n, e, p = _normalize_contact(o.get("name"), o.get("email"), o.get("phone"))
+    rec = r["by_name"].get(n) if n else r["by_email"].get(e)
+    if rec: return rec["id"]
+    if cid: return cid
+    return {"name": n, "email": e, "phone": p} if (n or e) else ""
+
+def _store_contact_refs(catalog: dict, r: dict = None) -> dict:
+    """저장용 사본: 담당자 dict -> contact id. 인자로 받은 카탈로그는 건드리지 않음"""
+    r = r or contact_resolver()
+    out = {}
+    for category, block in catalog.items():
+        if not isinstance(block, dict):
+            out[category] = block; continue
+        nb = dict(block)
+        if isinstance(nb.get("__owners__"), list):
+            nb["__owners__"] = [x for x in (_contact_ref(o, r) for o in nb["__owners__"]) if x]
+        for eq, info in block.items():
+            if str(eq).startswith("__") or not isinstance(info, dict) or "responsible" not in info: continue
+            ref = _contact_ref(info["responsible"], r)
+            if ref != info["responsible"]:
+                nb[eq] = {**info, "responsible": ref}
+        out[category] = nb
+    return out
+
+def _has_embedded_contacts(catalog: dict) -> bool:
+    for block in (catalog or {}).values():
+        if not isinstance(block, dict): continue
+        if any(isinstance(o, dict) for o in block.get("__owners__") or []): return True
+        for eq, info in block.items():
+            if not str(eq).startswith("__") and isinstance(info, dict) and isinstance(info.get("responsible"), dict):
+                return True
+    return False
+
 # ================== 담당자 DB(예시 시드) ==================
 responsibles = [
     {"name": "최현서", "email": "jinyeong@hd.com",      "phone": "010-0000-0000"},
@@ -269,9 +945,10 @@ def dedupe_contacts():
         n, e, p = _normalize_contact(c.get("name"), c.get("email"), c.get("phone"))
         if not n and not e:
             continue
-        by_name.setdefault(n, []).append({"name": n, "email": e, "phone": p})
+        by_name.setdefault(n, []).append({"id": c.get("id") or "", "name": n, "email": e, "phone": p})
 
     result = []
+    aliases = dict(data.get("aliases") or {})
     for name, items in by_name.items():
         preferred_email = RESP_EMAIL_OVERRIDE.get(name, "").strip().lower()
         chosen = None
@@ -286,8 +963,14 @@ def dedupe_contacts():
             for it in items:
                 if it.get("phone"):
                     chosen["phone"] = it["phone"]; break
+        # 합쳐지는 항목의 id는 살아남은 id로 연결 (카탈로그 참조 유지)
+        ids = [it["id"] for it in items if it["id"]]
+        chosen["id"] = chosen["id"] or (ids[0] if ids else _new_contact_id())
+        for i in ids:
+            if i != chosen["id"]: aliases[i] = chosen["id"]
         result.append(chosen)
-    s3_put_json(CONTACTS_KEY, {"list": result})
+    aliases = {k: aliases.get(v, v) for k, v in aliases.items() if aliases.get(v, v) != k}
+    s3_put_json(CONTACTS_KEY, {"list": result, "aliases": aliases})
 
 def upsert_contact(name, email, phone):
     name, email, phone = _normalize_contact(name, email, phone)
@@ -306,7 +989,8 @@ def upsert_contact(name, email, phone):
             updated = True
             break
     if not updated:
-        contacts["list"].append({"name": name, "email": email, "phone": phone})
+        contacts["list"].append({"id": _new_contact_id(), "name": name, "email": email, "phone": phone})
+    _ensure_contact_ids(contacts)
     s3_put_json(CONTACTS_KEY, contacts)
     dedupe_contacts()
 
@@ -320,17 +1004,27 @@ def seed_contacts():
 def cleanup_contacts_unified_email():
     data = get_contacts()
     lst = data.get("list", [])
-    cleaned = []
+    cleaned = []; dropped = {}
     for c in lst:
         name, email, phone = _normalize_contact(c.get("name"), c.get("email"), c.get("phone"))
         if email == OLD_UNIFIED_EMAIL and name != "최현서":
+            if c.get("id"): dropped[name] = c["id"]
             continue
-        cleaned.append({"name": name, "email": email, "phone": phone})
-    s3_put_json(CONTACTS_KEY, {"list": cleaned})
+        cleaned.append({"id": c.get("id") or _new_contact_id(), "name": name, "email": email, "phone": phone})
+    s3_put_json(CONTACTS_KEY, {"list": cleaned, "aliases": data.get("aliases") or {}})
     for name, new_email in RESP_EMAIL_OVERRIDE.items():
         upsert_contact(name, new_email, RESP_PHONE_OVERRIDE.get(name, ""))
+    if dropped:
+        # 지운 항목을 참조하던 카탈로그는 같은 이름으로 다시 등록된 연락처로 연결
+        data = get_contacts()
+        ids = {c.get("name"): c.get("id") for c in data.get("list", []) if c.get("id")}
+        aliases = data.setdefault("aliases", {})
+        for name, old in dropped.items():
+            if ids.get(name) and ids[name] != old: aliases[old] = ids[name]
+        s3_put_json(CONTACTS_KEY, data)
 
 def update_catalog_responsibles():
+    """카탈로그 메타/필드 기본값 보정 + 담당자 dict가 남아 있으면 contact id로 전환 (이메일/전화 교정은 contacts.json에서)"""
     s3 = s3_client()
     try:
         resp = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=CATALOG_PREFIX)
@@ -338,11 +1032,9 @@ def update_catalog_responsibles():
             return
         for obj in resp["Contents"]:
             k = obj["Key"]
-            if not k.endswith(".json"): continue
-            if "/contacts/" in k or "/logs/" in k or "/mails/" in k or "/auth/" in k: continue
+            if not _is_catalog_object_key(k): continue
             try:
-                raw = s3.get_object(Bucket=S3_BUCKET, Key=k)["Body"].read()
-                catalog = json.loads(raw.decode("utf-8"))
+                catalog = read_json_object(s3.get_object(Bucket=S3_BUCKET, Key=k))
             except Exception as e:
                 print(f"[WARN] catalog load failed: {k} - {e}")
                 continue
@@ -351,7 +1043,7 @@ def update_catalog_responsibles():
                 print(f"[WARN] skip non-dict catalog: {k}")
                 continue
 
-            changed = False
+            changed = _has_embedded_contacts(catalog)
             for category, eqs in catalog.items():
                 if not isinstance(eqs, dict): continue
                 if "__owners__" not in eqs:
@@ -368,19 +1060,6 @@ def update_catalog_responsibles():
                 for eq_name, info in eqs.items():
                     if isinstance(eq_name, str) and eq_name.startswith("__"): continue
                     if not isinstance(info, dict): continue
-                    resp_info = info.get("responsible") or {}
-                    if not isinstance(resp_info, dict): resp_info = {}
-                    name = (resp_info.get("name") or "").strip()
-                    if name:
-                        new_email = RESP_EMAIL_OVERRIDE.get(name)
-                        new_phone = RESP_PHONE_OVERRIDE.get(name)
-                        cur_email = (resp_info.get("email") or "").strip().lower()
-                        cur_phone = (resp_info.get("phone") or "").strip()
-                        if new_email and cur_email != new_email:
-                            resp_info["email"] = new_email; changed = True
-                        if new_phone and cur_phone != new_phone:
-                            resp_info["phone"] = new_phone; changed = True
-                        info["responsible"] = resp_info
                     if "__deleted__" not in info:
                         info["__deleted__"] = False; changed = True
                     for k2 in ("ex_proof_grade","ip_grade","location","page"):
@@ -388,10 +1067,38 @@ def update_catalog_responsibles():
                             info[k2] = ""; changed = True
                     info["status"] = _recompute_status(info)
             if changed:
-                s3_put_json(k, catalog)
+                save_catalog(_ship_from_catalog_key(k), catalog)
     except Exception as e:
         print("[WARN] update_catalog_responsibles failed:", e)
 
+def migrate_contact_refs(dry_run=False) -> dict:
+    """연락처에 id 부여 후, 담당자를 dict로 품고 있는 카탈로그를 contact id 참조로 1회 변환"""
+    contacts = get_contacts()
+    stats = {"contacts_assigned": sum(1 for c in contacts.get("list", []) if isinstance(c, dict) and not c.get("id")),
+             "catalogs": 0, "migrated": 0, "bytes_before": 0, "bytes_after": 0}
+    if _ensure_contact_ids(contacts) and not dry_run:
+        s3_put_json(CONTACTS_KEY, contacts)
+    index = _contact_index(contacts)
+    s3 = s3_client()
+    for obj in _list_catalog_objects(s3):
+        stats["catalogs"] += 1
+        catalog = read_json_object(s3.get_object(Bucket=S3_BUCKET, Key=obj["Key"]))
+        if not isinstance(catalog, dict) or not _has_embedded_contacts(catalog):
+            continue
+        stats["migrated"] += 1
+        stats["bytes_before"] += len(json.dumps(catalog, ensure_ascii=False).encode("utf-8"))
+        stats["bytes_after"] += len(json.dumps(_store_contact_refs(catalog, index), ensure_ascii=False).encode("utf-8"))
+        if not dry_run:
+            save_catalog(_ship_from_catalog_key(obj["Key"]), catalog)
+    return stats
+
+@app.cli.command("migrate-contacts")
+@click.option("--dry-run", is_flag=True, help="저장하지 않고 변환 대상/크기만 출력")
+def migrate_contacts_command(dry_run):
+    """카탈로그 담당자(dict) -> contact id 참조로 변환"""
+    stats = migrate_contact_refs(dry_run=dry_run)
+    click.echo(json.dumps(stats, ensure_ascii=False))
+
 # ================= Ship 별 Due Date =================
 SHIP_DUE_DATES = {"1": "2025-12-17", "2": "2025-12-18", "3": "2025-12-19"}
 
@@ -434,7 +1141,7 @@ def _assign_random_category_owners(catalog: dict) -> bool:
     pool = []
     for c in contacts:
         n, e, p = _normalize_contact(c.get("name"), c.get("email"), c.get("phone"))
-        if e: pool.append({"name": n, "email": e, "phone": p})
+        if e: pool.append({"id": c.get("id") or "", "name": n, "email": e, "phone": p})
     if len(pool) < 2:
         return False
     changed = False
@@ -448,12 +1155,12 @@ def _assign_random_category_owners(catalog: dict) -> bool:
 
 def load_catalog(ship_number):
     key = _catalog_key(ship_number)
-    catalog = s3_get_json(key, default={})
+    catalog = _load_shared(key, {}, resolve_contact_refs)
     dirty = False
-    if _assign_random_category_owners(catalog):
+    if not is_stale(key) and _assign_random_category_owners(catalog):
         dirty = True
     if dirty:
-        s3_put_json(key, catalog)
+        save_catalog(ship_number, catalog)
     return catalog
 
 def create_catalog(ship_number):
@@ -485,10 +1192,381 @@ def get_or_create_catalog(ship_number, force_reset=False):
     return create_catalog(ship_number)
 
 def save_catalog(ship_number, catalog):
+    """-> 새 저널 rev (변경 없음/저널 기록 실패면 None)"""
     key = _catalog_key(ship_number)
-    s3_put_json(key, catalog)
+    stored = _store_contact_refs(catalog)
+    # 조건부 PUT(IfMatch): 변경분의 기준(prev)이 실제로 덮어쓴 객체와 같음 -> 동시 저장 시 저널 델타가 어긋나지 않음
+    seen = {}
+    def _swap(cur, cur_etag):
+        seen["prev"], seen["etag"] = cur, cur_etag
+        return stored
+    _, etag = s3_update_json(key, _swap, pass_etag=True)
+    prev = seen.get("prev")
+    changes = _diff_catalog(prev if isinstance(prev, dict) else {}, stored)
+    try:
+        mirror_apply(ship_number, stored, changes, etag)
+    except Exception as e:
+        print(f"[WARN] catalog mirror update failed ship={ship_number}: {e}")
+    rev = None
+    try:
+        rev = _journal_append(ship_number, changes, seen.get("etag"), etag)
+    except Exception as e:
+        print(f"[WARN] catalog journal append failed ship={ship_number}: {e}")
+    try:
+        _history_record(ship_number, prev if isinstance(prev, dict) else {}, stored, changes)
+    except Exception as e:
+        print(f"[WARN] catalog history record failed ship={ship_number}: {e}")
+    try:
+        search_index_apply(ship_number, catalog, changes)
+    except Exception as e:
+        print(f"[WARN] search index update failed ship={ship_number}: {e}")
+    try:
+        suggest_index_apply(prev if isinstance(prev, dict) else {}, catalog, changes)
+    except Exception as e:
+        print(f"[WARN] suggest index update failed ship={ship_number}: {e}")
+    try:
+        spatial_index_apply(ship_number, catalog, changes)
+    except Exception as e:
+        print(f"[WARN] spatial index update failed ship={ship_number}: {e}")
+    try:
+        compliance_flags_apply(ship_number, catalog, changes)
+    except Exception as e:
+        print(f"[WARN] compliance flag update failed ship={ship_number}: {e}")
+    try:
+        schedule_report_refresh()
+    except Exception as e:
+        print(f"[WARN] report refresh schedule failed ship={ship_number}: {e}")
+    return rev
+
+# ================= Catalog 리비전 / 변경 저널 =================
+# journal/{ship}.json = {"ship", "rev", "base_rev", "etag", "entries": [{"rev", "ts", "changes": [...]} | {"rev", "ts", "reset": true}]}
+#   etag = 마지막 항목 적용 후의 카탈로그 ETag. 저장의 기준 ETag와 다르면(순서 역전/누락된 append) reset으로 기록
+# change = {"op": "set", "category", "eq", "value"} | {"op": "remove", "category", "eq"} | {"op": "remove", "category"}
+#   eq가 "__owners__" 등 "__" 로 시작하면 카테고리 메타 필드
+def _journal_key(ship_number): return f"{CATALOG_PREFIX}journal/{ship_number}.json"
+
+def _diff_catalog(old: dict, new: dict) -> list:
+    changes = []
+    for category in old:
+        if category not in new:
+            changes.append({"op": "remove", "category": category})
+    for category, block in (new or {}).items():
+        old_block = old.get(category)
+        if not isinstance(block, dict) or not isinstance(old_block, dict):
+            if block != old_block:
+                changes.append({"op": "set", "category": category, "eq": None, "value": block})
+            continue
+        for eq in old_block:
+            if eq not in block:
+                changes.append({"op": "remove", "category": category, "eq": eq})
+        for eq, value in block.items():
+            if old_block.get(eq, _MISSING) != value:
+                changes.append({"op": "set", "category": category, "eq": eq, "value": value})
+    return changes
+
+_MISSING = object()
+
+def apply_catalog_changes(catalog: dict, changes: list) -> dict:
+    """_diff_catalog 결과를 catalog에 적용 (in-place)"""
+    for ch in changes or []:
+        category = ch.get("category"); eq = ch.get("eq")
+        if ch.get("op") == "remove":
+            if eq is None: catalog.pop(category, None)
+            elif isinstance(catalog.get(category), dict): catalog[category].pop(eq, None)
+        elif ch.get("op") == "set":
+            if eq is None: catalog[category] = ch.get("value")
+            else:
+                if not isinstance(catalog.get(category), dict): catalog[category] = {}
+                catalog[category][eq] = ch.get("value")
+    return catalog
+
+def load_catalog_journal(ship_number) -> dict:
+    j = s3_get_json(_journal_key(ship_number), default=None)
+    if not isinstance(j, dict):
+        j = {"ship": str(ship_number), "rev": 0, "base_rev": 0, "entries": []}
+    j.setdefault("rev", 0); j.setdefault("base_rev", 0); j.setdefault("entries", [])
+    return j
+
+def catalog_revision(ship_number) -> int:
+    return int(load_catalog_journal(ship_number).get("rev", 0))
+
+def _journal_entry_bytes(entry) -> int:
+    n = entry.get("bytes")
+    if n is None:
+        n = entry["bytes"] = len(json_dumps_bytes(entry))
+    return n
 
-def _ensure_item(ship_number: str, catalog: dict, category: str, eq: str) -> bool:
+def _journal_append(ship_number, changes: list, base_etag=_MISSING, etag=None):
+    """
+    rev 할당 + 추가를 조건부 PUT(IfMatch)으로 원자적으로 수행 -> 동시 저장이 같은 rev를 받지 않음.
+    항목 값 전체가 들어가므로 개수(JOURNAL_MAX_ENTRIES)와 바이트(JOURNAL_MAX_BYTES) 둘 다로 자름.
+    base_etag/etag = 이 변경분이 카탈로그를 base_etag -> etag 로 바꿨음 (save_catalog). 저널의 etag와
+    base_etag가 다르면 앞 저장의 append가 늦거나 빠졌으므로 변경분 대신 reset
+    """
+    if not changes and (base_etag is _MISSING or base_etag == etag):
+        return None
+    ts = datetime.datetime.now().isoformat(timespec="seconds")
+    body = {"changes": changes}
+    size = len(json_dumps_bytes(changes))
+    if len(changes) > JOURNAL_MAX_CHANGES_PER_REV or size > JOURNAL_MAX_ENTRY_BYTES:
+        body, size = {"reset": True}, 0     # 대량 변경(재생성 등): 클라이언트는 스냅샷을 다시 받음
+
+    def _append(j):
+        if not isinstance(j, dict):
+            j = {"ship": str(ship_number), "rev": 0, "base_rev": 0, "entries": []}
+        j.setdefault("base_rev", 0); entries = j.setdefault("entries", [])
+        ent, ent_size = body, size
+        if base_etag is not _MISSING:
+            if j.get("etag") not in (None, base_etag):
+                ent, ent_size = {"reset": True}, 0
+            elif not changes:
+                # 내용 변화 없는 저장: ETag만 따라감 (같으면 쓰지 않음)
+                if j.get("etag") == etag: return None
+                j["etag"] = etag
+                return j
+            j["etag"] = etag
+        rev = int(j.get("rev", 0)) + 1
+        entries.append({"rev": rev, "ts": ts, **ent, "bytes": ent_size + 64})
+        j["rev"] = rev
+        total = sum(_journal_entry_bytes(e) for e in entries)
+        drop = 0
+        while drop < len(entries) - 1 and (total > JOURNAL_MAX_BYTES or len(entries) - drop > JOURNAL_MAX_ENTRIES):
+            total -= _journal_entry_bytes(entries[drop]); drop += 1
+        if drop:
+            j["entries"] = entries[drop:]
+            j["base_rev"] = j["entries"][0]["rev"] - 1
+        return j
+
+    j, _ = s3_update_json(_journal_key(ship_number), _append)
+    return int(j["rev"]) if isinstance(j, dict) else 0
+
+def catalog_changes_since(ship_number, since: int):
+    """-> (rev, changes) / 저널에서 잘렸거나 reset 이후면 (rev, None) = 스냅샷 필요"""
+    j = load_catalog_journal(ship_number)
+    rev = int(j["rev"])
+    if since > rev or since < int(j["base_rev"]):
+        return rev, None
+    changes = []
+    for ent in j["entries"]:
+        if ent["rev"] <= since: continue
+        if ent.get("reset"): return rev, None
+        changes.extend(ent.get("changes", []))
+    return rev, changes
+
+# ================= Catalog 버전 히스토리 (스냅샷 + 델타) =================
+# history/{ship}/index.json = {"ship", "versions": [{"v", "ts", "actor", "kind": "snapshot"|"delta", "key", "bytes", "summary"}]}
+#   summary는 건수만 (고정 크기) -> 인덱스는 버전 수에만 비례, 저장마다 조건부 PUT(IfMatch)으로 갱신
+# history/{ship}/snap_{v}_{tok}.json = {"__history__": 2, "catalog", "items"}, delta_{v}_{tok}.json = {"__history__": 2, "changes", "items"}
+#   items = 항목 단위 변경 내역 (버전 상세 조회 시에만 읽음). tok은 동시 저장이 같은 v를 잡았을 때 객체를 덮어쓰지 않기 위함
+#   (구버전 객체: 스냅샷 = 카탈로그 dict 그대로, 델타 = 변경 list)
+# 버전 v 복원 = v 이하 마지막 스냅샷 + 이후 델타 순서대로 적용
+def _history_prefix(ship_number): return f"{CATALOG_PREFIX}history/{ship_number}/"
+
+def load_catalog_history(ship_number) -> dict:
+    h = s3_get_json(_history_prefix(ship_number) + "index.json", default=None)
+    if not isinstance(h, dict):
+        h = {"ship": str(ship_number), "versions": []}
+    h.setdefault("versions", [])
+    return h
+
+def _history_payload(obj):
+    """버전 객체 -> (kind 데이터, items). 구버전 형식도 처리"""
+    if isinstance(obj, dict) and obj.get("__history__"):
+        return obj.get("catalog", obj.get("changes")), obj.get("items") or []
+    return obj, []
+
+def _history_actor() -> str:
+    if has_request_context():
+        return (session.get("user") or {}).get("email") or ("admin" if request.path.startswith("/admin") else "anonymous")
+    return "system"
+
+def _history_summary(prev: dict, changes: list, limit: int = 20) -> dict:
+    """항목 단위 변경 요약: 추가/수정/삭제 건수 + 앞쪽 limit건의 변경 필드"""
+    counts = {"added": 0, "updated": 0, "removed": 0, "categories": 0}
+    items = []
+    for ch in changes:
+        category = ch.get("category"); eq = ch.get("eq")
+        if eq is None or str(eq).startswith("__"):
+            counts["categories"] += 1; continue
+        old = ((prev or {}).get(category) or {}).get(eq) if isinstance((prev or {}).get(category), dict) else None
+        if ch.get("op") == "remove":
+            kind, fields = "removed", []
+        elif not isinstance(old, dict):
+            kind, fields = "added", []
+        else:
+            new = ch.get("value") if isinstance(ch.get("value"), dict) else {}
+            kind = "updated"
+            fields = sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+        counts[kind] += 1
+        if len(items) < limit:
+            items.append({"category": category, "eq": eq, "change": kind, "fields": fields})
+    return {**counts, "items": items}
+
+def _history_record(ship_number, prev: dict, catalog: dict, changes: list):
+    """save_catalog 후 호출. 첫 기록이면 저장 직전 상태를 기준 스냅샷으로 남김"""
+    if not changes:
+        return None
+    prefix = _history_prefix(ship_number)
+    ts = datetime.datetime.now().isoformat(timespec="seconds")
+    actor = _history_actor()
+    summary = _history_summary(prev, changes)
+    items = summary.pop("items")
+    delta_body = json_dumps_bytes(changes)
+    snap_size = None
+    written, dropped = [], []
+
+    def _put_version(v, kind, body):
+        key = f"{prefix}{'snap' if kind == 'snapshot' else 'delta'}_{v:08d}_{uuid.uuid4().hex[:8]}.json"
+        s3_put_json(key, {"__history__": 2, **body})
+        written.append(key)
+        return key
+
+    def _append(h):
+        # 재시도마다 최신 인덱스 기준으로 v/kind를 다시 정함 (앞선 시도의 객체는 끝나고 정리)
+        nonlocal snap_size
+        if not isinstance(h, dict):
+            h = {"ship": str(ship_number), "versions": []}
+        versions = h.setdefault("versions", [])
+        for x in versions:
+            if isinstance(x.get("summary"), dict): x["summary"].pop("items", None)   # 구버전 인덱스 축소
+        if not versions and prev:
+            key = _put_version(1, "snapshot", {"catalog": prev, "items": []})
+            versions.append({"v": 1, "ts": ts, "actor": "baseline", "kind": "snapshot", "key": key,
+                             "bytes": len(json_dumps_bytes(prev)), "summary": {}})
+        v = (versions[-1]["v"] + 1) if versions else 1
+        last_snap = max((i for i, x in enumerate(versions) if x["kind"] == "snapshot"), default=None)
+        since_snap = versions[last_snap + 1:] if last_snap is not None else []
+        delta_bytes = sum(x["bytes"] for x in since_snap) + len(delta_body)
+        snap_bytes = versions[last_snap]["bytes"] if last_snap is not None else 0
+        # 델타 누적이 스냅샷 크기를 넘거나 체인이 길어지면 스냅샷 (복원 시 적용할 델타 수 제한)
+        if last_snap is None or len(since_snap) + 1 >= HISTORY_SNAPSHOT_EVERY or delta_bytes >= snap_bytes:
+            if snap_size is None: snap_size = len(json_dumps_bytes(catalog))
+            kind, size = "snapshot", snap_size
+            key = _put_version(v, kind, {"catalog": catalog, "items": items})
+        else:
+            kind, size = "delta", len(delta_body)
+            key = _put_version(v, kind, {"changes": changes, "items": items})
+        versions.append({"v": v, "ts": ts, "actor": actor, "kind": kind, "key": key, "bytes": size, "summary": summary})
+        dropped[:] = _history_prune(h)
+        return h
+
+    try:
+        h, _ = s3_update_json(prefix + "index.json", _append, default=None)
+    except Exception:
+        _history_delete(written)
+        raise
+    live = {x["key"] for x in h["versions"]}
+    _history_delete([k for k in written if k not in live] + dropped)
+    return h["versions"][-1]["v"]
+
+def _history_delete(keys):
+    s3 = s3_client()
+    for key in keys:
+        try:
+            s3.delete_object(Bucket=S3_BUCKET, Key=key)
+        except Exception as e:
+            print(f"[WARN] history cleanup failed key={key}: {e}")
+
+def _history_prune(h: dict) -> list:
+    """HISTORY_MAX_VERSIONS 초과 시 맨 앞 스냅샷 구간 단위로 잘라냄 (남은 첫 버전은 항상 스냅샷) -> 지울 객체 키"""
+    versions = h["versions"]
+    drop = 0
+    while len(versions) - drop > HISTORY_MAX_VERSIONS:
+        nxt = next((i for i in range(drop + 1, len(versions)) if versions[i]["kind"] == "snapshot"), None)
+        if nxt is None: break
+        drop = nxt
+    if not drop: return []
+    h["versions"] = versions[drop:]
+    return [x["key"] for x in versions[:drop]]
+
+def _history_target(versions: list, v: int = None, at: str = None):
+    if v is not None:
+        return next((i for i, x in enumerate(versions) if x["v"] == v), None)
+    if at:
+        cands = [i for i, x in enumerate(versions) if x["ts"] <= at]
+        return cands[-1] if cands else None
+    return len(versions) - 1 if versions else None
+
+def catalog_at(ship_number, v: int = None, at: str = None):
+    """버전 번호 또는 시각(ISO, 그 시각 이전 마지막 버전) 기준 카탈로그 재구성 -> (version, catalog) | (None, None)"""
+    versions = load_catalog_history(ship_number)["versions"]
+    t = _history_target(versions, v, at)
+    if t is None:
+        return None, None
+    base = max(i for i in range(t + 1) if versions[i]["kind"] == "snapshot")
+    s3 = s3_client()
+    def _fetch(x):
+        return read_json_object(s3.get_object(Bucket=S3_BUCKET, Key=x["key"]))
+    with ThreadPoolExecutor(max_workers=CATALOG_FETCH_THREADS) as pool:
+        parts = list(pool.map(_fetch, versions[base:t + 1]))
+    catalog = _history_payload(parts[0])[0]
+    catalog = catalog if isinstance(catalog, dict) else {}
+    for part in parts[1:]:
+        apply_catalog_changes(catalog, _history_payload(part)[0])
+    return versions[t]["v"], catalog
+
+@app.route("/admin/catalog_history/<ship_number>")
+def admin_catalog_history(ship_number):
+    """버전 목록 (최신순) + 변경 건수. 항목 단위 내역은 /<v> 에서"""
+    _require_admin()
+    versions = load_catalog_history(ship_number)["versions"]
+    return jsonify({"ok": True, "ship": ship_number,
+                    "versions": [{**{k: x[k] for k in ("v", "ts", "actor", "kind", "bytes")},
+                                  "summary": {k: n for k, n in (x.get("summary") or {}).items() if k != "items"}}
+                                 for x in reversed(versions)],
+                    "stored_bytes": sum(x["bytes"] for x in versions)})
+
+@app.route("/admin/catalog_history/<ship_number>/<int:v>")
+def admin_catalog_history_version(ship_number, v):
+    """버전 하나의 항목 단위 변경 내역 (버전 객체에서 읽음)"""
+    _require_admin()
+    versions = load_catalog_history(ship_number)["versions"]
+    x = next((x for x in versions if x["v"] == v), None)
+    if x is None:
+        return jsonify({"ok": False, "error": "version not found"}), 404
+    items = _history_payload(s3_get_json(x["key"], default=None))[1] or (x.get("summary") or {}).get("items", [])
+    return jsonify({"ok": True, "ship": ship_number, **{k: x[k] for k in ("v", "ts", "actor", "kind", "bytes")},
+                    "summary": {k: n for k, n in (x.get("summary") or {}).items() if k != "items"}, "items": items})
+
+@app.route("/admin/catalog_history/<ship_number>/catalog")
+def admin_catalog_history_view(ship_number):
+    """?v=<버전> 또는 ?at=<ISO 시각> 시점의 카탈로그"""
+    _require_admin()
+    try:
+        v = int(request.args["v"]) if request.args.get("v") else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "v must be an integer"}), 400
+    version, catalog = catalog_at(ship_number, v=v, at=request.args.get("at"))
+    if version is None:
+        return jsonify({"ok": False, "error": "version not found"}), 404
+    return jsonify({"ok": True, "ship": ship_number, "v": version, "catalog": catalog})
+
+@app.route("/admin/catalog_history/<ship_number>/restore", methods=["POST"])
+@s3_budget_seconds(None)
+def admin_catalog_restore(ship_number):
+    """지정 버전으로 되돌림. 복원도 새 버전으로 기록되므로 다시 되돌릴 수 있음"""
+    _require_admin()
+    src = request.get_json(silent=True) or request.form
+    try:
+        v = int(src["v"]) if src.get("v") not in (None, "") else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "v must be an integer"}), 400
+    at = src.get("at")
+    if v is None and not at:
+        return jsonify({"ok": False, "error": "v or at required"}), 400
+    version, catalog = catalog_at(ship_number, v=v, at=at)
+    if version is None:
+        return jsonify({"ok": False, "error": "version not found"}), 404
+    save_catalog(ship_number, catalog)
+    append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "admin","action": "catalog_restore",
+                         "ship": ship_number, "category": "-", "equipment": "-","result": f"v={version}"})
+    publish_event("catalog_regen", ship_number, progress=_ship_progress(ship_number, catalog))
+    if request.headers.get("X-Requested-With") == "fetch" or request.is_json:
+        return jsonify({"ok": True, "restored": version})
+    flash(f"Ship {ship_number} 카탈로그를 버전 {version} 으로 복원했습니다.")
+    return redirect(url_for("admin_dashboard", _=int(time.time())))
+
+def _ensure_item(ship_number: str, catalog: dict, category: str, eq: str, save: bool = True) -> bool:
     created = False
     if not isinstance(catalog, dict):
         return False
@@ -506,7 +1584,7 @@ def _ensure_item(ship_number: str, catalog: dict, category: str, eq: str) -> boo
             "__deleted__": False
         }
         created = True
-    if created:
+    if created and save:
         save_catalog(ship_number, catalog)
     return created
 
@@ -524,68 +1602,236 @@ def _has_any_input(eq_info: dict) -> bool:
     fields = ["qty","maker","type","cert_no","ex_proof_grade","ip_grade","location","page","file_key","file_url","last_modified"]
     return any((eq_info.get(k) or "").strip() for k in fields)
 
-def list_all_submissions():
-    submissions = []
+def _is_catalog_object_key(k: str) -> bool:
+    if not k.endswith(".json"): return False
+    if "/contacts/" in k or "/logs/" in k or "/mails/" in k or "/auth/" in k: return False
+    # catalog/equipment_catalog_{ship}.json 만 (journal/ 등 하위 폴더 제외)
+    return k.startswith(CATALOG_PREFIX + "equipment_catalog_") and "/" not in k[len(CATALOG_PREFIX):]
+
+def _ship_from_catalog_key(k: str) -> str:
+    return k.split("_")[-1].split(".")[0]
+
+def _list_catalog_objects(s3=None) -> list:
+    """catalog/ 바로 아래 equipment_catalog_*.json 목록 (페이지네이션, 하위 폴더는 Delimiter로 제외)"""
+    s3 = s3 or s3_client()
+    out = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET, Prefix=CATALOG_PREFIX, Delimiter="/"):
+        out.extend(o for o in page.get("Contents", []) if _is_catalog_object_key(o["Key"]))
+    return out
+
+def _load_all_catalogs() -> dict:
+    """ship_number -> catalog(dict). 목록 조회 + 카탈로그별 GET을 스레드풀로 병렬 처리"""
+    out = {}
     s3 = s3_client()
+    keys = [o["Key"] for o in _list_catalog_objects(s3)]
+    def _fetch(k):
+        return k, resolve_contact_refs(read_json_object(s3.get_object(Bucket=S3_BUCKET, Key=k)))
+    contact_resolver()
+    with ThreadPoolExecutor(max_workers=CATALOG_FETCH_THREADS) as pool:
+        for k, catalog in pool.map(_fetch, keys):
+            if isinstance(catalog, dict):
+                out[_ship_from_catalog_key(k)] = catalog
+    return out
+
+# ================= Fleet Table (컬럼형 메모리 표현) =================
+# 장비 1건 = dict(~20키) 대신, 문자열은 공용 풀에 1번만 저장(intern)하고
+# 각 필드는 풀 인덱스(np.int32) 컬럼으로 보관. 상태/입력여부는 벡터 연산으로 계산.
+_FLEET_TEXT_FIELDS = ("qty","maker","type","cert_no","ex_proof_grade","ip_grade","location","page",
+                      "file","file_url","file_key","submitter_name","last_modified")
+_STATUS_FIELDS = ("qty", "maker", "type", "cert_no")
+_INPUT_FIELDS = ("qty","maker","type","cert_no","ex_proof_grade","ip_grade","location","page","file_key","file_url","last_modified")
+
+class _StringPool:
+    __slots__ = ("values", "index", "nonblank")
+
+    def __init__(self):
+        self.values = [""]; self.index = {"": 0}; self.nonblank = [False]
+
+    def code(self, v) -> int:
+        if v is None: return 0
+        if not isinstance(v, str): v = str(v)
+        c = self.index.get(v)
+        if c is None:
+            c = len(self.values)
+            v = sys.intern(v)
+            self.values.append(v); self.index[v] = c; self.nonblank.append(bool(v.strip()))
+        return c
+
+class FleetTable:
+    """전 호선 장비를 컬럼 배열로 보관. 행 i = (ship[i], category[i], eq[i], 필드 코드들)"""
+    __slots__ = ("pool", "ship", "category", "eq", "cols", "deleted", "done", "has_input", "ships")
+
+    def __init__(self):
+        self.pool = _StringPool()
+        self.ship = self.category = self.eq = self.deleted = self.done = self.has_input = None
+        self.cols = {}
+        self.ships = []
+
+    @classmethod
+    def from_catalogs(cls, catalogs: dict) -> "FleetTable":
+        t = cls(); code = t.pool.code
+        ship_c, cat_c, eq_c, deleted = [], [], [], []
+        raw = {f: [] for f in _FLEET_TEXT_FIELDS}
+        t.ships = sorted(str(s) for s, c in (catalogs or {}).items() if isinstance(c, dict))
+        for sh in t.ships:
+            catalog = catalogs[sh]
+            sc = code(sh)
+            for category, eqs in catalog.items():
+                if not isinstance(eqs, dict): continue
+                cc = code(category)
+                for eq_name, info in eqs.items():
+                    if isinstance(eq_name, str) and eq_name.startswith("__"): continue
+                    if not isinstance(info, dict): continue
+                    ship_c.append(sc); cat_c.append(cc); eq_c.append(code(eq_name))
+                    deleted.append(bool(info.get("__deleted__")))
+                    for f in _FLEET_TEXT_FIELDS:
+                        raw[f].append(code(info.get(f)))
+        t.ship = np.asarray(ship_c, dtype=np.int32)
+        t.category = np.asarray(cat_c, dtype=np.int32)
+        t.eq = np.asarray(eq_c, dtype=np.int32)
+        t.deleted = np.asarray(deleted, dtype=bool)
+        t.cols = {f: np.asarray(v, dtype=np.int32) for f, v in raw.items()}
+        t._recompute()
+        return t
+
+    def _recompute(self):
+        # _recompute_status / _has_any_input 의 벡터화 버전
+        nonblank = np.asarray(self.pool.nonblank, dtype=bool)
+        n = len(self.ship)
+        done = np.ones(n, dtype=bool)
+        for f in _STATUS_FIELDS: done &= nonblank[self.cols[f]]
+        has_input = np.zeros(n, dtype=bool)
+        for f in _INPUT_FIELDS: has_input |= nonblank[self.cols[f]]
+        self.done = done; self.has_input = has_input
+
+    def __len__(self):
+        return len(self.ship)
+
+    def _per_ship(self, mask) -> dict:
+        counts = np.bincount(self.ship[mask], minlength=len(self.pool.values))
+        return {sh: int(counts[self.pool.index[sh]]) for sh in self.ships}
+
+    def incomplete_counts(self) -> dict:
+        """ship -> 미입력(삭제 제외, status != done) 건수 (_build_missing_report total과 동일)"""
+        return self._per_ship(~self.deleted & ~self.done)
+
+    def completion_pct(self) -> dict:
+        alive = self._per_ship(~self.deleted)
+        done = self._per_ship(~self.deleted & self.done)
+        return {sh: (round(100.0 * done[sh] / alive[sh], 1) if alive[sh] else 0.0) for sh in self.ships}
+
+    def submission_mask(self):
+        return ~self.deleted & self.has_input
+
+    def ships_with_rows(self, mask=None) -> list:
+        """제출 행(기본: submission_mask)이 1건 이상인 호선"""
+        codes = np.unique(self.ship[self.submission_mask() if mask is None else mask])
+        return sorted(self.pool.values[c] for c in codes.tolist())
+
+    def iter_rows(self, mask=None):
+        """list_all_submissions 형식의 dict를 필요할 때만 생성"""
+        vals = self.pool.values; cols = self.cols
+        idx = np.flatnonzero(self.submission_mask() if mask is None else mask)
+        for i in idx.tolist():
+            sh = vals[self.ship[i]]
+            row = {"ship_number": sh, "category": vals[self.category[i]], "equipment_name": vals[self.eq[i]]}
+            for f in _FLEET_TEXT_FIELDS: row[f] = vals[cols[f][i]]
+            row["status"] = "done" if self.done[i] else "pending"
+            row["responsible"] = {}
+            row["due_date"] = SHIP_DUE_DATES.get(sh, "")
+            yield row
+
+def load_fleet_table() -> FleetTable:
+    # 스캔 실패는 그대로 올림 (빈 함대로 바꾸면 '데이터 없음'으로 보이고 그 위에서 쓰기가 진행됨)
+    return FleetTable.from_catalogs(_load_all_catalogs())
+
+_SUBMISSION_FIELDS = _FLEET_TEXT_FIELDS + ("status", "responsible", "due_date")
+
+def _submission_filters(ships, categories, status, fields):
+    ships = {str(s) for s in ships} if ships is not None else None
+    categories = set(categories) if categories is not None else None
+    status = {status} if isinstance(status, str) else (set(status) if status is not None else None)
+    fields = tuple(f for f in (fields or _SUBMISSION_FIELDS) if f in _SUBMISSION_FIELDS)
+    return ships, categories, status, fields
+
+def _project_row(ship, category, eq, values: dict, fields, deleted=None) -> dict:
+    row = {"ship_number": ship, "category": category, "equipment_name": eq}
+    for f in fields:
+        if f == "responsible": row[f] = {}
+        elif f == "due_date": row[f] = SHIP_DUE_DATES.get(ship, "")
+        else: row[f] = values.get(f) or ""
+    if deleted is not None: row["__deleted__"] = deleted
+    return row
+
+def _iter_submissions_sql(ships, categories, status, include_deleted, fields, batch=500):
+    _mirror_fresh()
+    where, args = ["((deleted = 0 AND has_input = 1)" + (" OR deleted = 1)" if include_deleted else ")")], []
+    for col, vals in (("ship", ships), ("category", categories), ("status", status)):
+        if vals is not None:
+            if not vals: return
+            where.append(f"{col} IN ({','.join('?' * len(vals))})"); args.extend(sorted(vals))
+    cols = [f for f in fields if f in _FLEET_TEXT_FIELDS or f == "status"]
+    cur = _db().execute(f"""SELECT ship, category, eq, deleted{''.join(', ' + c for c in cols)} FROM mirror_items
+        WHERE {' AND '.join(where)} ORDER BY ship, pos""", args)
+    while True:
+        rows = cur.fetchmany(batch)
+        if not rows: break
+        for r in rows:
+            yield _project_row(r[0], r[1], r[2], dict(zip(cols, r[4:])), fields, bool(r[3]) if include_deleted else None)
+
+def _iter_submissions_s3(ships, categories, status, include_deleted, fields):
+    s3 = s3_client()
+    objs = sorted((o for o in _list_catalog_objects(s3) if ships is None or _ship_from_catalog_key(o["Key"]) in ships),
+                  key=lambda o: _ship_from_catalog_key(o["Key"]))
+    def _fetch(o):
+        return _ship_from_catalog_key(o["Key"]), read_json_object(s3.get_object(Bucket=S3_BUCKET, Key=o["Key"]))
+    with ThreadPoolExecutor(max_workers=CATALOG_FETCH_THREADS) as pool:
+        # 스레드 수만큼씩만 받아 메모리에 카탈로그 전체가 쌓이지 않도록
+        for i in range(0, len(objs), CATALOG_FETCH_THREADS):
+            for ship, catalog in pool.map(_fetch, objs[i:i + CATALOG_FETCH_THREADS]):
+                for category, eqs in (catalog or {}).items() if isinstance(catalog, dict) else []:
+                    if not isinstance(eqs, dict) or (categories is not None and category not in categories): continue
+                    for eq, info in eqs.items():
+                        if str(eq).startswith("__") or not isinstance(info, dict): continue
+                        deleted = bool(info.get("__deleted__"))
+                        if deleted and not include_deleted: continue
+                        if not deleted and not _has_any_input(info): continue
+                        st = _recompute_status(info)
+                        if status is not None and st not in status: continue
+                        yield _project_row(ship, category, eq, dict(info, status=st), fields, deleted if include_deleted else None)
+
+def iter_submissions(ships=None, categories=None, status=None, include_deleted=False, fields=None):
+    """
+    전 호선 제출 행 generator (list_all_submissions 와 같은 행 형식, 필요한 만큼만 생성)
+    - ships / categories / status("done"|"pending"): 미러에서는 WHERE 절, S3 fallback에서는
+      해당 호선 카탈로그를 아예 받지 않고 카테고리는 항목 파싱 전에 건너뜀
+    - include_deleted: 삭제 항목도 포함 (행에 __deleted__ 표시)
+    - fields: 포함할 필드 (ship_number/category/equipment_name 은 항상 포함)
+    """
+    ships, categories, status, fields = _submission_filters(ships, categories, status, fields)
     try:
-        resp = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=CATALOG_PREFIX)
-        if "Contents" in resp:
-            for obj in resp["Contents"]:
-                k = obj["Key"]
-                if not k.endswith(".json"): continue
-                if "/contacts/" in k or "/logs/" in k or "/mails/" in k or "/auth/" in k: continue
-                data = s3.get_object(Bucket=S3_BUCKET, Key=k)["Body"].read()
-                catalog = json.loads(data)
-                ship_number = k.split("_")[-1].split(".")[0]
-                if not isinstance(catalog, dict): continue
-                for category, eqs in catalog.items():
-                    if not isinstance(eqs, dict): continue
-                    eqs.setdefault("__owners__", []); eqs.setdefault("__status__", "미입력")
-                    eqs.setdefault("__cat_locs__", []); eqs.setdefault("__cat_photo_key__", "")
-                    eqs.setdefault("__ex_proof__", "Unknown")
-                    for eq_name, eq_info in eqs.items():
-                        if isinstance(eq_name, str) and eq_name.startswith("__"): continue
-                        if not isinstance(eq_info, dict): continue
-                        if eq_info.get("__deleted__"): continue
-                        if not _has_any_input(eq_info): continue
-                        _ensure_item_extended_fields(eq_info)
-                        submissions.append({
-                            "ship_number": ship_number, "category": category, "equipment_name": eq_name,
-                            "qty": eq_info.get("qty",""), "maker": eq_info.get("maker",""), "type": eq_info.get("type",""),
-                            "cert_no": eq_info.get("cert_no",""), "status": _recompute_status(eq_info),
-                            "responsible": {}, "submitter_name": eq_info.get("submitter_name",""),
-                            "file": eq_info.get("file",""), "file_url": eq_info.get("file_url",""), "file_key": eq_info.get("file_key",""),
-                            "last_modified": eq_info.get("last_modified",""), "due_date": SHIP_DUE_DATES.get(ship_number,""),
-                            "ex_proof_grade": eq_info.get("ex_proof_grade",""), "ip_grade": eq_info.get("ip_grade",""),
-                            "location": eq_info.get("location",""), "page": eq_info.get("page","")
-                        })
+        rows = _iter_submissions_sql(ships, categories, status, include_deleted, fields)
+        first = next(rows, None)
     except Exception as e:
-        print("[ERROR] list_all_submissions failed:", e)
-    return submissions
+        print("[WARN] mirror read failed, scanning S3:", e)
+        yield from _iter_submissions_s3(ships, categories, status, include_deleted, fields)
+        return
+    if first is None: return
+    yield first
+    yield from rows
+
+def list_all_submissions():
+    return list(iter_submissions())
 
 def list_deleted_items():
-    out = {}
-    s3 = s3_client()
     try:
-        resp = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=CATALOG_PREFIX)
-        if "Contents" not in resp:
-            return out
-        for obj in resp["Contents"]:
-            k = obj["Key"]
-            if not k.endswith(".json"): continue
-            if "/contacts/" in k or "/logs/" in k or "/mails/" in k or "/auth/" in k: continue
-            data = s3.get_object(Bucket=S3_BUCKET, Key=k)["Body"].read()
-            catalog = json.loads(data)
-            ship_number = k.split("_")[-1].split(".")[0]
-            for category, eqs in (catalog or {}).items():
-                if not isinstance(eqs, dict): continue
-                for eq, info in eqs.items():
-                    if isinstance(eq, str) and eq.startswith("__"): continue
-                    if not isinstance(info, dict): continue
-                    if info.get("__deleted__"):
-                        out.setdefault(ship_number, {}).setdefault(category, []).append(eq)
+        return mirror_deleted_items()
     except Exception as e:
-        print("[ERROR] list_deleted_items failed:", e)
+        print("[WARN] mirror read failed, scanning S3:", e)
+    out = {}
+    t = load_fleet_table()
+    for row in t.iter_rows(t.deleted):
+        out.setdefault(row["ship_number"], {}).setdefault(row["category"], []).append(row["equipment_name"])
     return out
 
 # 파일 보기
@@ -617,11 +1863,187 @@ def file_inline(key):
         print("[ERROR] file_inline failed:", e)
         abort(404)
 
+# ================ 캐시 정책 (라우트별 선언) ================
+# @cache_policy("이름") 으로 라우트마다 지정. 지정이 없는 라우트(로그인 후 동적 페이지 등)는 no-store
+_CACHE_POLICIES = {
+    "no-store":   {"Cache-Control": "no-store, no-cache, must-revalidate, max-age=0", "Pragma": "no-cache", "Expires": "0"},
+    "revalidate": {"Cache-Control": "no-cache"},                       # 저장은 하되 매번 ETag 재검증
+    "private":    {"Cache-Control": "private, max-age=60"},
+    "immutable":  {"Cache-Control": "public, max-age=31536000, immutable"},
+    "private-immutable": {"Cache-Control": "private, max-age=31536000, immutable"},
+    "view":       {},                                                  # 뷰가 직접 헤더 설정
+}
+
+def cache_policy(name):
+    if name not in _CACHE_POLICIES:
+        raise ValueError(f"unknown cache policy: {name}")
+    def deco(fn):
+        fn._cache_policy = name
+        return fn
+    return deco
+
+@app.after_request
+def apply_cache_policy(resp):
+    fn = app.view_functions.get(request.endpoint) if request.endpoint else None
+    for k, v in _CACHE_POLICIES[getattr(fn, "_cache_policy", "no-store")].items():
+        resp.headers[k] = v
+    return resp
+
+# ---------- 정적 파일: 내용 해시 URL + 장기 캐시 + 사전 압축 ----------
+# url_for('static', filename=...) 에 ?v=<sha256 앞 12자리> 자동 부착 -> 내용이 바뀌면 URL도 바뀜
+_ASSET_HASHES = {}      # filename -> (mtime_ns, size, hash)
+_ASSET_VARIANTS = {}    # (filename, hash, encoding) -> bytes
+_ASSET_COMPRESSIBLE = {"application/javascript", "text/javascript", "text/css", "application/json", "image/svg+xml", "text/plain"}
+_ASSET_LOCK = threading.Lock()
+
+def _asset_path(filename: str):
+    path = safe_join(app.static_folder, filename)
+    return path if path and os.path.isfile(path) else None
+
+def asset_hash(filename: str):
+    path = _asset_path(filename)
+    if path is None:
+        return None
+    st = os.stat(path)
+    cached = _ASSET_HASHES.get(filename)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    with open(path, "rb") as f:
+        h = hashlib.sha256(f.read()).hexdigest()[:12]
+    _ASSET_HASHES[filename] = (st.st_mtime_ns, st.st_size, h)
+    return h
+
+@app.url_defaults
+def _static_fingerprint(endpoint, values):
+    if endpoint == "static" and "filename" in values and "v" not in values:
+        h = asset_hash(values["filename"])
+        if h: values["v"] = h
+
+def _asset_variant(filename: str, h: str, enc: str, path: str) -> bytes:
+    key = (filename, h, enc)
+    data = _ASSET_VARIANTS.get(key)
+    if data is None:
+        with open(path, "rb") as f: raw = f.read()
+        data = brotli.compress(raw, quality=11) if enc == "br" else gzip.compress(raw, compresslevel=9)
+        with _ASSET_LOCK:
+            _ASSET_VARIANTS[key] = data
+    return data
+
+@cache_policy("view")
+def static_asset(filename):
+    """Flask 기본 static 뷰 대체: 해시 일치 시 immutable 1년, 압축 가능한 타입은 br/gzip 사전 압축본 제공"""
+    path = _asset_path(filename)
+    if path is None:
+        abort(404)
+    h = asset_hash(filename)
+    fresh = request.args.get("v") == h
+    mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    enc = _pick_encoding() if mime in _ASSET_COMPRESSIBLE else None
+    if enc:
+        resp = Response(_asset_variant(filename, h, enc, path), mimetype=mime)
+        resp.headers["Content-Encoding"] = enc
+        resp.vary.add("Accept-Encoding")
+    else:
+        resp = send_file(path, mimetype=mime, conditional=True, etag=False)
+    resp.set_etag(f"{h}-{enc}" if enc else h)
+    # 옛 해시/해시 없는 URL은 같은 주소로 다른 내용이 나갈 수 있으므로 재검증
+    resp.headers["Cache-Control"] = _CACHE_POLICIES["immutable" if fresh else "revalidate"]["Cache-Control"]
+    return resp.make_conditional(request)
+
+app.view_functions["static"] = static_asset
+
+
+# ================ 응답 압축 (gzip / brotli) ================
+# Accept-Encoding 협상 -> br(설치 시) 또는 gzip. COMPRESS_MIN_BYTES 미만 응답은 그대로.
+# 스트리밍 응답(stream_template 등)은 청크 단위로 압축, COMPRESS_STREAM_FLUSH_BYTES 마다 flush해서 브라우저가 바로 그리도록 함
+_COMPRESS_STATS = {"responses": 0, "streamed": 0, "bytes_in": 0, "bytes_out": 0, "by_encoding": {}, "ttfb_ms_sum": 0.0}
+_COMPRESS_LOCK = threading.Lock()
+
+def _accepted_encodings() -> dict:
+    out = {}
+    for part in (request.headers.get("Accept-Encoding") or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name: continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try: q = float(params.strip()[2:])
+            except ValueError: q = 0.0
+        out[name.strip().lower()] = q
+    return out
+
+def _pick_encoding():
+    acc = _accepted_encodings()
+    if brotli is not None and acc.get("br", 0) > 0: return "br"
+    if acc.get("gzip", 0) > 0 or (acc.get("*", 0) > 0 and "gzip" not in acc): return "gzip"
+    return None
+
+def _compressor(enc):
+    """-> (compress(bytes), flush(), finish())"""
+    if enc == "br":
+        c = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        return c.process, c.flush, c.finish
+    c = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)   # 31 = gzip 헤더
+    return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+def _compress_stats(enc, n_in, n_out, streamed=False, ttfb=None):
+    with _COMPRESS_LOCK:
+        s = _COMPRESS_STATS
+        s["responses"] += 1; s["bytes_in"] += n_in; s["bytes_out"] += n_out
+        s["by_encoding"][enc] = s["by_encoding"].get(enc, 0) + 1
+        if streamed:
+            s["streamed"] += 1; s["ttfb_ms_sum"] += ttfb or 0.0
+
+def _compress_stream(chunks, enc, t0):
+    compress, flush, finish = _compressor(enc)
+    n_in = n_out = pending = 0; ttfb = None
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str): chunk = chunk.encode("utf-8")
+            n_in += len(chunk); pending += len(chunk)
+            out = compress(chunk)
+            if pending >= COMPRESS_STREAM_FLUSH_BYTES:
+                out += flush(); pending = 0
+            if out:
+                if ttfb is None: ttfb = (time.perf_counter() - t0) * 1000
+                n_out += len(out)
+                yield out
+        out = finish()
+        n_out += len(out)
+        yield out
+    finally:
+        close = getattr(chunks, "close", None)
+        if close: close()
+        _compress_stats(enc, n_in, n_out, streamed=True, ttfb=ttfb)
+
+@app.before_request
+def _mark_request_start():
+    g._t0 = time.perf_counter()
+
 @app.after_request
-def add_no_cache_headers(resp):
-    resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    resp.headers["Pragma"] = "no-cache"
-    resp.headers["Expires"] = "0"
+def compress_response(resp):
+    if not COMPRESS_ENABLED or resp.status_code < 200 or resp.status_code in (204, 206, 304):
+        return resp
+    if resp.mimetype not in COMPRESS_MIMETYPES or "Content-Encoding" in resp.headers or resp.direct_passthrough:
+        return resp
+    resp.vary.add("Accept-Encoding")
+    enc = _pick_encoding()
+    if enc is None:
+        return resp
+    if resp.is_streamed:
+        resp.response = _compress_stream(resp.response, enc, g.get("_t0") or time.perf_counter())
+        resp.headers.pop("Content-Length", None)
+    else:
+        data = resp.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return resp
+        compress, _, finish = _compressor(enc)
+        body = compress(data) + finish()
+        resp.set_data(body)
+        resp.headers["X-Uncompressed-Length"] = str(len(data))
+        _compress_stats(enc, len(data), len(body))
+    resp.headers["Content-Encoding"] = enc
+    if resp.headers.get("ETag"):
+        resp.set_etag(resp.get_etag()[0], weak=True)   # 인코딩별 표현이 다르므로 weak ETag
     return resp
 
 # ===================== 인증/계정 =====================
@@ -727,6 +2149,7 @@ def home():
     cat_status = None
     owners = []
     system_ex_proof = "Unknown"
+    compliance_flags = {}
     my_items_in_system = []
     shared_items_in_system = []
 
@@ -757,6 +2180,10 @@ def home():
         owners = cat_block.get("__owners__", [])
         system_ex_proof = cat_block.get("__ex_proof__", "Unknown")
         eqs_in_category = {k: v for k, v in cat_block.items() if not str(k).startswith("__")}
+        try:
+            compliance_flags = {eq: "\n".join(r) for (_, eq), r in compliance_flags_for(ship_number, category).items()}
+        except Exception as e:
+            print("[WARN] compliance flags read failed:", e)
 
         tmp_shared = []
         for eq_name, info in eqs_in_category.items():
@@ -817,6 +2244,7 @@ def home():
         cat_status=cat_status,
         owners=owners,
         system_ex_proof=system_ex_proof,
+        compliance_flags=compliance_flags,
         my_items_in_system=my_items_in_system,
         shared_items_in_system=shared_items_in_system,
         CATALOG_EQUIPMENTS=CATALOG_EQUIPMENTS
@@ -828,51 +2256,43 @@ def _recompute_status(item: dict) -> str:
     return "done" if filled else "pending"
 
 # ================= 장비 수정 =================
+_ITEM_EDIT_FIELDS = ("qty", "maker", "type", "cert_no", "ex_proof_grade", "ip_grade", "location", "page")
+
+def _apply_item_edit(item: dict, values: dict, submitter_name: str = ""):
+    """edit 폼/배치 API 공통: None이 아닌 필드만 반영 + 작성자/수정시각/상태 갱신"""
+    for k in _ITEM_EDIT_FIELDS:
+        v = values.get(k)
+        if v is not None: item[k] = v
+    if submitter_name:
+        item["submitter_name"] = submitter_name
+    elif session.get("user",{}).get("email"):
+        item["submitter_name"] = session["user"]["email"]
+    item["last_modified"] = datetime.datetime.now().isoformat()
+    item["status"] = _recompute_status(item)
+
 @app.route("/edit/<ship_number>/<category>/<eq>", methods=["GET", "POST"])
 def edit(ship_number, category, eq):
     catalog = get_or_create_catalog(ship_number)
     _ensure_item(ship_number, catalog, category, eq)
 
     if request.method == "POST":
-        qty   = request.form.get("qty")
-        maker = request.form.get("maker")
-        typ   = request.form.get("type")
-        cert  = request.form.get("cert_no")
-
-        ex_grade = request.form.get("ex_proof_grade")
-        ip_grade = request.form.get("ip_grade")
-        loc_txt  = request.form.get("location")
-        page_txt = request.form.get("page")
-
         file  = request.files.get("file")
         submitter_name = (request.form.get("submitter_name") or "").strip()
 
         if category in catalog and eq in catalog[category]:
             item = catalog[category][eq]
-            if qty is not None: item["qty"] = qty
-            if maker is not None: item["maker"] = maker
-            if typ is not None:   item["type"] = typ
-            if cert is not None:  item["cert_no"] = cert
-            if ex_grade is not None: item["ex_proof_grade"] = ex_grade
-            if ip_grade is not None: item["ip_grade"] = ip_grade
-            if loc_txt  is not None: item["location"] = loc_txt
-            if page_txt is not None: item["page"] = page_txt
-            if submitter_name:
-                item["submitter_name"] = submitter_name
-            elif session.get("user",{}).get("email"):
-                item["submitter_name"] = session["user"]["email"]
-            item["last_modified"] = datetime.datetime.now().isoformat()
+            _apply_item_edit(item, {k: request.form.get(k) for k in _ITEM_EDIT_FIELDS}, submitter_name)
             if file and file.filename != "":
                 s3 = s3_client()
                 safe = secure_filename(file.filename)
                 key_file = f"{CATALOG_PREFIX}uploads/edit/{ship_number}_{secure_filename(category)}_{secure_filename(eq)}_{int(datetime.datetime.now().timestamp())}_{safe}"
                 s3.upload_fileobj(file, S3_BUCKET, key_file, ExtraArgs={"ContentType": file.mimetype, "CacheControl": "no-cache"})
                 item["file"] = safe; item["file_key"] = key_file; item["file_url"] = ""
-            item["status"] = _recompute_status(item)
 
         save_catalog(ship_number, catalog)
         append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": session.get("user",{}).get("email","guest"),
                              "action": "edit","ship": ship_number, "category": category, "equipment": eq,"source": "edit_route"})
+        _publish_item_event("item_edited", ship_number, category, eq, catalog)
 
         next_url = request.args.get("next") or request.form.get("next")
         if next_url and next_url.startswith("/"):
@@ -884,11 +2304,95 @@ def edit(ship_number, category, eq):
     info = catalog.get(category, {}).get(eq, {})
     return render_template("edit.html", ship_number=ship_number, category=category, eq=eq, info=info)
 
+# ================= 배치 수정 API =================
+def _validate_item_patch(p) -> tuple:
+    """-> (category, eq, values, submitter, error)"""
+    if not isinstance(p, dict):
+        return None, None, None, None, "patch must be an object"
+    category = p.get("category"); eq = p.get("eq")
+    if not isinstance(category, str) or not category.strip() or category.startswith("__"):
+        return None, None, None, None, "category required"
+    if not isinstance(eq, str) or not eq.strip() or eq.startswith("__"):
+        return category, None, None, None, "eq required"
+    fields = p.get("fields") or {}
+    if not isinstance(fields, dict):
+        return category, eq, None, None, "fields must be an object"
+    unknown = sorted(set(fields) - set(_ITEM_EDIT_FIELDS))
+    if unknown:
+        return category, eq, None, None, f"unknown fields: {', '.join(unknown)}"
+    values = {}
+    for k, v in fields.items():
+        if v is None: continue
+        if isinstance(v, bool) or not isinstance(v, (str, int, float)):
+            return category, eq, None, None, f"invalid value for {k}"
+        values[k] = str(v)
+    submitter = p.get("submitter_name") or ""
+    if not isinstance(submitter, str):
+        return category, eq, None, None, "submitter_name must be a string"
+    return category, eq, values, submitter.strip(), None
+
+@app.route("/api/catalog/<ship_number>/items", methods=["POST"])
+@login_required
+def api_items_batch(ship_number):
+    """
+    여러 장비 수정을 카탈로그 1회 로드/1회 저장으로 처리
+    body: {"items": [{"category", "eq", "fields": {qty, maker, ...}, "submitter_name"?}], "create_missing"?: true}
+    """
+    body = request.get_json(silent=True) or {}
+    patches = body.get("items")
+    if not isinstance(patches, list) or not patches:
+        return jsonify({"ok": False, "error": "items (non-empty list) required"}), 400
+    if len(patches) > BATCH_MAX_ITEMS:
+        return jsonify({"ok": False, "error": f"too many items (max {BATCH_MAX_ITEMS})"}), 413
+    create_missing = bool(body.get("create_missing", True))
+
+    catalog = get_or_create_catalog(ship_number)
+    results = []; applied = []
+    for i, p in enumerate(patches):
+        category, eq, values, submitter, err = _validate_item_patch(p)
+        if not err and not create_missing and not (isinstance(catalog.get(category), dict) and eq in catalog[category]):
+            err = "item not found"
+        if err:
+            results.append({"index": i, "category": category, "eq": eq, "ok": False, "error": err}); continue
+        _ensure_item(ship_number, catalog, category, eq, save=False)
+        item = catalog[category][eq]
+        _ensure_item_extended_fields(item)
+        _apply_item_edit(item, values, submitter)
+        applied.append((category, eq))
+        results.append({"index": i, "category": category, "eq": eq, "ok": True, "status": item["status"]})
+
+    if not applied:
+        return jsonify({"ok": False, "error": "no valid items", "results": results}), 400
+    rev = save_catalog(ship_number, catalog)
+    append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": session.get("user",{}).get("email","guest"),
+                         "action": "edit_batch","ship": ship_number, "category": "-", "equipment": "-",
+                         "result": f"applied={len(applied)}, failed={len(results) - len(applied)}",
+                         "items": [{"category": r["category"], "equipment": r["eq"], "ok": r["ok"], **({"error": r["error"]} if not r["ok"] else {})} for r in results],
+                         "source": "batch_api"})
+    for category, eq in applied:
+        _publish_item_event("item_edited", ship_number, category, eq, catalog)
+    try:
+        flags = compliance_flags_for(ship_number)
+        for r in results:
+            if r["ok"] and (r["category"], r["eq"]) in flags: r["violations"] = flags[(r["category"], r["eq"])]
+    except Exception as e:
+        print("[WARN] compliance flags read failed:", e)
+    code = 200 if len(applied) == len(results) else 207
+    return jsonify({"ok": True, "ship": ship_number, "applied": len(applied), "failed": len(results) - len(applied),
+                    "rev": rev if rev is not None else catalog_revision(ship_number), "results": results}), code
+
 # ================== 카테고리 담당/상태 ==================
-def _send_category_warning(ship_number: str, category: str, owners: list, status_label: str):
+def _send_category_warning(ship_number: str, category: str, owners: list, status_label: str, block: dict = None):
     emails = [ (o.get("email") or "").strip().lower() for o in owners if isinstance(o, dict) and (o.get("email")) ]
     emails = [e for e in emails if e]
     if not emails: return
+    if DIGEST_ENABLED and block is not None:
+        # 상태 토글마다 즉시 발송하지 않고 다이제스트 큐에 적재
+        items = _digest_pending_items(block)
+        if items:
+            # 발송은 start_digest_flusher 스레드가 담당 (요청이 SMTP/큐 CAS를 기다리지 않음)
+            digest_enqueue(emails, ship_number, category, items, reason=f"status:{status_label}")
+            return
     subject = f"[Ship {ship_number}] '{category}' 카테고리 상태 경고: {status_label}"
     due = SHIP_DUE_DATES.get(ship_number, "")
     body = f"""안녕하세요,
@@ -930,6 +2434,7 @@ def category_owners_update():
     append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": session.get("user",{}).get("email","user"),
                          "action": "category_owners_update","ship": ship_number, "category": category, "equipment": "-",
                          "result": f"ex_proof={catalog[category]['__ex_proof__']}"})
+    publish_event("owners_changed", ship_number, category, owners=owners, ex_proof=catalog[category]["__ex_proof__"])
     return redirect(url_for("home", ship_number=ship_number, category=category, _=int(time.time())))
 
 @app.route("/category/status", methods=["POST"])
@@ -946,8 +2451,9 @@ def category_status_set():
     save_catalog(ship_number, catalog)
     append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": session.get("user",{}).get("email","user"),
                          "action": "category_status_set","ship": ship_number, "category": category, "equipment": "-","result": status_label})
+    publish_event("status_changed", ship_number, category, status=status_label)
     if status_label in ("미입력","미완료"):
-        _send_category_warning(ship_number, category, catalog[category].get("__owners__", []), status_label)
+        _send_category_warning(ship_number, category, catalog[category].get("__owners__", []), status_label, block=catalog[category])
     if request.headers.get("X-Requested-With") == "fetch":
         return jsonify({"ok": True, "status": status_label})
     return redirect(url_for("home", ship_number=ship_number, category=category, _=int(time.time())))
@@ -995,25 +2501,35 @@ def handle_404(e):
 
 
 @app.route("/admin")
+@s3_budget_seconds(None)
 def admin_dashboard():
     _require_admin()
+    # 데이터를 읽기 전 이벤트 위치 -> 페이지가 SSE 연결 전까지 발생한 이벤트도 이어서 받음
+    try:
+        last_event_id = _events_max_id()
+    except Exception as e:
+        print("[WARN] events max id failed:", e)
+        last_event_id = None
     dedupe_contacts()
-    submissions = list_all_submissions()
+    catalogs = _load_all_catalogs()     # 스캔 장애는 503 (빈 함대로 보고 카탈로그를 새로 만들지 않음)
+    table = FleetTable.from_catalogs(catalogs)
     contacts = get_contacts()
-    ships = sorted({s["ship_number"] for s in submissions}) or ["1","2","3"]
+    ships = table.ships_with_rows() or ["1","2","3"]
 
-    incomplete_count = {sh: 0 for sh in ships}
     owners_by_ship = {}
     all_systems_set = set()        # 시스템 중복 제거
     cat_status_by_ship = {}        # ship별 system 상태
+    created = False
 
     for sh in ships:
-        catalog = load_catalog(sh) or {}
-        if not catalog:
-            catalog = create_catalog(sh)
+        catalog = catalogs.get(sh)
+        if catalog:
+            if _assign_random_category_owners(catalog):
+                save_catalog(sh, catalog)
+        else:
+            catalog = load_catalog(sh) or create_catalog(sh)
+            catalogs[sh] = catalog; created = True
         owners_by_ship[sh] = {}
-        _, _, cnt, _ = _build_missing_report(sh, catalog if catalog else {})
-        incomplete_count[sh] = cnt
 
         for cat, eqs in (catalog or {}).items():
             if isinstance(eqs, dict):
@@ -1021,6 +2537,13 @@ def admin_dashboard():
                 all_systems_set.add(cat)
                 cat_status_by_ship.setdefault(sh, {})[cat] = (eqs.get("__status__") or "미입력")
 
+    # 미입력 건수/완료율: 벡터 연산 1회
+    if created:
+        table = FleetTable.from_catalogs(catalogs)
+    counts = table.incomplete_counts()
+    incomplete_count = {sh: counts.get(sh, 0) for sh in ships}
+    completion_pct = table.completion_pct()
+
     systems = sorted(all_systems_set)
 
     # 최근 액티비티 로그(기존 유지)
@@ -1040,26 +2563,29 @@ def admin_dashboard():
     logs_by_ship = read_mail_logs_grouped(owners_by_ship)
 
     deleted_by_ship = {}
-    return render_template(
+    # 표가 커서 렌더링 완료 전부터 전송 (압축은 compress_response에서 청크 단위)
+    return Response(stream_template(
         "admin.html",
-        submissions=submissions,
+        submissions=table.iter_rows(),      # 템플릿이 스트리밍하며 1행씩 생성
         contacts=contacts.get("list", []),
         logs=logs,
         ships=ships,
         incomplete_count=incomplete_count,
+        completion_pct=completion_pct,
         SHIP_DUE_DATES=SHIP_DUE_DATES,
         owners_by_ship=owners_by_ship,
         systems=systems,
         logs_by_ship=logs_by_ship,             # ship -> system -> [mail logs...]
         cat_status_by_ship=cat_status_by_ship,
-        deleted_by_ship=deleted_by_ship
-    )
+        deleted_by_ship=deleted_by_ship,
+        last_event_id=last_event_id
+    ), mimetype="text/html")
 
 def _is_incomplete(item: dict) -> bool:
     return _recompute_status(item) != "done"
 
-def _build_missing_report(ship_number: str, catalog: dict):
-    lines = []; to_emails = set(); total = 0; by_category = {}
+def _missing_items_from_catalog(catalog: dict) -> tuple:
+    to_emails = set(); by_category = {}
     if not isinstance(catalog, dict): catalog = {}
     for category, eqs in catalog.items():
         if not isinstance(eqs, dict): continue
@@ -1069,14 +2595,24 @@ def _build_missing_report(ship_number: str, catalog: dict):
             if not isinstance(info, dict): continue
             if info.get("__deleted__"): continue
             if _is_incomplete(info):
-                total += 1; cat_list.append(eq)
+                cat_list.append(eq)
         if cat_list:
             by_category[category] = cat_list
-            lines.append(f"[{category}]\n" + "\n".join(f"- {x}" for x in cat_list))
         owners = eqs.get("__owners__", [])
         for o in owners:
             e = (o.get("email") or "").strip().lower()
             if e: to_emails.add(e)
+    return by_category, to_emails
+
+def _build_missing_report(ship_number: str, catalog: dict = None):
+    """미러(SQL)에서 조회. 미러 실패 시 catalog(없으면 S3)를 직접 순회"""
+    try:
+        by_category, to_emails = mirror_missing_items(ship_number)
+    except Exception as e:
+        print(f"[WARN] mirror read failed ship={ship_number}, walking catalog:", e)
+        by_category, to_emails = _missing_items_from_catalog(catalog if catalog is not None else load_catalog(ship_number))
+    total = sum(len(v) for v in by_category.values())
+    lines = [f"[{category}]\n" + "\n".join(f"- {x}" for x in cat_list) for category, cat_list in by_category.items()]
     due = SHIP_DUE_DATES.get(ship_number, "")
     body = f"""안녕하세요,
 
@@ -1121,12 +2657,9 @@ def cleanup_catalog_amp_keys():
             return
         for obj in resp["Contents"]:
             k = obj["Key"]
-            if not k.endswith(".json"): 
+            if not _is_catalog_object_key(k):
                 continue
-            if "/contacts/" in k or "/logs/" in k or "/mails/" in k or "/auth/" in k:
-                continue
-            raw = s3.get_object(Bucket=S3_BUCKET, Key=k)["Body"].read()
-            catalog = json.loads(raw.decode("utf-8"))
+            catalog = read_json_object(s3.get_object(Bucket=S3_BUCKET, Key=k))
             if not isinstance(catalog, dict):
                 continue
 
@@ -1139,17 +2672,207 @@ def cleanup_catalog_amp_keys():
                     del catalog[cat]
                     changed = True
             if changed:
-                s3_put_json(k, catalog)
+                save_catalog(_ship_from_catalog_key(k), catalog)
                 print(f"[FIX] {k}: category keys '&amp;' -> '&' normalized")
     except Exception as e:
         print("[WARN] cleanup_catalog_amp_keys failed:", e)
 
+# ================== 메일 다이제스트(수신자별 묶음 발송) ==================
+# 상태 경고 등 미입력 알림은 즉시 보내지 않고 큐에 쌓았다가,
+# 수신자별로 호선/카테고리를 합쳐 1통으로 발송. cooldown 내 이미 보낸 항목은 제외.
+# 큐/장부는 조건부 쓰기(s3_update_json)로만 수정 -> 여러 worker가 동시에 flush해도
+# 발송 대상은 큐에서 먼저 꺼낸(claim) 1곳만 보냄 (실패분은 다시 큐에)
+def _digest_pending_items(block: dict) -> list:
+    out = []
+    for eq, info in (block or {}).items():
+        if str(eq).startswith("__") or not isinstance(info, dict): continue
+        if info.get("__deleted__"): continue
+        if _is_incomplete(info): out.append(eq)
+    return out
+
+def _digest_item_key(ship, category, eq) -> str:
+    return f"{ship}|{category}|{eq}"
+
+def _digest_now() -> datetime.datetime:
+    return datetime.datetime.utcnow().replace(microsecond=0)
+
+def _digest_ts(s: str):
+    try:
+        return datetime.datetime.fromisoformat((s or "").rstrip("Z"))
+    except ValueError:
+        return None
+
+def digest_enqueue(recipients, ship: str, category: str, items: list, reason: str):
+    """수신자별 (ship, category, items) 알림을 큐에 추가"""
+    emails = sorted({(e or "").strip().lower() for e in (recipients or []) if (e or "").strip()})
+    if not emails or not items:
+        return 0
+    ts = _digest_now().isoformat() + "Z"
+    ents = [{"ts": ts, "to": e, "ship": ship, "category": category, "items": list(items), "reason": reason} for e in emails]
+    s3_update_json(DIGEST_QUEUE_KEY, lambda q: (q if isinstance(q, list) else []) + ents, default=[])
+    return len(emails)
+
+def digest_record_sent(recipients, ship: str, by_category: dict):
+    """즉시 발송된 메일도 cooldown 장부에 기록 -> 이후 다이제스트에서 중복 제외"""
+    emails = {(e or "").strip().lower() for e in (recipients or []) if (e or "").strip()}
+    if not emails or not by_category:
+        return
+    ts = _digest_now().isoformat() + "Z"
+    _digest_ledger_merge({e: {_digest_item_key(ship, cat, eq): ts for cat, eqs in by_category.items() for eq in eqs} for e in emails})
+
+def _digest_ledger_merge(new_recs: dict, prune_before=None):
+    """장부에 {수신자: {항목키: ts}} 병합 (+ prune_before 이전 기록 정리), 조건부 쓰기"""
+    def _apply(ledger):
+        ledger = ledger if isinstance(ledger, dict) else {}
+        changed = False
+        for to, recs in new_recs.items():
+            if recs: ledger.setdefault(to, {}).update(recs); changed = True
+        if prune_before is not None:
+            for to in list(ledger.keys()):
+                kept = {k: v for k, v in ledger[to].items() if (_digest_ts(v) or prune_before) > prune_before}
+                if len(kept) != len(ledger[to]): changed = True
+                if kept: ledger[to] = kept
+                else: del ledger[to]
+        return ledger if changed else None
+    s3_update_json(DIGEST_SENT_KEY, _apply, default={})
+
+def _digest_body(groups: dict) -> str:
+    lines = []
+    for (ship, category) in sorted(groups):
+        due = SHIP_DUE_DATES.get(ship, "")
+        lines.append(f"[Ship {ship} / {category}]" + (f" (기한: {due})" if due else "") + "\n"
+                     + "\n".join(f"- {x}" for x in groups[(ship, category)]))
+    listing = "\n\n".join(lines)
+    return f"""안녕하세요,
+
+담당하신 호선/시스템 중 아래 장비 입력이 아직 완료되지 않았습니다.
+
+{listing}
+
+번거로우시겠지만 기한 내 입력 부탁드립니다.
+
+감사합니다.
+"""
+
+def digest_flush(force: bool = False, dry_run: bool = False) -> dict:
+    """
+    window가 지난 수신자 큐를 묶어 수신자당 1통 발송
+    force=True 이면 window와 무관하게 전부 발송. dry_run=True 이면 발송/저장 없이 미리보기만 반환
+    """
+    now = _digest_now()
+    cooldown = datetime.timedelta(hours=DIGEST_COOLDOWN_HOURS)
+    window = datetime.timedelta(minutes=DIGEST_WINDOW_MINUTES)
+
+    def _split(queue):
+        """-> (발송 대상 {to: [ent]}, 큐에 남길 ent). 수신자 없는 항목은 버림"""
+        by_to = {}
+        for ent in queue if isinstance(queue, list) else []:
+            by_to.setdefault(ent.get("to", ""), []).append(ent)
+        due, keep = {}, []
+        for to, ents in by_to.items():
+            if not to: continue
+            oldest = min((_digest_ts(x.get("ts")) or now) for x in ents)
+            if force or now - oldest >= window: due[to] = ents
+            else: keep.extend(ents)
+        return due, keep
+
+    if dry_run:
+        due, keep = _split(_s3_get_json_list(DIGEST_QUEUE_KEY))
+    else:
+        claim = {}
+        def _take(queue):
+            due, keep = _split(queue)
+            claim.update(due=due, keep=keep)
+            return keep if len(keep) != len(queue if isinstance(queue, list) else []) else None
+        s3_update_json(DIGEST_QUEUE_KEY, _take, default=[])
+        due, keep = claim["due"], claim["keep"]
+    if not due:
+        return {"ok": True, "sent": 0, "suppressed": 0, "pending": len(keep), "mails": []}
+    ledger = s3_get_json(DIGEST_SENT_KEY, default={}) or {}
+
+    failed, new_recs, mails, suppressed, sent = [], {}, [], 0, 0
+    for to, ents in sorted(due.items()):
+        rec = ledger.get(to, {})
+        groups = {}
+        for ent in ents:
+            for eq in ent.get("items", []):
+                k = _digest_item_key(ent.get("ship"), ent.get("category"), eq)
+                last = _digest_ts(rec.get(k))
+                if last and now - last < cooldown:
+                    suppressed += 1; continue
+                lst = groups.setdefault((ent.get("ship"), ent.get("category")), [])
+                if eq not in lst: lst.append(eq)
+        groups = {g: v for g, v in groups.items() if v}
+        if not groups:
+            continue
+        n_items = sum(len(v) for v in groups.values())
+        subject = f"[HD] 미입력 장비 안내 ({len({g[0] for g in groups})}개 호선, {n_items}건)"
+        mail = {"to": to, "subject": subject, "items": n_items,
+                "groups": [{"ship": s, "category": c, "items": v} for (s, c), v in sorted(groups.items())]}
+        mails.append(mail)
+        if dry_run:
+            continue
+        try:
+            send_email_via_smtp([to], [], subject, _digest_body(groups))
+            sent += 1
+            ts = now.isoformat() + "Z"
+            rec = new_recs.setdefault(to, {})
+            for (s, c), v in groups.items():
+                for eq in v: rec[_digest_item_key(s, c, eq)] = ts
+                try:
+                    log_mail_event(s, c, action="digest", result="OK", purpose="digest", extra={"to": to, "items": len(v)})
+                except Exception as _ex:
+                    print("[WARN] log_mail_event failed:", _ex)
+        except Exception as e:
+            print("[WARN] digest mail send failed:", to, e)
+            mail["error"] = str(e)
+            failed.extend(ents)
+
+    if not dry_run:
+        if failed:
+            s3_update_json(DIGEST_QUEUE_KEY, lambda q: (q if isinstance(q, list) else []) + failed, default=[])
+        # 발송 기록 병합 + 오래된 cooldown 기록 정리
+        _digest_ledger_merge(new_recs, prune_before=now - cooldown)
+    return {"ok": True, "sent": sent, "suppressed": suppressed, "pending": len(keep) + len(failed), "mails": mails}
+
+def _digest_maybe_flush():
+    try:
+        digest_flush()
+    except Exception as e:
+        print("[WARN] digest flush failed:", e)
+
+_DIGEST_FLUSHER = {"thread": None}
+
+def start_digest_flusher():
+    """worker당 1개 데몬 스레드: DIGEST_FLUSH_INTERVAL_SECONDS 마다 window 지난 큐 발송 (enqueue가 더 없어도)"""
+    if not DIGEST_ENABLED or DIGEST_FLUSH_INTERVAL_SECONDS <= 0 or not _s3_configured():
+        return False
+    if _DIGEST_FLUSHER["thread"] is not None:
+        return False
+    def _loop():
+        while True:
+            time.sleep(DIGEST_FLUSH_INTERVAL_SECONDS * random.uniform(0.9, 1.1))  # worker 간 시각 분산
+            _digest_maybe_flush()
+    t = _DIGEST_FLUSHER["thread"] = threading.Thread(target=_loop, name="digest-flush", daemon=True)
+    t.start()
+    return True
+
+@app.route("/admin/digest/flush", methods=["POST"])
+def admin_digest_flush():
+    _require_admin()
+    force = (request.form.get("force") or request.args.get("force") or "") in ("1", "true")
+    dry_run = (request.form.get("dry_run") or request.args.get("dry_run") or "") in ("1", "true")
+    res = digest_flush(force=force, dry_run=dry_run)
+    if not dry_run:
+        append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "admin","action": "digest_flush",
+                             "ship": "-", "category": "-", "equipment": "-","result": f"sent={res['sent']}, suppressed={res['suppressed']}"})
+    return jsonify(res)
+
 
 @app.route("/admin/ship_mail/<ship_number>", methods=["POST"])
 def send_ship_mail(ship_number):
     _require_admin()
-    catalog = load_catalog(ship_number)
-    to_emails, body_text, missing_cnt, by_category = _build_missing_report(ship_number, catalog if catalog else {})
+    to_emails, body_text, missing_cnt, by_category = _build_missing_report(ship_number)
     cc_emails = request.form.getlist("cc_emails")
     if missing_cnt == 0:
         msg = f"Ship {ship_number}: 미입력 항목이 없습니다. 메일을 보내지 않았습니다."
@@ -1168,6 +2891,11 @@ def send_ship_mail(ship_number):
         sent = True
     except Exception as e:
         err = str(e); print("[ERROR] SMTP send_email failed:", e)
+    if sent:
+        try:
+            digest_record_sent(to_emails, ship_number, by_category)
+        except Exception as _ex:
+            print("[WARN] digest_record_sent failed:", _ex)
     archive = {
         "ts": datetime.datetime.now().isoformat(),"ship": ship_number,"to": to_emails, "cc": cc_emails,
         "subject": subject, "body": body_text,"sent": sent,"method": "smtp","error": err,
@@ -1175,6 +2903,7 @@ def send_ship_mail(ship_number):
     }
     s3_put_json(f"{MAIL_ARCHIVE_PREFIX}{ship_number}_bulk_{int(datetime.datetime.now().timestamp())}.json", archive)
     append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "admin","action": "mail_bulk_send","ship": ship_number,"result": "ok" if sent else f"fail:{err}"})
+    publish_event("mail_sent", ship_number, purpose="ship_bulk", ok=sent, error=err, to=to_emails, missing=missing_cnt)
     if request.headers.get("X-Requested-With") == "fetch":
         return jsonify({"ok": sent, "message": ("전송 완료" if sent else f"전송 실패: {err}"),
                         "missing": missing_cnt, "to": to_emails, "cc": cc_emails}), (200 if sent else 500)
@@ -1216,6 +2945,7 @@ def admin_invite_owner():
         err = str(e)
     append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "admin","action": "invite_owner",
                          "ship": ship, "category": category, "equipment": "-","result": "ok" if ok else f"fail:{err}", "target": email})
+    publish_event("mail_sent", ship, category, purpose="invite_owner", ok=ok, error=err, to=[email])
     # ✅ 메일 이벤트 별도 로그(S3)
     try:
         log_mail_event(ship, category, action="invite", result=("OK" if ok else f"ERROR: {err}"), purpose="invite_owner", extra={"email": email, "by": "admin_click"})
@@ -1260,8 +2990,14 @@ def admin_system_mail():
         send_email_via_smtp(to_emails, [], subject, body); ok = True
     except Exception as e:
         err = str(e)
+    if ok:
+        try:
+            digest_record_sent(to_emails, ship, {category: _digest_pending_items(block)})
+        except Exception as _ex:
+            print("[WARN] digest_record_sent failed:", _ex)
     append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "admin","action": "system_mail_send",
                          "ship": ship, "category": category, "equipment": "-","result": "ok" if ok else f"fail:{err}"})
+    publish_event("mail_sent", ship, category, purpose="manual_system_mail", ok=ok, error=err, to=to_emails)
     # ✅ 메일 이벤트 별도 로그(S3)
     try:
         log_mail_event(ship, category, action="manual_mail", result=("OK" if ok else f"ERROR: {err}"), purpose="manual_system_mail", extra={"by": "admin_click"})
@@ -1289,6 +3025,7 @@ def admin_item_delete():
     save_catalog(ship, catalog)
     append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "admin","action": "item_delete",
                          "ship": ship, "category": category, "equipment": eq})
+    _publish_item_event("item_deleted", ship, category, eq, catalog)
     return jsonify({"ok": True})
 
 @app.route("/admin/item_restore", methods=["POST"])
@@ -1307,9 +3044,11 @@ def admin_item_restore():
     save_catalog(ship, catalog)
     append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "admin","action": "item_restore",
                          "ship": ship, "category": category, "equipment": eq})
+    _publish_item_event("item_restored", ship, category, eq, catalog)
     return jsonify({"ok": True})
 
 @app.route("/admin/invite_all_contacts", methods=["POST"])
+@s3_budget_seconds(None)
 def admin_invite_all_contacts():
     _require_admin()
     contacts = (get_contacts() or {}).get("list", [])
@@ -1341,55 +3080,2210 @@ def admin_invite_all_contacts():
 @app.route("/admin/catalog_regen/<ship_number>", methods=["POST"])
 def admin_catalog_regen(ship_number):
     _require_admin()
-    create_catalog(ship_number)
+    catalog = create_catalog(ship_number)
     append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "admin","action": "catalog_regen",
                          "ship": ship_number, "category": "-", "equipment": "-","result": "ok"})
+    publish_event("catalog_regen", ship_number, progress=_ship_progress(ship_number, catalog))
     if request.headers.get("X-Requested-With") == "fetch":
         return jsonify({"ok": True})
     flash(f"Ship {ship_number} 카탈로그를 7~10개 랜덤으로 재생성했습니다.")
     return redirect(url_for("admin_dashboard", _=int(time.time())))
 
+# ================== 로컬 DB (data.db) ==================
+_DB_LOCAL = threading.local()
+
+def _db():
+    """스레드별 SQLite 연결 (WAL: 같은 호스트의 여러 gunicorn worker가 공유)"""
+    conn = getattr(_DB_LOCAL, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DATA_DB_PATH, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _DB_LOCAL.conn = conn
+    return conn
+
+@contextmanager
+def _db_tx(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK"); raise
+    else:
+        conn.execute("COMMIT")
+
+# ================== 카탈로그 SQL 미러 (data.db) ==================
+# 전 호선 카탈로그를 items/categories/owners 테이블로 미러링 -> 관리자 집계는 S3 전체 스캔 대신 SQL
+# - save_catalog 변경분(_diff_catalog)으로 증분 반영 (+ put ETag 기록)
+# - MIRROR_RECONCILE_SECONDS 마다 목록 ETag 비교로 다른 호스트/수동 변경분 재동기화
+_MIRROR_READY = False
+_MIRROR_ITEM_COLS = _FLEET_TEXT_FIELDS + ("status", "deleted", "has_input", "submitter_norm")
+
+def _ensure_mirror_tables():
+    global _MIRROR_READY
+    if _MIRROR_READY: return
+    cols = ", ".join(f"{c} TEXT" for c in _FLEET_TEXT_FIELDS)
+    _db().executescript(f"""
+        CREATE TABLE IF NOT EXISTS mirror_ships (ship TEXT PRIMARY KEY, etag TEXT, synced_at TEXT);
+        CREATE TABLE IF NOT EXISTS mirror_categories (ship TEXT, category TEXT, pos INTEGER, status TEXT, ex_proof TEXT,
+            PRIMARY KEY (ship, category));
+        CREATE TABLE IF NOT EXISTS mirror_owners (ship TEXT, category TEXT, name TEXT, email TEXT, phone TEXT);
+        CREATE INDEX IF NOT EXISTS idx_mirror_owners_cat ON mirror_owners(ship, category);
+        CREATE INDEX IF NOT EXISTS idx_mirror_owners_email ON mirror_owners(email);
+        CREATE TABLE IF NOT EXISTS mirror_items (ship TEXT, category TEXT, eq TEXT, pos INTEGER, {cols},
+            status TEXT, deleted INTEGER, has_input INTEGER, submitter_norm TEXT, PRIMARY KEY (ship, category, eq));
+        CREATE INDEX IF NOT EXISTS idx_mirror_items_pos ON mirror_items(ship, pos);
+        CREATE INDEX IF NOT EXISTS idx_mirror_items_state ON mirror_items(deleted, has_input);
+        CREATE INDEX IF NOT EXISTS idx_mirror_items_status ON mirror_items(ship, deleted, status);
+        CREATE INDEX IF NOT EXISTS idx_mirror_items_submitter_norm ON mirror_items(submitter_norm, deleted);
+        CREATE TABLE IF NOT EXISTS mirror_meta (k TEXT PRIMARY KEY, v TEXT);
+    """)
+    if "contact_id" not in {r[1] for r in _db().execute("PRAGMA table_info(mirror_owners)")}:
+        _db().execute("ALTER TABLE mirror_owners ADD COLUMN contact_id TEXT")
+    _db().execute("CREATE INDEX IF NOT EXISTS idx_mirror_owners_contact ON mirror_owners(contact_id)")
+    if "pending" not in {r[1] for r in _db().execute("PRAGMA table_info(mirror_categories)")}:
+        with _db_tx(_db()) as conn:
+            conn.execute("ALTER TABLE mirror_categories ADD COLUMN pending INTEGER")
+            conn.execute("ALTER TABLE mirror_categories ADD COLUMN total INTEGER")
+            _mirror_category_counts(conn)
+    _MIRROR_READY = True
+
+def _norm_submitter(s) -> str:
+    """내 담당 조회용 정규화 입력자 (대소문자/앞뒤 공백 무시)"""
+    return str(s or "").strip().lower()
+
+def _mirror_item_values(info: dict) -> tuple:
+    info = info if isinstance(info, dict) else {}
+    vals = tuple(str(info.get(f) or "") for f in _FLEET_TEXT_FIELDS)
+    return vals + (_recompute_status(info), int(bool(info.get("__deleted__"))), int(_has_any_input(info)),
+                   _norm_submitter(info.get("submitter_name")))
+
+def _mirror_upsert_item(conn, ship, category, eq, info):
+    sets = ", ".join(f"{c}=excluded.{c}" for c in _MIRROR_ITEM_COLS)
+    conn.execute(f"""INSERT INTO mirror_items (ship, category, eq, pos, {', '.join(_MIRROR_ITEM_COLS)})
+        VALUES (?, ?, ?, (SELECT COALESCE(MAX(pos), 0) + 1 FROM mirror_items WHERE ship = ?), {', '.join('?' * len(_MIRROR_ITEM_COLS))})
+        ON CONFLICT(ship, category, eq) DO UPDATE SET {sets}""",
+        (ship, category, eq, ship) + _mirror_item_values(info))
+
+def _mirror_category_meta(conn, ship, category, block):
+    conn.execute("DELETE FROM mirror_owners WHERE ship = ? AND category = ?", (ship, category))
+    if not isinstance(block, dict):
+        conn.execute("DELETE FROM mirror_categories WHERE ship = ? AND category = ?", (ship, category))
+        return
+    conn.execute("""INSERT INTO mirror_categories (ship, category, pos, status, ex_proof)
+        VALUES (?, ?, (SELECT COALESCE(MAX(pos), 0) + 1 FROM mirror_categories WHERE ship = ?), ?, ?)
+        ON CONFLICT(ship, category) DO UPDATE SET status=excluded.status, ex_proof=excluded.ex_proof""",
+        (ship, category, ship, block.get("__status__") or "미입력", block.get("__ex_proof__") or ""))
+    rows = []
+    for o in map(resolve_contact, block.get("__owners__") or []):
+        if not o: continue
+        n, e, p = _normalize_contact(o.get("name"), o.get("email"), o.get("phone"))
+        rows.append((ship, category, o.get("id") or "", n, e, p))
+    conn.executemany("INSERT INTO mirror_owners (ship, category, contact_id, name, email, phone) VALUES (?,?,?,?,?,?)", rows)
+
+def _mirror_category_counts(conn, ship=None, category=None):
+    """mirror_categories.pending/total 재계산 (쓰기 시 바뀐 카테고리만, 인자 없으면 전체)"""
+    where, args = ("WHERE ship = ? AND category = ?", (ship, category)) if ship is not None else ("", ())
+    conn.execute(f"""UPDATE mirror_categories SET
+        pending = (SELECT COUNT(*) FROM mirror_items i WHERE i.ship = mirror_categories.ship
+                   AND i.category = mirror_categories.category AND i.deleted = 0 AND i.status != 'done'),
+        total = (SELECT COUNT(*) FROM mirror_items i WHERE i.ship = mirror_categories.ship
+                 AND i.category = mirror_categories.category AND i.deleted = 0) {where}""", args)
+
+def _mirror_remove_category(conn, ship, category):
+    conn.execute("DELETE FROM mirror_items WHERE ship = ? AND category = ?", (ship, category))
+    _mirror_category_meta(conn, ship, category, None)
+
+def _mirror_category(conn, ship, category, block):
+    _mirror_remove_category(conn, ship, category)
+    if not isinstance(block, dict): return
+    _mirror_category_meta(conn, ship, category, block)
+    for eq, info in block.items():
+        if str(eq).startswith("__") or not isinstance(info, dict): continue
+        _mirror_upsert_item(conn, ship, category, eq, info)
+    _mirror_category_counts(conn, ship, category)
+
+def _mirror_set_ship(conn, ship, etag):
+    conn.execute("INSERT OR REPLACE INTO mirror_ships (ship, etag, synced_at) VALUES (?,?,?)",
+                 (ship, etag or "", datetime.datetime.now().isoformat(timespec="seconds")))
+
+def _mirror_ship(conn, ship, catalog, etag):
+    """호선 전체 교체"""
+    for t in ("mirror_items", "mirror_categories", "mirror_owners"):
+        conn.execute(f"DELETE FROM {t} WHERE ship = ?", (ship,))
+    for category, block in (catalog or {}).items():
+        _mirror_category(conn, ship, category, block)
+    _mirror_set_ship(conn, ship, etag)
+
+def mirror_apply(ship_number, catalog: dict, changes: list, etag: str = None):
+    """save_catalog 변경분만 반영. 미러에 없던 호선이면 전체 반영"""
+    _ensure_mirror_tables()
+    conn = _db(); ship = str(ship_number)
+    with _db_tx(conn):
+        if conn.execute("SELECT 1 FROM mirror_ships WHERE ship = ?", (ship,)).fetchone() is None:
+            _mirror_ship(conn, ship, catalog, etag)
+            return
+        touched = set()
+        for ch in changes or []:
+            category = ch.get("category"); eq = ch.get("eq")
+            if eq is None:
+                _mirror_category(conn, ship, category, catalog.get(category) if ch.get("op") == "set" else None)
+                continue
+            if str(eq).startswith("__"):
+                _mirror_category_meta(conn, ship, category, catalog.get(category))
+            elif ch.get("op") == "set" and isinstance(ch.get("value"), dict):
+                _mirror_upsert_item(conn, ship, category, eq, ch["value"])
+            else:
+                conn.execute("DELETE FROM mirror_items WHERE ship = ? AND category = ? AND eq = ?", (ship, category, eq))
+            touched.add(category)
+        for category in touched:
+            _mirror_category_counts(conn, ship, category)
+        _mirror_set_ship(conn, ship, etag)
+
+def mirror_reconcile() -> dict:
+    """S3 목록 ETag와 비교해 바뀐 호선만 다시 읽고, 사라진 호선은 삭제"""
+    _ensure_mirror_tables()
+    t0 = time.perf_counter()
+    s3 = s3_client()
+    remote = {_ship_from_catalog_key(o["Key"]): (o["Key"], o.get("ETag", "")) for o in _list_catalog_objects(s3)}
+    conn = _db()
+    local = dict(conn.execute("SELECT ship, etag FROM mirror_ships").fetchall())
+    stale = [(sh, k, et) for sh, (k, et) in remote.items() if local.get(sh) != et or not et]
+    gone = [sh for sh in local if sh not in remote]
+
+    def _fetch(arg):
+        sh, k, et = arg
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=k)
+        return sh, obj.get("ETag") or et, read_json_object(obj)
+    fetched = []
+    if stale:
+        with ThreadPoolExecutor(max_workers=CATALOG_FETCH_THREADS) as pool:
+            fetched = list(pool.map(_fetch, stale))
+    with _db_tx(conn):
+        for sh, et, catalog in fetched:
+            _mirror_ship(conn, sh, catalog if isinstance(catalog, dict) else {}, et)
+        for sh in gone:
+            for t in ("mirror_items", "mirror_categories", "mirror_owners", "mirror_ships"):
+                conn.execute(f"DELETE FROM {t} WHERE ship = ?", (sh,))
+        conn.execute("INSERT OR REPLACE INTO mirror_meta (k, v) VALUES ('reconciled_at', ?)", (str(time.time()),))
+    return {"ships": len(remote), "refreshed": len(fetched), "removed": len(gone), "sec": round(time.perf_counter() - t0, 3)}
+
+def _mirror_fresh():
+    """미러 읽기 전 호출: 마지막 reconcile 이후 MIRROR_RECONCILE_SECONDS 지났으면 재동기화"""
+    _ensure_mirror_tables()
+    row = _db().execute("SELECT v FROM mirror_meta WHERE k = 'reconciled_at'").fetchone()
+    if row is None or time.time() - float(row[0]) >= MIRROR_RECONCILE_SECONDS:
+        mirror_reconcile()
+
+def mirror_sync_ship(ship_number):
+    """단일 호선 HEAD(ETag) 비교 후 바뀌었으면 다시 읽음 (메일 발송 등 최신성이 중요한 경우)"""
+    _ensure_mirror_tables()
+    ship = str(ship_number); key = _catalog_key(ship)
+    s3 = s3_client(); conn = _db()
+    try:
+        etag = s3.head_object(Bucket=S3_BUCKET, Key=key).get("ETag", "")
+    except Exception:
+        etag = None
+    row = conn.execute("SELECT etag FROM mirror_ships WHERE ship = ?", (ship,)).fetchone()
+    if etag is None:
+        if row is not None:
+            with _db_tx(conn):
+                for t in ("mirror_items", "mirror_categories", "mirror_owners", "mirror_ships"):
+                    conn.execute(f"DELETE FROM {t} WHERE ship = ?", (ship,))
+        return
+    if row is not None and row[0] == etag:
+        return
+    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
+    catalog = read_json_object(obj)
+    with _db_tx(conn):
+        _mirror_ship(conn, ship, catalog if isinstance(catalog, dict) else {}, obj.get("ETag") or etag)
+
+def mirror_deleted_items() -> dict:
+    _mirror_fresh()
+    out = {}
+    for ship, category, eq in _db().execute("SELECT ship, category, eq FROM mirror_items WHERE deleted = 1 ORDER BY ship, pos"):
+        out.setdefault(ship, {}).setdefault(category, []).append(eq)
+    return out
+
+def mirror_missing_items(ship_number) -> tuple:
+    """-> (category -> [미입력 eq], 담당자 이메일 set)"""
+    mirror_sync_ship(ship_number)
+    conn = _db(); ship = str(ship_number)
+    by_category = {}
+    for category, eq in conn.execute("""SELECT i.category, i.eq FROM mirror_items i
+            JOIN mirror_categories c ON c.ship = i.ship AND c.category = i.category
+            WHERE i.ship = ? AND i.deleted = 0 AND i.status != 'done' ORDER BY c.pos, i.pos""", (ship,)):
+        by_category.setdefault(category, []).append(eq)
+    # 이메일은 현재 연락처 기준 (미러 저장 이후 연락처가 바뀌었을 수 있음)
+    by_id = contact_resolver()["by_id"]
+    emails = set()
+    for cid, e in conn.execute("SELECT DISTINCT contact_id, email FROM mirror_owners WHERE ship = ?", (ship,)):
+        e = (by_id.get(cid) or {}).get("email") or e
+        if e: emails.add(e)
+    return by_category, emails
+
+@app.route("/admin/mirror/reconcile", methods=["POST"])
+@s3_budget_seconds(None)
+def admin_mirror_reconcile():
+    _require_admin()
+    return jsonify({"ok": True, **mirror_reconcile()})
+
+# ================== 내 담당 (전 호선, 미러 색인) ==================
+# owner(contact_id/email) -> (ship, category, pending/total), submitter_norm(소문자 입력자) -> 항목
+# 미러는 save_catalog 마다 증분 갱신되고 카테고리별 pending/total도 그때 재계산 -> 조회 비용은 본인 배정 수에 비례
+def _my_identity(email: str) -> tuple:
+    """
+    -> (contact id 목록, submitter_name 후보 목록). 연락처에서 이메일이 같은 항목 전부.
+    입력자는 이메일로 기록되므로 이메일로 매칭하고, 이름은 그 이름을 쓰는 연락처가 나뿐일 때만 (동명이인 제외)
+    """
+    email = (email or "").strip().lower()
+    everyone = contact_resolver()["by_id"].values()
+    recs = {rec["id"]: rec for rec in everyone if rec.get("email") == email}
+    mine = {_norm_submitter(rec["name"]) for rec in recs.values() if rec.get("name")}
+    shared = {_norm_submitter(rec.get("name")) for rec in everyone if rec.get("email") != email} & mine
+    return sorted(recs), sorted({email} | (mine - shared))
+
+def my_assignments(email: str) -> dict:
+    t0 = time.perf_counter()
+    try:
+        _mirror_fresh()
+    except Exception as e:
+        # S3 장애 시 마지막으로 동기화된 미러로 응답 (stale 표시)
+        if not _s3_transient(e): raise
+        row = _db().execute("SELECT v FROM mirror_meta WHERE k = 'reconciled_at'").fetchone()
+        _mark_stale("mirror", float(row[0]) if row else 0.0)
+    email = (email or "").strip().lower()
+    ids, names = _my_identity(email)
+    conn = _db()
+    # contact_id(현재 연락처 기준) 또는 미러 저장 당시 이메일로 매칭 (id 없는 구형 owner)
+    owned = f"""SELECT DISTINCT ship, category FROM mirror_owners
+        WHERE email = ?{' OR contact_id IN (' + ','.join('?' * len(ids)) + ')' if ids else ''}"""
+    cats = {}
+    for ship, category, status, ex_proof, pending, total in conn.execute(f"""
+            SELECT c.ship, c.category, c.status, c.ex_proof, c.pending, c.total
+            FROM ({owned}) o JOIN mirror_categories c ON c.ship = o.ship AND c.category = o.category
+            ORDER BY c.ship, c.pos""", [email, *ids]):
+        cats[(ship, category)] = {"ship": ship, "category": category, "status": status, "ex_proof": ex_proof,
+                                  "pending": pending or 0, "total": total or 0, "pending_items": []}
+    for ship, category, eq in conn.execute(f"""
+            SELECT i.ship, i.category, i.eq FROM ({owned}) o
+            JOIN mirror_items i ON i.ship = o.ship AND i.category = o.category
+            WHERE i.deleted = 0 AND i.status != 'done' ORDER BY i.ship, i.pos""", [email, *ids]):
+        if (ship, category) in cats:
+            cats[(ship, category)]["pending_items"].append(eq)
+    submitted = [{"ship": r[0], "category": r[1], "eq": r[2], "status": r[3], "last_modified": r[4]}
+                 for r in conn.execute(f"""SELECT ship, category, eq, status, last_modified FROM mirror_items
+                     WHERE submitter_norm IN ({','.join('?' * len(names))}) AND deleted = 0
+                     ORDER BY last_modified DESC, ship, pos""", names)]
+    assignments = list(cats.values())
+    ships = {}
+    for a in assignments:
+        sh = ships.setdefault(a["ship"], {"ship": a["ship"], "categories": 0, "pending": 0, "total": 0})
+        sh["categories"] += 1; sh["pending"] += a["pending"]; sh["total"] += a["total"]
+    return {"email": email, "contact_ids": ids, "assignments": assignments, "ships": list(ships.values()),
+            "pending": sum(a["pending"] for a in assignments), "submitted": submitted,
+            "took_ms": round((time.perf_counter() - t0) * 1000.0, 2)}
+
+@app.route("/api/my/assignments")
+@login_required
+def api_my_assignments():
+    res = my_assignments(_current_user_email())
+    return jsonify({"ok": True, "stale": is_stale(), **res})
+
+@app.route("/my")
+@login_required
+def my_page():
+    return render_template("my.html", res=my_assignments(_current_user_email()))
+
+# ================== 공유 캐시 (같은 호스트의 모든 worker) ==================
+# cache.db(SQLite WAL)에 key -> (etag, version, JSON bytes). 카탈로그/연락처만 대상.
+# - 쓰기(s3_put_json)는 write-through: 새 데이터+ETag로 교체, version+1 -> 다른 worker도 즉시 새 값
+# - 읽기: SHARED_CACHE_REVALIDATE_SECONDS 이내 검증분은 그대로, 지나면 If-None-Match 조건부 GET (304면 본문 재사용)
+#   S3에서 받은 본문은 읽기 시작할 때 본 version이 그대로일 때만 채움 -> 그 사이 write-through된 새 값을 옛 본문으로 덮지 않음
+# - 전체 크기가 SHARED_CACHE_MAX_BYTES 를 넘으면 last_access 오래된 것부터 삭제(LRU)
+_CACHE_LOCAL = threading.local()
+_CACHE_COUNTS = {"hits": 0, "misses": 0, "revalidated": 0, "evicted": 0, "stale": 0}
+_CACHE_COUNTS_LOCK = threading.Lock()
+_CACHE_FLUSHED_AT = [0.0]
+
+def _cache_db():
+    conn = getattr(_CACHE_LOCAL, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, etag TEXT, version INTEGER, data BLOB,
+                size INTEGER, validated_at REAL, last_access REAL);
+            CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache_entries(last_access);
+            CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, n INTEGER);
+        """)
+        _CACHE_LOCAL.conn = conn
+    return conn
+
+def _shared_cacheable(key: str) -> bool:
+    return SHARED_CACHE_ENABLED and (key == CONTACTS_KEY or _is_catalog_object_key(key))
+
+def _cache_count(name, n=1):
+    with _CACHE_COUNTS_LOCK:
+        _CACHE_COUNTS[name] += n
+    if time.time() - _CACHE_FLUSHED_AT[0] >= 5:
+        _cache_flush_counts()
+
+def _cache_flush_counts():
+    """worker별 카운터를 공유 테이블에 합산 (5초마다)"""
+    with _CACHE_COUNTS_LOCK:
+        deltas = {k: v for k, v in _CACHE_COUNTS.items() if v}
+        for k in deltas: _CACHE_COUNTS[k] = 0
+        _CACHE_FLUSHED_AT[0] = time.time()
+    if deltas:
+        _cache_db().executemany("INSERT INTO cache_stats (name, n) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET n = n + excluded.n",
+                                list(deltas.items()))
+
+def shared_cache_put(key: str, data, etag: str, expect_version: int = None) -> bool:
+    """
+    expect_version=None: write-through (무조건 교체)
+    expect_version=n: 읽기 채움 - 현재 version이 n(없으면 0)일 때만 교체 -> 교체 여부 반환
+    """
+    body = json_dumps_bytes(data); now = time.time()
+    conn = _cache_db()
+    with _db_tx(conn):
+        if expect_version is not None:
+            cur = conn.execute("SELECT version FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            if (cur[0] if cur else 0) != expect_version:
+                return False
+        conn.execute("""INSERT INTO cache_entries (key, etag, version, data, size, validated_at, last_access) VALUES (?,?,1,?,?,?,?)
+            ON CONFLICT(key) DO UPDATE SET etag=excluded.etag, version=version+1, data=excluded.data, size=excluded.size,
+            validated_at=excluded.validated_at, last_access=excluded.last_access""", (key, etag or "", body, len(body), now, now))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        evicted = 0
+        if total > SHARED_CACHE_MAX_BYTES:
+            for k, size in conn.execute("SELECT key, size FROM cache_entries WHERE key != ? ORDER BY last_access", (key,)).fetchall():
+                conn.execute("DELETE FROM cache_entries WHERE key = ?", (k,))
+                total -= size; evicted += 1
+                if total <= SHARED_CACHE_MAX_BYTES: break
+    if evicted: _cache_count("evicted", evicted)
+    return True
+
+def shared_cache_invalidate(key: str):
+    _cache_db().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+def s3_get_json_cached(key, default=None):
+    """s3_get_json 과 같은 계약(없음 -> default, 장애 -> S3Unavailable) + 공유 캐시. 장애 시 캐시본이 있으면 stale 표시 후 반환"""
+    if not _shared_cacheable(key):
+        return s3_get_json(key, default=default)
+    conn = _cache_db(); now = time.time()
+    row = conn.execute("SELECT etag, data, validated_at, last_access, version FROM cache_entries WHERE key = ?", (key,)).fetchone()
+    if row is not None and now - row[2] < SHARED_CACHE_REVALIDATE_SECONDS:
+        if now - row[3] >= 1:
+            conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key))
+        _cache_count("hits")
+        return json_loads_bytes(row[1])
+    try:
+        obj, body = _s3_call(_s3_get_bytes, key, **({"IfNoneMatch": row[0]} if row is not None and row[0] else {}))
+    except ClientError as e:
+        code = str(e.response.get("Error", {}).get("Code"))
+        if row is not None and (code in ("304", "NotModified") or e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304):
+            conn.execute("UPDATE cache_entries SET validated_at = ?, last_access = ? WHERE key = ?", (now, now, key))
+            _cache_count("revalidated")
+            return json_loads_bytes(row[1])
+        if code in ("NoSuchKey", "404"):
+            shared_cache_invalidate(key)
+            return default
+        raise
+    except S3Unavailable:
+        if row is None: raise
+        _cache_count("stale"); _mark_stale(key, row[2])
+        return json_loads_bytes(row[1])
+    data = json_loads_bytes(body)
+    _cache_count("misses")
+    try:
+        shared_cache_put(key, data, obj.get("ETag"), expect_version=row[4] if row is not None else 0)
+    except Exception as e:
+        print(f"[WARN] shared cache put failed key={key}: {e}")
+    return data
+
+def shared_cache_stats() -> dict:
+    _cache_flush_counts()
+    conn = _cache_db()
+    entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+    c = dict(conn.execute("SELECT name, n FROM cache_stats").fetchall())
+    hits = c.get("hits", 0) + c.get("revalidated", 0); total = hits + c.get("misses", 0)
+    return {"entries": entries, "bytes": size, "max_bytes": SHARED_CACHE_MAX_BYTES, **{k: c.get(k, 0) for k in _CACHE_COUNTS},
+            "hit_ratio": round(hits / total, 3) if total else 0.0}
+
+# ================== 실시간 이벤트(SSE) ==================
+# 이벤트는 data.db의 events 테이블에 기록 -> 모든 worker의 /admin/events 스트림이 id 순으로 읽어 전송
+_EVENTS_READY = False
+
+def _ensure_events_table():
+    global _EVENTS_READY
+    if _EVENTS_READY: return
+    _db().execute("""CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts TEXT, type TEXT, ship TEXT, category TEXT, equipment TEXT, payload TEXT)""")
+    _EVENTS_READY = True
+
+def _submission_row(ship: str, category: str, eq: str, info: dict) -> dict:
+    """list_all_submissions 형식의 단일 행"""
+    row = {"ship_number": ship, "category": category, "equipment_name": eq}
+    for f in _FLEET_TEXT_FIELDS: row[f] = (info or {}).get(f) or ""
+    row["status"] = _recompute_status(info or {})
+    row["responsible"] = {}
+    row["due_date"] = SHIP_DUE_DATES.get(ship, "")
+    return row
+
+def _ship_progress(ship: str, catalog: dict) -> dict:
+    t = FleetTable.from_catalogs({ship: catalog or {}})
+    return {"incomplete": t.incomplete_counts().get(ship, 0), "pct": t.completion_pct().get(ship, 0.0)}
+
+def publish_event(etype: str, ship: str = "", category: str = "", equipment: str = "", **payload):
+    """변경 이벤트 기록. 실패해도 원래 요청은 계속 진행"""
+    try:
+        _ensure_events_table()
+        conn = _db()
+        conn.execute("INSERT INTO events (ts, type, ship, category, equipment, payload) VALUES (?,?,?,?,?,?)",
+                     (datetime.datetime.now().isoformat(timespec="seconds"), etype, ship or "", category or "",
+                      equipment or "", json.dumps(payload, ensure_ascii=False)))
+        conn.execute("DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?", (SSE_EVENT_RETENTION,))
+    except Exception as e:
+        print("[WARN] publish_event failed:", e)
+
+def _publish_item_event(etype: str, ship: str, category: str, eq: str, catalog: dict):
+    info = ((catalog or {}).get(category) or {}).get(eq) or {}
+    publish_event(etype, ship, category, eq, row=_submission_row(ship, category, eq, info),
+                  deleted=bool(info.get("__deleted__")), has_input=_has_any_input(info),
+                  progress=_ship_progress(ship, catalog))
+
+def _events_after(last_id: int, limit: int = 200) -> list:
+    _ensure_events_table()
+    cur = _db().execute("SELECT id, ts, type, ship, category, equipment, payload FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                        (last_id, limit))
+    return cur.fetchall()
+
+def _events_max_id() -> int:
+    _ensure_events_table()
+    return _db().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+@app.route("/admin/events")
+@s3_budget_seconds(None)
+def admin_events():
+    """
+    Server-Sent Events 스트림
+    - Last-Event-ID(헤더) 또는 ?last_event_id= 이후 이벤트부터 재개, 없으면 현재 시점부터
+    - SSE_HEARTBEAT_SECONDS 마다 heartbeat 주석 전송
+    - SSE_MAX_SECONDS 후 종료 -> 브라우저 EventSource가 Last-Event-ID로 자동 재접속 (sync worker 점유 방지)
+    """
+    _require_admin()
+    raw = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or ""
+    try:
+        last_id = int(raw)
+    except ValueError:
+        last_id = _events_max_id()
+
+    def gen(last_id):
+        started = time.monotonic(); last_beat = started
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while time.monotonic() - started < SSE_MAX_SECONDS:
+            rows = _events_after(last_id)
+            for eid, ts, etype, ship, category, eq, payload in rows:
+                data = {"id": eid, "ts": ts, "type": etype, "ship": ship, "category": category, "equipment": eq}
+                data.update(json.loads(payload or "{}"))
+                yield f"id: {eid}\nevent: {etype}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                last_id = eid
+            now = time.monotonic()
+            if rows:
+                last_beat = now
+                continue
+            if now - last_beat >= SSE_HEARTBEAT_SECONDS:
+                yield f": heartbeat {int(time.time())}\n\n"
+                last_beat = now
+            time.sleep(SSE_POLL_SECONDS)
+
+    resp = Response(stream_with_context(gen(last_id)), mimetype="text/event-stream")
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+# ================== 델타 동기화 API ==================
+def _resolve_change(ch: dict) -> dict:
+    """저널 변경분(contact id 저장형)을 클라이언트용 담당자 dict로 해석"""
+    if ch.get("op") != "set": return ch
+    eq, v = ch.get("eq"), ch.get("value")
+    if eq is None and isinstance(v, dict):
+        v = resolve_contact_refs({ch.get("category"): copy.deepcopy(v)})[ch.get("category")]
+    elif eq == "__owners__" and isinstance(v, list):
+        v = [o for o in map(resolve_contact, v) if o]
+    elif isinstance(eq, str) and not eq.startswith("__") and isinstance(v, dict) and "responsible" in v:
+        v = {**v, "responsible": resolve_contact(v["responsible"])}
+    else:
+        return ch
+    return {**ch, "value": v}
+
+@app.route("/api/catalog/<ship_number>")
+@cache_policy("revalidate")
+def api_catalog(ship_number):
+    """
+    ?since=<rev> 이후 변경분만 반환 (mode=delta)
+    since 없음 / 저널에서 잘림 / 대량 변경(reset) 이후면 전체 스냅샷 (mode=snapshot)
+    """
+    if not (session.get("user") or _require_token()):
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    since = request.args.get("since")
+    if since not in (None, ""):
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({"ok": False, "error": "since must be an integer"}), 400
+        try:
+            rev, changes = catalog_changes_since(ship_number, since)
+        except S3Unavailable:
+            changes = None      # 저널을 못 읽으면 스냅샷(필요 시 캐시 정상본)으로
+        if changes is not None:
+            # 같은 rev라도 since마다 본문이 다르므로 ETag에 since 포함
+            etag = f"{ship_number}-{rev}-d{since}"
+            if etag in request.if_none_match:
+                return _not_modified(etag)
+            changes = [_resolve_change(ch) for ch in changes]
+            resp = jsonify({"ok": True, "ship": ship_number, "mode": "delta", "since": since, "rev": rev, "changes": changes})
+            resp.set_etag(etag)
+            return resp.make_conditional(request)
+    # rev를 먼저 읽음: 이후 저장이 끼어들어도 본문은 rev보다 같거나 최신 (ETag가 옛 본문을 가리키지 않음)
+    try:
+        rev = catalog_revision(ship_number)
+    except S3Unavailable:
+        rev = None
+    if rev is not None and f"{ship_number}-{rev}" in request.if_none_match:
+        return _not_modified(f"{ship_number}-{rev}")
+    catalog = resolve_contact_refs(s3_get_json_cached(_catalog_key(ship_number), default={}) or {})
+    stale = is_stale(_catalog_key(ship_number))
+    if rev is None and not stale:
+        rev = catalog_revision(ship_number)
+    resp = jsonify({"ok": True, "ship": ship_number, "mode": "snapshot", "rev": rev, "catalog": catalog, "stale": stale})
+    if not stale:
+        resp.set_etag(f"{ship_number}-{rev}")
+    return resp.make_conditional(request)
+
+def _not_modified(etag):
+    """카탈로그/저널 본문을 만들기 전에 If-None-Match로 끝내는 304"""
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    return resp
+
+# ================== 장비 검색 (역색인) ==================
+# data.db에 token -> (doc, field, weight) 역색인을 저장. save_catalog 변경분만 갱신, 없으면 전체 스캔으로 재구축
+_SEARCH_FIELDS = {"eq": 3.0, "maker": 2.0, "type": 2.0, "cert_no": 2.0, "ex_proof_grade": 1.5, "ip_grade": 1.5, "location": 1.0}
+_SEARCH_PREFIX_FACTOR = 0.6
+_SEARCH_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_SEARCH_READY = False
+
+def _search_tokens(text) -> list:
+    return _SEARCH_TOKEN_RE.findall(str(text or "").lower())
+
+def _ensure_search_tables():
+    global _SEARCH_READY
+    if _SEARCH_READY: return
+    conn = _db()
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS search_docs (doc_id TEXT PRIMARY KEY, ship TEXT, category TEXT, eq TEXT, data TEXT);
+        CREATE TABLE IF NOT EXISTS search_terms (term TEXT, field TEXT, doc_id TEXT, weight REAL);
+        CREATE INDEX IF NOT EXISTS idx_search_terms_term ON search_terms(term);
+        CREATE INDEX IF NOT EXISTS idx_search_terms_doc ON search_terms(doc_id);
+        CREATE TABLE IF NOT EXISTS search_meta (k TEXT PRIMARY KEY, v TEXT);
+    """)
+    _SEARCH_READY = True
+
+def _search_doc_id(ship, category, eq) -> str:
+    return f"{ship}|{category}|{eq}"
+
+def _search_index_item(conn, ship, category, eq, info):
+    doc_id = _search_doc_id(ship, category, eq)
+    conn.execute("DELETE FROM search_terms WHERE doc_id = ?", (doc_id,))
+    conn.execute("DELETE FROM search_docs WHERE doc_id = ?", (doc_id,))
+    if not isinstance(info, dict) or info.get("__deleted__"):
+        return
+    data = {f: (info.get(f) or "") for f in _SEARCH_FIELDS if f != "eq"}
+    conn.execute("INSERT INTO search_docs (doc_id, ship, category, eq, data) VALUES (?,?,?,?,?)",
+                 (doc_id, ship, category, eq, json.dumps(data, ensure_ascii=False)))
+    terms = {}
+    for f, w in _SEARCH_FIELDS.items():
+        for t in _search_tokens(eq if f == "eq" else data[f]):
+            terms[(t, f)] = w
+    conn.executemany("INSERT INTO search_terms (term, field, doc_id, weight) VALUES (?,?,?,?)",
+                     [(t, f, doc_id, w) for (t, f), w in terms.items()])
+
+def _search_index_ship(conn, ship, catalog):
+    like = ship.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "|%"
+    conn.execute("DELETE FROM search_terms WHERE doc_id LIKE ? ESCAPE '\\'", (like,))
+    conn.execute("DELETE FROM search_docs WHERE ship = ?", (ship,))
+    for category, eqs in (catalog or {}).items():
+        if not isinstance(eqs, dict): continue
+        for eq, info in eqs.items():
+            if str(eq).startswith("__"): continue
+            _search_index_item(conn, ship, category, eq, info)
+
+def search_index_apply(ship_number, catalog: dict, changes: list):
+    """save_catalog 변경분(_diff_catalog)만 색인에 반영"""
+    _ensure_search_tables()
+    conn = _db()
+    ship = str(ship_number)
+    with _db_tx(conn):
+        for ch in changes or []:
+            category = ch.get("category"); eq = ch.get("eq")
+            if eq is None:
+                # 카테고리 전체 교체/삭제
+                block = catalog.get(category) if ch.get("op") == "set" else None
+                conn.execute("DELETE FROM search_terms WHERE doc_id IN (SELECT doc_id FROM search_docs WHERE ship = ? AND category = ?)", (ship, category))
+                conn.execute("DELETE FROM search_docs WHERE ship = ? AND category = ?", (ship, category))
+                for e, info in (block or {}).items() if isinstance(block, dict) else []:
+                    if not str(e).startswith("__"): _search_index_item(conn, ship, category, e, info)
+            elif not str(eq).startswith("__"):
+                info = ((catalog.get(category) or {}).get(eq)) if ch.get("op") == "set" else None
+                _search_index_item(conn, ship, category, eq, info)
+
+def search_index_rebuild() -> dict:
+    """전체 카탈로그를 병렬로 읽어 색인 재구축"""
+    _ensure_search_tables()
+    t0 = time.perf_counter()
+    catalogs = _load_all_catalogs()
+    conn = _db()
+    with _db_tx(conn):
+        conn.execute("DELETE FROM search_terms"); conn.execute("DELETE FROM search_docs")
+        for ship, catalog in catalogs.items():
+            _search_index_ship(conn, ship, catalog)
+        conn.execute("INSERT OR REPLACE INTO search_meta (k, v) VALUES ('built_at', ?)", (datetime.datetime.now().isoformat(timespec="seconds"),))
+    docs = conn.execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+    return {"ships": len(catalogs), "docs": docs, "sec": round(time.perf_counter() - t0, 3)}
+
+def _search_index_built() -> bool:
+    _ensure_search_tables()
+    return _db().execute("SELECT 1 FROM search_meta WHERE k = 'built_at'").fetchone() is not None
+
+def search_equipment(q: str, page: int = 1, per_page: int = 20) -> dict:
+    """
+    토큰 AND + 접두어 매칭. 'maker:hyo' 처럼 필드 한정 가능
+    점수 = 토큰별 (필드 가중치 x 정확일치 1.0 / 접두어 0.6) 최대값의 합
+    """
+    if not _search_index_built():
+        search_index_rebuild()
+    conn = _db()
+    t0 = time.perf_counter()
+    scores = None
+    for part in (q or "").split():
+        field = None
+        if ":" in part:
+            f, _, part = part.partition(":")
+            field = {"equipment": "eq", "name": "eq", "cert": "cert_no", "ex": "ex_proof_grade", "ip": "ip_grade"}.get(f.lower(), f.lower())
+            if field not in _SEARCH_FIELDS: field = None
+        for tok in _search_tokens(part):
+            sql = ("SELECT doc_id, MAX(weight * CASE WHEN term = ? THEN 1.0 ELSE ? END) FROM search_terms "
+                   "WHERE term >= ? AND term < ?" + (" AND field = ?" if field else "") + " GROUP BY doc_id")
+            args = [tok, _SEARCH_PREFIX_FACTOR, tok, tok + "\U0010ffff"] + ([field] if field else [])
+            hits = dict(conn.execute(sql, args).fetchall())
+            if scores is None:
+                scores = hits
+            else:
+                scores = {d: s + hits[d] for d, s in scores.items() if d in hits}
+            if not scores:
+                break
+    scores = scores or {}
+    ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+    page = max(1, page); per_page = max(1, min(per_page, 200))
+    window = ranked[(page - 1) * per_page: page * per_page]
+    hits = []
+    if window:
+        rows = {r[0]: r for r in conn.execute(
+            f"SELECT doc_id, ship, category, eq, data FROM search_docs WHERE doc_id IN ({','.join('?' * len(window))})",
+            [d for d, _ in window]).fetchall()}
+        for doc_id, score in window:
+            r = rows.get(doc_id)
+            if not r: continue
+            hits.append({"ship": r[1], "category": r[2], "eq": r[3], "score": round(score, 3), **json.loads(r[4] or "{}")})
+    return {"q": q, "total": len(ranked), "page": page, "per_page": per_page, "hits": hits,
+            "took_ms": round((time.perf_counter() - t0) * 1000.0, 2)}
+
+@app.route("/api/search")
+@login_required
+def api_search():
+    try:
+        page = int(request.args.get("page", 1)); per_page = int(request.args.get("per_page", 20))
+    except ValueError:
+        return jsonify({"ok": False, "error": "page/per_page must be integers"}), 400
+    return jsonify({"ok": True, **search_equipment(request.args.get("q", ""), page, per_page)})
+
+@app.route("/search")
+@login_required
+def search_page():
+    q = request.args.get("q", "")
+    try:
+        page = int(request.args.get("page", 1))
+    except ValueError:
+        page = 1
+    res = search_equipment(q, page, 50) if q.strip() else None
+    return render_template("search.html", q=q, res=res)
+
+@app.route("/admin/search/rebuild", methods=["POST"])
+@s3_budget_seconds(None)
+def admin_search_rebuild():
+    _require_admin()
+    return jsonify({"ok": True, **search_index_rebuild()})
+
+# ================== 입력 자동완성 (/api/suggest) ==================
+# 필드별 값 빈도 + 소문자 정렬 배열(bisect 접두어 검색). maker -> type/cert_no 동시출현 빈도도 보관
+_SUGGEST_FIELDS = ("maker", "type", "cert_no", "ex_proof_grade", "ip_grade")
+_SUGGEST_TOP = 50      # /api/suggest limit 상한과 같음
+
+class _SuggestIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_at = 0.0
+        self.counts = {f: {} for f in _SUGGEST_FIELDS}      # field -> {value: count}
+        self.sorted = {f: [] for f in _SUGGEST_FIELDS}      # field -> [(lower, value)] 정렬
+        self.by_maker = {}                                  # (field, maker_lower) -> {value: count}
+        self.top = {}                                       # field -> 빈도순 상위 _SUGGEST_TOP 값 (빈 접두어용, 변경 시 무효화)
+
+    def _add(self, field, value, delta, maker=""):
+        value = (value or "").strip() if isinstance(value, str) else ""
+        if not value: return
+        cnt = self.counts[field]
+        self.top.pop(field, None)
+        n = cnt.get(value, 0) + delta
+        if n > 0:
+            if value not in cnt:
+                bisect.insort(self.sorted[field], (value.lower(), value))
+            cnt[value] = n
+        elif value in cnt:
+            del cnt[value]
+            arr = self.sorted[field]
+            i = bisect.bisect_left(arr, (value.lower(), value))
+            if i < len(arr) and arr[i][1] == value: arr.pop(i)
+        if maker and field != "maker":
+            co = self.by_maker.setdefault((field, maker.strip().lower()), {})
+            m = co.get(value, 0) + delta
+            if m > 0: co[value] = m
+            else: co.pop(value, None)
+
+    def add_record(self, rec: dict, delta: int = 1):
+        if not isinstance(rec, dict) or rec.get("__deleted__"): return
+        maker = rec.get("maker") if isinstance(rec.get("maker"), str) else ""
+        for f in _SUGGEST_FIELDS:
+            self._add(f, rec.get(f), delta, maker)
+
+    def query(self, field, prefix, limit=10, maker=""):
+        p = (prefix or "").strip().lower()
+        arr = self.sorted[field]; cnt = self.counts[field]
+        co = self.by_maker.get((field, (maker or "").strip().lower()), {}) if maker else {}
+        # 같은 maker에서 쓰인 값 우선, 그 다음 전체 빈도
+        rank = lambda v: (-co.get(v, 0), -cnt.get(v, 0), v.lower())
+        if not p:
+            # 빈 접두어: 전체 정렬 대신 미리 정렬해 둔 상위 목록 (+ maker 동시출현 값)
+            top = self.top.get(field)
+            if top is None:
+                top = self.top[field] = sorted(cnt, key=lambda v: (-cnt[v], v.lower()))[:_SUGGEST_TOP]
+            cands = sorted(co, key=rank)[:limit] + [v for v in top if v not in co]
+        else:
+            lo = bisect.bisect_left(arr, (p, ""))
+            hi = bisect.bisect_left(arr, (p + "\U0010ffff", ""))
+            cands = sorted((v for _, v in arr[lo:hi]), key=rank)
+        return [{"value": v, "count": cnt.get(v, 0), **({"with_maker": co[v]} if v in co else {})} for v in cands[:limit]]
+
+_SUGGEST = _SuggestIndex()
+
+def _iter_legacy_submission_rows():
+    """legacy submissions/*.json (로컬 폴더 + S3 submissions/) 행, id 기준 중복 제거"""
+    seen = set()
+    def _rows(data):
+        for r in (data if isinstance(data, list) else [data]):
+            if not isinstance(r, dict): continue
+            rid = r.get("id")
+            if rid and rid in seen: continue
+            if rid: seen.add(rid)
+            yield r
+    local_dir = os.path.join(app.root_path, "submissions")
+    if os.path.isdir(local_dir):
+        for name in sorted(os.listdir(local_dir)):
+            if not name.endswith(".json"): continue
+            try:
+                with open(os.path.join(local_dir, name), "rb") as f:
+                    yield from _rows(json_loads_bytes(f.read()))
+            except Exception as e:
+                print(f"[WARN] legacy submission read failed: {name} - {e}")
+    try:
+        s3 = s3_client()
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET, Prefix=LEGACY_SUBMISSIONS_PREFIX):
+            for o in page.get("Contents", []):
+                if o["Key"].endswith(".json"):
+                    yield from _rows(read_json_object(s3.get_object(Bucket=S3_BUCKET, Key=o["Key"])))
+    except Exception as e:
+        print("[WARN] legacy submissions scan failed:", e)
+
+def suggest_index_rebuild():
+    idx = _SuggestIndex()
+    for catalog in _load_all_catalogs().values():
+        for eqs in catalog.values():
+            if not isinstance(eqs, dict): continue
+            for eq, info in eqs.items():
+                if not str(eq).startswith("__"): idx.add_record(info)
+    for r in _iter_legacy_submission_rows():
+        idx.add_record(r)
+    idx.built_at = time.time()
+    global _SUGGEST
+    _SUGGEST = idx
+    return idx
+
+def _suggest_rebuild_bg():
+    try:
+        suggest_index_rebuild()
+    except Exception as e:
+        print(f"[WARN] suggest index rebuild failed: {e}")
+    finally:
+        _SUGGEST_BUILD_LOCK.release()
+
+def _suggest_index() -> _SuggestIndex:
+    """오래됐으면 백그라운드 재구축을 (worker당 하나만) 시작하고, 끝날 때까지는 기존 색인으로 응답"""
+    idx = _SUGGEST
+    if (not idx.built_at or time.time() - idx.built_at > SUGGEST_REBUILD_SECONDS) and _SUGGEST_BUILD_LOCK.acquire(blocking=False):
+        threading.Thread(target=_suggest_rebuild_bg, name="suggest-rebuild", daemon=True).start()
+    return idx
+
+_SUGGEST_BUILD_LOCK = threading.Lock()
+
+def suggest_index_apply(prev: dict, catalog: dict, changes: list):
+    """save_catalog 변경분: 이전 값 빼고 새 값 더함 (색인 미구축이면 무시)"""
+    idx = _SUGGEST
+    if not idx.built_at: return
+    with idx.lock:
+        for ch in changes or []:
+            category = ch.get("category"); eq = ch.get("eq")
+            if eq is not None and str(eq).startswith("__"): continue
+            old_block = (prev or {}).get(category) if isinstance((prev or {}).get(category), dict) else {}
+            new_block = (catalog or {}).get(category) if isinstance((catalog or {}).get(category), dict) else {}
+            names = [eq] if eq is not None else [e for e in set(old_block) | set(new_block) if not str(e).startswith("__")]
+            for name in names:
+                idx.add_record(old_block.get(name), -1)
+                if ch.get("op") == "set": idx.add_record(new_block.get(name), +1)
+
+@app.route("/api/suggest")
+@login_required
+@cache_policy("private")
+def api_suggest():
+    field = request.args.get("field", "")
+    if field not in _SUGGEST_FIELDS:
+        return jsonify({"ok": False, "error": f"field must be one of {', '.join(_SUGGEST_FIELDS)}"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 50))
+    except ValueError:
+        limit = 10
+    t0 = time.perf_counter()
+    idx = _suggest_index()
+    with idx.lock:
+        items = idx.query(field, request.args.get("q", ""), limit, request.args.get("maker", ""))
+    return jsonify({"ok": True, "field": field, "items": items, "took_ms": round((time.perf_counter() - t0) * 1000.0, 3)})
+
+# ================== Legacy 데이터 일괄 이관 (submissions/ + data.db) ==================
+# flask --app app ingest-legacy --ship 1 [--project-map test=1] [--dry-run] [--checkpoint ingest_checkpoint.json]
+_LEGACY_FIELDS = ("qty", "maker", "type", "cert_no", "ex_proof_grade", "ip_grade", "page", "location")
+
+def _norm_name(s) -> str:
+    """'MOTOR ' / 'motor  for  fan' 등 -> 앞뒤/중복 공백 제거"""
+    return " ".join(str(s or "").split())
+
+def _norm_key(s) -> str:
+    return _norm_name(s).casefold()
+
+def _parse_ts(s):
+    """ISO 문자열(Z, +00:00, naive 혼재) -> UTC aware datetime. naive는 UTC로 간주"""
+    if not s: return None
+    try:
+        t = datetime.datetime.fromisoformat(str(s).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return t if t.tzinfo else t.replace(tzinfo=datetime.timezone.utc)
+
+def _iter_legacy_db_rows(path, batch=500):
+    if not os.path.exists(path): return
+    conn = sqlite3.connect(path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='submissions'").fetchone():
+            return
+        cur = conn.execute("SELECT * FROM submissions")
+        cols = [d[0] for d in cur.description]
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows: break
+            for r in rows:
+                yield dict(zip(cols, r))
+    finally:
+        conn.close()
+
+def _iter_legacy_records():
+    """(source, record) 스트림. 같은 id는 첫 번째만 (JSON 파일 -> S3 -> data.db 순)"""
+    seen = set()
+    for r in _iter_legacy_submission_rows():
+        if r.get("id"): seen.add(r["id"])
+        yield "json", r
+    for r in _iter_legacy_db_rows(DATA_DB_PATH):
+        if r.get("id") and r["id"] in seen: continue
+        yield "db", r
+
+def ingest_legacy(default_ship=None, project_map=None, dry_run=False, checkpoint_path=None, create_missing=True):
+    """
+    legacy 레코드를 카탈로그 항목에 매칭해 병합. 같은 항목은 timestamp가 가장 최신인 레코드만,
+    카탈로그의 last_modified가 더 최신이면 카탈로그 유지. 호선별 save_catalog 1회
+    checkpoint: 완료된 호선 목록을 기록 -> 재실행 시 건너뜀
+    """
+    t0 = time.perf_counter()
+    project_map = project_map or {}
+    ckpt = {"done_ships": []}
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf-8") as f: ckpt = json.load(f)
+    done_ships = set(ckpt.get("done_ships", []))
+    stats = {"records": 0, "skipped_no_ship": 0, "skipped_done_ship": 0, "invalid": 0, "superseded": 0,
+             "matched": 0, "created": 0, "unmatched": 0, "kept_catalog": 0, "updated": 0}
+    conflicts = []
+
+    # 1) 스트리밍 수집: (ship, category_key, eq_key) -> 가장 최신 레코드 (메모리는 고유 항목 수에 비례)
+    best = {}
+    for source, r in _iter_legacy_records():
+        stats["records"] += 1
+        ship = str(r.get("ship_number") or project_map.get(r.get("project_name") or "") or default_ship or "")
+        if not ship:
+            stats["skipped_no_ship"] += 1; continue
+        if ship in done_ships:
+            stats["skipped_done_ship"] += 1; continue
+        category, eq = _norm_name(r.get("category")), _norm_name(r.get("equipment_name"))
+        if not category or not eq:
+            stats["invalid"] += 1; continue
+        ts = _parse_ts(r.get("last_updated") or r.get("timestamp"))
+        k = (ship, _norm_key(category), _norm_key(eq))
+        cur = best.get(k)
+        if cur is None or (ts and (cur["ts"] is None or ts > cur["ts"])):
+            if cur is not None: stats["superseded"] += 1
+            best[k] = {"ts": ts, "category": category, "eq": eq, "source": source, "id": r.get("id"), "rec": r}
+        else:
+            stats["superseded"] += 1
+
+    # 2) 호선별 병합 + 1회 저장
+    by_ship = {}
+    for (ship, _, _), v in best.items():
+        by_ship.setdefault(ship, []).append(v)
+    per_ship = {}
+    for ship in sorted(by_ship):
+        catalog = load_catalog(ship) or {}
+        cat_index = {_norm_key(c): c for c, b in catalog.items() if isinstance(b, dict)}
+        changed = 0
+        for v in by_ship[ship]:
+            category = cat_index.get(_norm_key(v["category"]))
+            eq = None
+            if category:
+                eq = next((e for e in catalog[category] if not str(e).startswith("__") and _norm_key(e) == _norm_key(v["eq"])), None)
+            if eq is None:
+                if not create_missing:
+                    stats["unmatched"] += 1; continue
+                category = category or v["category"]; eq = v["eq"]
+                _ensure_item(ship, catalog, category, eq, save=False)
+                cat_index[_norm_key(category)] = category
+                stats["created"] += 1
+            else:
+                stats["matched"] += 1
+            item = catalog[category][eq]
+            _ensure_item_extended_fields(item)
+            cat_ts = _parse_ts(item.get("last_modified"))
+            if cat_ts and (v["ts"] is None or cat_ts >= v["ts"]):
+                stats["kept_catalog"] += 1
+                conflicts.append({"ship": ship, "category": category, "eq": eq, "winner": "catalog",
+                                  "catalog_ts": item.get("last_modified"), "legacy_ts": v["ts"].isoformat() if v["ts"] else None, "legacy_id": v["id"]})
+                continue
+            rec = v["rec"]
+            for f in _LEGACY_FIELDS:
+                val = rec.get(f)
+                if val not in (None, ""): item[f] = str(val).strip()
+            if rec.get("file"): item["file"] = rec["file"]
+            if rec.get("file_url"): item["file_url"] = rec["file_url"]
+            item["submitter_name"] = (rec.get("submitter_email") or rec.get("submitter_name") or item.get("submitter_name") or "").strip().lower()
+            item["last_modified"] = v["ts"].astimezone(datetime.timezone.utc).replace(tzinfo=None).isoformat() if v["ts"] else datetime.datetime.now().isoformat()
+            item["status"] = _recompute_status(item)
+            changed += 1
+        stats["updated"] += changed
+        per_ship[ship] = changed
+        if not dry_run:
+            if changed:
+                save_catalog(ship, catalog)
+                append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": "ingest","action": "legacy_ingest",
+                                     "ship": ship, "category": "-", "equipment": "-","result": f"items={changed}"})
+            done_ships.add(ship)
+            if checkpoint_path:
+                ckpt["done_ships"] = sorted(done_ships)
+                tmp = checkpoint_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f: json.dump(ckpt, f)
+                os.replace(tmp, checkpoint_path)
+    sec = time.perf_counter() - t0
+    return {"dry_run": dry_run, "stats": stats, "per_ship": per_ship, "conflicts": conflicts,
+            "sec": round(sec, 3), "records_per_sec": round(stats["records"] / sec, 1) if sec else None}
+
+@app.cli.command("ingest-legacy")
+@click.option("--ship", "default_ship", default=None, help="ship_number가 없는 레코드에 사용할 호선")
+@click.option("--project-map", multiple=True, help="project_name=ship (여러 번 지정 가능)")
+@click.option("--dry-run", is_flag=True, help="저장하지 않고 리포트만 출력")
+@click.option("--checkpoint", default="ingest_checkpoint.json", show_default=True, help="재개용 checkpoint 파일 ('' 이면 사용 안 함)")
+@click.option("--no-create", is_flag=True, help="카탈로그에 없는 항목은 생성하지 않음")
+def ingest_legacy_command(default_ship, project_map, dry_run, checkpoint, no_create):
+    """legacy submissions/*.json + data.db submissions 를 카탈로그로 이관"""
+    pm = dict(p.split("=", 1) for p in project_map if "=" in p)
+    res = ingest_legacy(default_ship, pm, dry_run=dry_run, checkpoint_path=checkpoint or None, create_missing=not no_create)
+    click.echo(json.dumps(res, ensure_ascii=False, indent=2))
+
 # ---------- Admin: Excel Export ----------
 @app.route("/admin/export_selected", methods=["POST"], endpoint="export_selected")
+@s3_budget_seconds(None)
 def export_selected():
     _require_admin()
     rows = request.form.getlist("rows[]")
-    all_items = {(f"{s['ship_number']}|{s['category']}|{s['equipment_name']}"): s for s in list_all_submissions()}
-    picked = [all_items[r] for r in rows if r in all_items]
+    keys = [r.split("|", 2) for r in rows if r.count("|") >= 2]
+    wanted = {tuple(k) for k in keys}
+    found = {}
+    for s in iter_submissions(ships={k[0] for k in keys}, categories={k[1] for k in keys}, fields=_EXPORT_FIELDS):
+        t = (s["ship_number"], s["category"], s["equipment_name"])
+        if t in wanted: found[t] = s
+    picked = [found[tuple(k)] for k in keys if tuple(k) in found]
     if not picked:
         flash("선택된 항목이 없습니다.")
         return redirect(url_for("admin_dashboard", _=int(time.time())))
-    wb = Workbook(); ws = wb.active; ws.title = "Selected"
-    ws.append(["Ship","System(Category)","Equipment","QTY","Maker","Type","Cert No.","EX-PROOF GRADE","IP GRADE","PAGE","LOCATION"])
+    wb = Workbook(write_only=True); ws = wb.create_sheet("Selected")
+    ws.append(_EXCEL_COLUMNS)
     for it in picked:
-        ws.append([it["ship_number"], it["category"], it["equipment_name"], it.get("qty",""), it.get("maker",""),
-                   it.get("type",""), it.get("cert_no",""), it.get("ex_proof_grade",""), it.get("ip_grade",""),
-                   it.get("page",""), it.get("location","")])
+        ws.append(_export_row(it))
     bio = io.BytesIO(); wb.save(bio); bio.seek(0)
     filename = f"selected_export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     return send_file(bio, as_attachment=True, download_name=filename,
                      mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
+_EXPORT_FIELDS = ("qty", "maker", "type", "cert_no", "ex_proof_grade", "ip_grade", "page", "location")
+
+def _export_row(it) -> list:
+    return [it["ship_number"], it["category"], it["equipment_name"], it.get("qty",""), it.get("maker",""),
+            it.get("type",""), it.get("cert_no",""), it.get("ex_proof_grade",""), it.get("ip_grade",""),
+            it.get("page",""), it.get("location","")]
+
 @app.route("/export/excel", endpoint="export_excel")
+@s3_budget_seconds(None)
 def export_excel():
     _require_admin()
-    items = list_all_submissions()
-    wb = Workbook(); ws = wb.active; ws.title = "All"
-    ws.append(["Ship","System(Category)","Equipment","QTY","Maker","Type","Cert No.","EX-PROOF GRADE","IP GRADE","PAGE","LOCATION"])
+    items = iter_submissions(fields=_EXPORT_FIELDS)
+    if request.args.get("format") == "csv":
+        return _export_csv_response(items, f"export_all_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    wb = Workbook(write_only=True); ws = wb.create_sheet("All")
+    ws.append(_EXCEL_COLUMNS)
     for it in items:
-        ws.append([it["ship_number"], it["category"], it["equipment_name"], it.get("qty",""), it.get("maker",""),
-                   it.get("type",""), it.get("cert_no",""), it.get("ex_proof_grade",""), it.get("ip_grade",""),
-                   it.get("page",""), it.get("location","")])
+        ws.append(_export_row(it))
     bio = io.BytesIO(); wb.save(bio); bio.seek(0)
     filename = f"export_all_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     return send_file(bio, as_attachment=True, download_name=filename,
                      mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
-# ✅ 복구: admin.html에서 쓰는 포인트 관리 링크 엔드포인트
+def _export_csv_response(items, filename, batch=500):
+    """CSV는 행 단위로 스트리밍 (엑셀에서 한글이 깨지지 않도록 UTF-8 BOM)"""
+    def gen():
+        buf = io.StringIO(); w = csv.writer(buf)
+        buf.write("\ufeff"); w.writerow(_EXCEL_COLUMNS)
+        for i, it in enumerate(items, 1):
+            w.writerow(_export_row(it))
+            if i % batch == 0:
+                yield buf.getvalue(); buf.seek(0); buf.truncate()
+        yield buf.getvalue()
+    resp = Response(stream_with_context(gen()), mimetype="text/csv")
+    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return resp
+
+# ================== 컴플라이언스 리포트 (DOCX 요약 + XLSX 상세) ==================
+# 리비전 = hash(포맷 버전 + 카탈로그 ETag + 연락처 ETag). 산출물은 리비전별 키에 보관
+#   reports/{ship}/{rev}/report.docx | report.xlsx | summary.json,  reports/fleet/{rev}/fleet.docx | fleet.xlsx
+#   reports/index.json = {"ships": {ship: {"rev", "generated_at", "items", "issues"}}, "fleet": {"rev", "generated_at"}}
+# - 리비전이 같으면 저장된 파일을 그대로 내려줌 (재생성 없음)
+# - refresh_reports: 바뀐 호선만 프로세스 풀로 렌더 -> 업로드, 함대 리포트는 호선별 summary.json으로 재조립
+# - save_catalog 후 REPORT_REFRESH_DELAY_SECONDS 뒤 백그라운드 refresh (연속 저장은 1회로 묶음)
+_REPORT_FORMAT = "1"
+_REPORT_INDEX_KEY = REPORTS_PREFIX + "index.json"
+_REPORT_MIMETYPES = {"docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                     "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+_REPORT_SUMMARY_COLUMNS = ["System", "상태", "EX-PROOF", "담당자", "장비", "완료", "지적"]
+_FLEET_REPORT_COLUMNS = ["Ship", "장비", "완료", "완료율(%)", "적합", "지적", "미완료 시스템"]
+_REPORT_LOCK = threading.Lock()
+_REPORT_TIMER = {"timer": None}
+_REPORT_TIMER_LOCK = threading.Lock()
+
+def _report_rev(catalog_etag, contacts_etag) -> str:
+    return hashlib.sha1(f"{_REPORT_FORMAT}|{catalog_etag}|{contacts_etag}".encode()).hexdigest()[:16]
+
+def _fleet_report_rev(ship_revs: dict) -> str:
+    return hashlib.sha1((_REPORT_FORMAT + json.dumps(sorted(ship_revs.items()))).encode()).hexdigest()[:16]
+
+def _report_key(ship, rev, name): return f"{REPORTS_PREFIX}{ship}/{rev}/{name}"
+def _fleet_report_key(rev, name): return f"{REPORTS_PREFIX}fleet/{rev}/{name}"
+
+def _head_etag(key) -> str:
+    """객체 ETag, 없으면 "" (그 밖의 오류는 그대로 raise)"""
+    try:
+        return s3_client().head_object(Bucket=S3_BUCKET, Key=key).get("ETag", "")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"): return ""
+        raise
+
+def load_report_index() -> dict:
+    idx = s3_get_json(_REPORT_INDEX_KEY, default=None)
+    if not isinstance(idx, dict): idx = {}
+    idx.setdefault("ships", {}); idx.setdefault("fleet", {})
+    return idx
+
+def _report_item_issues(block: dict, info: dict) -> list:
+    issues = []
+    if _recompute_status(info) != "done": issues.append("미입력")
+    if block.get("__ex_proof__") == "Y":
+        if not (info.get("ex_proof_grade") or "").strip(): issues.append("EX-PROOF GRADE 없음")
+        if not (info.get("cert_no") or "").strip(): issues.append("Cert No. 없음")
+    return issues
+
+def _report_items(catalog: dict):
+    """(category, block, eq, info) - 삭제 항목 제외, 카테고리 이름순"""
+    for category in sorted(catalog):
+        block = catalog[category]
+        if not isinstance(block, dict): continue
+        for eq, info in block.items():
+            if str(eq).startswith("__") or not isinstance(info, dict) or info.get("__deleted__"): continue
+            yield category, block, eq, info
+
+def _report_summary(ship, catalog: dict, rev, generated_at) -> dict:
+    cats = {}; issues = []
+    for category in sorted(catalog):
+        block = catalog[category]
+        if not isinstance(block, dict): continue
+        owners = ", ".join(o.get("name") or o.get("email") or "" for o in block.get("__owners__") or [] if isinstance(o, dict))
+        cats[category] = {"category": category, "status": block.get("__status__") or "미입력",
+                          "ex_proof": block.get("__ex_proof__") or "Unknown", "owners": owners, "items": 0, "done": 0, "issues": 0}
+    for category, block, eq, info in _report_items(catalog):
+        c = cats[category]; c["items"] += 1
+        if _recompute_status(info) == "done": c["done"] += 1
+        iss = _report_item_issues(block, info)
+        if iss:
+            c["issues"] += 1; issues.append([category, eq, ", ".join(iss)])
+    items = sum(c["items"] for c in cats.values()); done = sum(c["done"] for c in cats.values())
+    return {"ship": str(ship), "rev": rev, "generated_at": generated_at, "items": items, "done": done,
+            "pct": round(done * 100.0 / items, 1) if items else 0.0, "compliant": items - len(issues),
+            "categories": list(cats.values()), "issues": issues}
+
+def _docx_table(doc, header, rows):
+    t = doc.add_table(rows=1, cols=len(header)); t.style = "Table Grid"
+    for cell, h in zip(t.rows[0].cells, header): cell.text = str(h)
+    for r in rows:
+        for cell, v in zip(t.add_row().cells, r): cell.text = str(v)
+    return t
+
+def _office_bytes(doc_or_wb) -> bytes:
+    bio = io.BytesIO(); doc_or_wb.save(bio)
+    return bio.getvalue()
+
+def _render_ship_report(ship, catalog: dict, rev, generated_at) -> tuple:
+    """-> (docx, xlsx, summary). 프로세스 풀 worker에서 실행되므로 S3/DB를 쓰지 않음"""
+    s = _report_summary(ship, catalog, rev, generated_at)
+    doc = Document()
+    doc.add_heading(f"Ship {ship} 컴플라이언스 리포트", 0)
+    doc.add_paragraph(f"생성: {generated_at} / 리비전: {rev}")
+    doc.add_paragraph(f"장비 {s['items']}건 · 입력 완료 {s['done']}건 ({s['pct']}%) · 적합 {s['compliant']}건 · 지적 {len(s['issues'])}건")
+    doc.add_heading("시스템별 현황", 1)
+    cat_rows = [[c["category"], c["status"], c["ex_proof"], c["owners"], c["items"], c["done"], c["issues"]] for c in s["categories"]]
+    _docx_table(doc, _REPORT_SUMMARY_COLUMNS, cat_rows)
+    if s["issues"]:
+        doc.add_heading("지적 사항", 1)
+        _docx_table(doc, ["System", "Equipment", "내용"], s["issues"])
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Summary"); ws.append(_REPORT_SUMMARY_COLUMNS)
+    for r in cat_rows: ws.append(r)
+    ws = wb.create_sheet("Detail"); ws.append(_EXCEL_COLUMNS + ["Status", "Responsible", "Issues"])
+    for category, block, eq, info in _report_items(catalog):
+        resp = info.get("responsible") if isinstance(info.get("responsible"), dict) else {}
+        ws.append(_export_row({**info, "ship_number": str(ship), "category": category, "equipment_name": eq})
+                  + [_recompute_status(info), resp.get("name") or resp.get("email") or "", ", ".join(_report_item_issues(block, info))])
+    return _office_bytes(doc), _office_bytes(wb), s
+
+def _render_fleet_report(summaries: list, rev, generated_at) -> tuple:
+    rows = [[s["ship"], s["items"], s["done"], s["pct"], s["compliant"], len(s["issues"]),
+             sum(1 for c in s["categories"] if c["done"] < c["items"])] for s in summaries]
+    items = sum(s["items"] for s in summaries); done = sum(s["done"] for s in summaries)
+    doc = Document()
+    doc.add_heading("Fleet 컴플라이언스 리포트", 0)
+    doc.add_paragraph(f"생성: {generated_at} / 리비전: {rev}")
+    doc.add_paragraph(f"호선 {len(summaries)}척 · 장비 {items}건 · 입력 완료 {done}건 ({round(done * 100.0 / items, 1) if items else 0.0}%)"
+                      f" · 지적 {sum(len(s['issues']) for s in summaries)}건")
+    _docx_table(doc, _FLEET_REPORT_COLUMNS, rows)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Ships"); ws.append(_FLEET_REPORT_COLUMNS)
+    for r in rows: ws.append(r)
+    ws = wb.create_sheet("Issues"); ws.append(["Ship", "System", "Equipment", "내용"])
+    for s in summaries:
+        for r in s["issues"]: ws.append([s["ship"]] + r)
+    return _office_bytes(doc), _office_bytes(wb)
+
+_REPORT_POOL = {"pool": None}
+_REPORT_POOL_LOCK = threading.Lock()
+
+def _report_pool():
+    """프로세스당 하나의 spawn 풀을 처음 필요할 때 만들어 계속 재사용 (refresh마다 인터프리터를 새로 띄우지 않음)"""
+    with _REPORT_POOL_LOCK:
+        if _REPORT_POOL["pool"] is None:
+            _REPORT_POOL["pool"] = ProcessPoolExecutor(max_workers=REPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _REPORT_POOL["pool"]
+
+def _report_pool_reset(pool):
+    """worker 프로세스가 죽어 풀이 깨졌으면 버림 -> 다음 호출에서 새로 만듦"""
+    with _REPORT_POOL_LOCK:
+        if _REPORT_POOL["pool"] is pool: _REPORT_POOL["pool"] = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _render_ship_reports(jobs: list):
+    """jobs = [(ship, catalog, rev, generated_at)] -> (ship, (docx, xlsx, summary) | Exception)
+    2건 이상이고 항목이 REPORT_PROCESS_MIN_ITEMS 이상이면 공용 프로세스 풀(spawn: 스레드가 도는 프로세스를 fork하지 않음)"""
+    items = sum(len(b) for j in jobs for b in (j[1] or {}).values() if isinstance(b, dict))
+    if len(jobs) < 2 or REPORT_WORKERS <= 1 or items < REPORT_PROCESS_MIN_ITEMS:
+        for j in jobs:
+            try: yield j[0], _render_ship_report(*j)
+            except Exception as e: yield j[0], e
+        return
+    pool = _report_pool()
+    futs = [(j[0], pool.submit(_render_ship_report, *j)) for j in jobs]
+    for sh, f in futs:
+        try: yield sh, f.result()
+        except BrokenProcessPool as e:
+            _report_pool_reset(pool); yield sh, e
+        except Exception as e: yield sh, e
+
+def _fetch_report_catalogs(ships) -> dict:
+    """ship -> (ETag, 담당자 해석된 카탈로그). ETag는 본문과 같은 GET 응답 기준"""
+    s3 = s3_client()
+    def _fetch(sh):
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=_catalog_key(sh))
+        return sh, obj.get("ETag", ""), resolve_contact_refs(read_json_object(obj))
+    contact_resolver()
+    with ThreadPoolExecutor(max_workers=CATALOG_FETCH_THREADS) as pool:
+        return {sh: (et, c if isinstance(c, dict) else {}) for sh, et, c in pool.map(_fetch, ships)}
+
+def _put_report(key, body: bytes, fmt):
+    s3_client().put_object(Bucket=S3_BUCKET, Key=key, Body=body, ContentType=_REPORT_MIMETYPES[fmt])
+
+def _delete_reports(keys):
+    s3 = s3_client()
+    for k in keys:
+        try: s3.delete_object(Bucket=S3_BUCKET, Key=k)
+        except Exception as e: print(f"[WARN] report delete failed {k}: {e}")
+
+def _store_ship_report(idx: dict, ship, docx_b, xlsx_b, summary):
+    rev = summary["rev"]
+    _put_report(_report_key(ship, rev, "report.docx"), docx_b, "docx")
+    _put_report(_report_key(ship, rev, "report.xlsx"), xlsx_b, "xlsx")
+    s3_put_json(_report_key(ship, rev, "summary.json"), summary)
+    old = idx["ships"].get(ship, {}).get("rev")
+    idx["ships"][ship] = {"rev": rev, "generated_at": summary["generated_at"], "items": summary["items"], "issues": len(summary["issues"])}
+    if old and old != rev:
+        _delete_reports(_report_key(ship, old, n) for n in ("report.docx", "report.xlsx", "summary.json"))
+
+def _refresh_fleet_report(idx: dict, generated_at, fresh: dict, force=False) -> bool:
+    """호선 리비전 조합이 바뀌었으면 함대 리포트 재생성. fresh = 이번에 만든 summary (다시 읽지 않음)"""
+    revs = {sh: v["rev"] for sh, v in idx["ships"].items()}
+    rev = _fleet_report_rev(revs)
+    if not force and idx["fleet"].get("rev") == rev:
+        return False
+    def _summary(sh):
+        return fresh.get(sh) or s3_get_json(_report_key(sh, revs[sh], "summary.json"), default=None)
+    with ThreadPoolExecutor(max_workers=CATALOG_FETCH_THREADS) as pool:
+        summaries = [s for s in pool.map(_summary, sorted(revs)) if isinstance(s, dict)]
+    docx_b, xlsx_b = _render_fleet_report(summaries, rev, generated_at)
+    _put_report(_fleet_report_key(rev, "fleet.docx"), docx_b, "docx")
+    _put_report(_fleet_report_key(rev, "fleet.xlsx"), xlsx_b, "xlsx")
+    old = idx["fleet"].get("rev")
+    idx["fleet"] = {"rev": rev, "generated_at": generated_at, "ships": len(summaries)}
+    if old and old != rev:
+        _delete_reports(_fleet_report_key(old, n) for n in ("fleet.docx", "fleet.xlsx"))
+    return True
+
+def refresh_reports(ships=None, force=False, fleet=True, wait=False) -> dict:
+    """
+    리비전이 바뀐 호선만 재생성(+함대 리포트). ships=None 이면 전 호선, 사라진 호선 산출물은 정리
+    프로세스 내 동시 실행은 1회 (wait=False 이면 실행 중일 때 바로 skip)
+    """
+    if not _REPORT_LOCK.acquire(timeout=600 if wait else 0):
+        return {"skipped": "already running"}
+    try:
+        t0 = time.perf_counter()
+        etags = {_ship_from_catalog_key(o["Key"]): o.get("ETag", "") for o in _list_catalog_objects()}
+        contacts_etag = _head_etag(CONTACTS_KEY)
+        idx = load_report_index()
+        targets = [sh for sh in etags if ships is None or sh in {str(s) for s in ships}]
+        stale = [sh for sh in targets if force or idx["ships"].get(sh, {}).get("rev") != _report_rev(etags[sh], contacts_etag)]
+        generated_at = datetime.datetime.now().isoformat(timespec="seconds")
+        jobs = [(sh, c, _report_rev(et, contacts_etag), generated_at) for sh, (et, c) in _fetch_report_catalogs(stale).items()] if stale else []
+        fresh = {}; errors = {}
+        for sh, res in _render_ship_reports(jobs):
+            if isinstance(res, Exception):
+                errors[sh] = str(res); print(f"[WARN] report render failed ship={sh}: {res}")
+                continue
+            _store_ship_report(idx, sh, *res)
+            fresh[sh] = res[2]
+        if ships is None:
+            for sh in [s for s in idx["ships"] if s not in etags]:
+                rev = idx["ships"].pop(sh)["rev"]
+                _delete_reports(_report_key(sh, rev, n) for n in ("report.docx", "report.xlsx", "summary.json"))
+        fleet_built = _refresh_fleet_report(idx, generated_at, fresh, force) if fleet else False
+        if fresh or fleet_built or ships is None:
+            s3_put_json(_REPORT_INDEX_KEY, idx)
+        return {"ships": len(targets), "regenerated": sorted(fresh), "errors": errors, "fleet": fleet_built,
+                "sec": round(time.perf_counter() - t0, 3)}
+    finally:
+        _REPORT_LOCK.release()
+
+def _run_scheduled_report_refresh():
+    with _REPORT_TIMER_LOCK:
+        _REPORT_TIMER["timer"] = None
+    try:
+        print("[REPORT]", refresh_reports())
+    except Exception as e:
+        print("[WARN] report refresh failed:", e)
+
+def schedule_report_refresh() -> bool:
+    """save_catalog 후 호출: REPORT_REFRESH_DELAY_SECONDS 뒤 1회 refresh (이미 예약돼 있으면 합침, 0 이하면 끔)"""
+    if REPORT_REFRESH_DELAY_SECONDS <= 0 or not _s3_configured():
+        return False
+    with _REPORT_TIMER_LOCK:
+        if _REPORT_TIMER["timer"] is not None:
+            return False
+        t = threading.Timer(REPORT_REFRESH_DELAY_SECONDS, _run_scheduled_report_refresh)
+        t.daemon = True
+        _REPORT_TIMER["timer"] = t
+    t.start()
+    return True
+
+def _report_response(key, rev, fmt, filename):
+    obj = s3_client().get_object(Bucket=S3_BUCKET, Key=key)
+    resp = Response(obj["Body"].iter_chunks(65536), mimetype=_REPORT_MIMETYPES[fmt])
+    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    if obj.get("ContentLength") is not None: resp.headers["Content-Length"] = str(obj["ContentLength"])
+    resp.set_etag(rev)
+    return resp.make_conditional(request)
+
+@app.route("/admin/reports")
+def admin_reports():
+    _require_admin()
+    return jsonify({"ok": True, **load_report_index()})
+
+@app.route("/admin/reports/refresh", methods=["POST"])
+def admin_reports_refresh():
+    _require_admin()
+    force = request.args.get("force") == "1"
+    threading.Thread(target=lambda: print("[REPORT]", refresh_reports(force=force, wait=True)), name="report-refresh", daemon=True).start()
+    return jsonify({"ok": True, "started": True, "force": force}), 202
+
+@app.route("/admin/reports/ship/<ship>.<any(docx, xlsx):fmt>")
+@s3_budget_seconds(None)
+@cache_policy("revalidate")
+def admin_report_ship(ship, fmt):
+    """현재 리비전 산출물이 있으면 바로 내려주고, 없으면 이 호선만 생성 후 내려줌"""
+    _require_admin()
+    etag = _head_etag(_catalog_key(ship))
+    if not etag: abort(404)
+    rev = _report_rev(etag, _head_etag(CONTACTS_KEY))
+    key = _report_key(ship, rev, f"report.{fmt}")
+    if not _head_etag(key):
+        refresh_reports(ships=[ship], fleet=False, wait=True)
+        rev = load_report_index()["ships"].get(str(ship), {}).get("rev") or rev
+        key = _report_key(ship, rev, f"report.{fmt}")
+        if not _head_etag(key): abort(503)
+    return _report_response(key, rev, fmt, f"compliance_ship{ship}_{rev}.{fmt}")
+
+@app.route("/admin/reports/fleet.<any(docx, xlsx):fmt>")
+@s3_budget_seconds(None)
+@cache_policy("revalidate")
+def admin_report_fleet(fmt):
+    _require_admin()
+    idx = load_report_index()
+    rev = idx["fleet"].get("rev")
+    contacts_etag = _head_etag(CONTACTS_KEY)
+    current = {_ship_from_catalog_key(o["Key"]): _report_rev(o.get("ETag", ""), contacts_etag) for o in _list_catalog_objects()}
+    if not rev or _fleet_report_rev(current) != rev or not _head_etag(_fleet_report_key(rev, f"fleet.{fmt}")):
+        refresh_reports(wait=True)
+        rev = load_report_index()["fleet"].get("rev")
+        if not rev or not _head_etag(_fleet_report_key(rev, f"fleet.{fmt}")): abort(503)
+    return _report_response(_fleet_report_key(rev, f"fleet.{fmt}"), rev, fmt, f"compliance_fleet_{rev}.{fmt}")
+
+@app.cli.command("build-reports")
+@click.option("--ship", "ships", multiple=True, help="대상 호선 (여러 번 지정 가능, 없으면 전 호선)")
+@click.option("--force", is_flag=True, help="리비전이 같아도 다시 생성")
+def build_reports_command(ships, force):
+    """바뀐 호선의 컴플라이언스 리포트(DOCX/XLSX) + 함대 리포트 생성"""
+    click.echo(json.dumps(refresh_reports(ships=list(ships) or None, force=force, wait=True), ensure_ascii=False, indent=2))
+
+# ================== 방폭/IP 등급 파서 + 컴플라이언스 규칙 엔진 ==================
+# ex_proof_grade / ip_grade 자유 문자열 -> 구조화 필드 (서로 다른 문자열마다 1번만 해석, lru_cache)
+# 규칙은 FleetTable 풀 코드 -> 해석값 lookup 배열로 바꿔 전 항목을 numpy 마스크 연산 한 번에 평가
+# rules/compliance.json = {"rules": [{"id", "category"?, "location"?, "ships"?,
+#                                     "min_gas_group"?, "min_temp_class"?, "min_ip"?, "protection"?}]}
+# - category/location: 대소문자 무시 glob (기본 "*"), protection: 허용 형식 목록 (접두어 일치, "i" -> ia/ib/ic)
+# - 빈 등급은 미입력(기존 리포트의 "미입력")으로 보고 규칙 평가에서 제외, 해석 불가한 값은 위반
+_EX_PROTECTIONS = ("pxb", "pyb", "pzc", "px", "py", "pz", "da", "db", "dc", "eb", "ec", "ia", "ib", "ic",
+                   "ma", "mb", "mc", "na", "nc", "nr", "nl", "ob", "oc", "qb", "sa", "sb", "sc", "ta", "tb", "tc",
+                   "d", "e", "h", "i", "m", "n", "o", "p", "q", "s", "t")     # "i": 구형 표기 (EEx i, 등급 미표기)
+_EX_PROT_BIT = {c: 1 << i for i, c in enumerate(_EX_PROTECTIONS)}
+_EX_PROT_RE = re.compile("|".join(_EX_PROTECTIONS))  # 긴 코드 우선 ("dia" -> d, ia)
+_EX_PROT_TOKEN_RE = re.compile(f"(?:{'|'.join(_EX_PROTECTIONS)})+")
+_EX_MARK_RE = re.compile(r"E?EX")
+_EX_ATEX_RE = re.compile(r"(?<![A-Z])II\s*\(?\s*[123]\s*\)?\s*(?:G\s*/?\s*D|G|D)(?![A-Z])")  # ATEX 기기군/카테고리 "II 2G", "II 2GD"
+_EX_GAS_RE = re.compile(r"(?<![A-Z])II([ABC])?(\s*\+\s*H2)?(?!(?!T\s*[1-6])[A-Z])")  # IIIA~C(분진)는 제외, "IIBT4" 허용
+_EX_DUST_RE = re.compile(r"(?<![A-Z])III[ABC](?![A-Z])")
+_EX_TEMP_RE = re.compile(r"(?:(?<![A-Z0-9])|(?<=II)|(?<=II[ABC])|(?<=H2))T\s*([1-6])(?![0-9])")
+_EX_EPL_RE = re.compile(r"(?<![A-Z0-9])([GDM])([ABC])(?![A-Z0-9])")
+_IP_RE = re.compile(r"IP\s*-?\s*([0-6X][0-9X][KM]?(?:\s*/\s*(?:IP\s*)?[0-6X][0-9X][KM]?)*)(?![0-9])")   # "IP 66/67"
+_IP_PAIR_RE = re.compile(r"([0-6X])([0-9X])")
+_GAS_NAMES = ("II", "IIA", "IIB", "IIB+H2", "IIC")
+_GAS_RANK = {g: i for i, g in enumerate(_GAS_NAMES)}
+
+@lru_cache(maxsize=GRADE_PARSE_CACHE_SIZE)
+def _parse_ex(raw: str) -> dict:
+    """캐시된 결과를 그대로 돌려주므로 수정 금지 (외부에는 parse_ex_grade 사본)"""
+    up = _EX_ATEX_RE.sub(" ", raw.upper())      # "Ex II 2G Ex d IIB T4": 기기군 II를 가스그룹으로 읽지 않게
+    g = _EX_GAS_RE.search(up); t = _EX_TEMP_RE.search(up)
+    found = [m for m in (g, t, _EX_DUST_RE.search(up)) if m]
+    cut = min([m.start() for m in found] or [len(up)])
+    e = _EX_EPL_RE.search(up, max([m.end() for m in found] or [cut]))  # EPL은 그룹/온도등급 뒤
+    marked = _EX_MARK_RE.search(up[:cut]) is not None
+    prot, unknown = [], False
+    for tok in re.sub(r"[^a-z]+", " ", _EX_MARK_RE.sub(" ", up[:cut]).lower()).split() if marked else ():
+        if _EX_PROT_TOKEN_RE.fullmatch(tok): prot.extend(_EX_PROT_RE.findall(tok))
+        else: unknown = True
+    gas = "II" + (g.group(1) or "") + ("+H2" if g and g.group(2) and g.group(1) == "B" else "") if g else ""
+    return {"raw": raw, "ok": marked and bool(prot) and not unknown, "protection": prot,
+            "gas_group": gas, "temp_class": f"T{t.group(1)}" if t else "", "epl": (e.group(1) + e.group(2).lower()) if e else "",
+            "gas_rank": _GAS_RANK.get(gas, -1), "temp_rank": int(t.group(1)) if t else -1,
+            "prot_bits": sum({_EX_PROT_BIT[c] for c in prot})}
+
+@lru_cache(maxsize=GRADE_PARSE_CACHE_SIZE)
+def _parse_ip(raw: str) -> dict:
+    """IP66/IP67, IP 66/67 처럼 여러 개면 자리별 최대값"""
+    ms = [pair for group in _IP_RE.findall(raw.upper()) for pair in _IP_PAIR_RE.findall(group)]
+    solid = max((int(a) for a, _ in ms if a != "X"), default=-1)
+    water = max((int(b) for _, b in ms if b != "X"), default=-1)
+    code = "IP" + (str(solid) if solid >= 0 else "X") + (str(water) if water >= 0 else "X") if ms else ""
+    return {"raw": raw, "ok": bool(ms), "ip": code, "solid": solid, "water": water}
+
+def parse_ex_grade(raw) -> dict:
+    """'Ex d IIB T4 Gb' -> {"ok", "protection": ["d"], "gas_group": "IIB", "temp_class": "T4", "epl": "Gb", ...}"""
+    return copy.deepcopy(_parse_ex(str(raw or "").strip()))
+
+def parse_ip_grade(raw) -> dict:
+    """'IP56' -> {"ok", "ip": "IP56", "solid": 5, "water": 6}"""
+    return dict(_parse_ip(str(raw or "").strip()))
+
+def _compile_compliance_rules(data) -> list:
+    """rules.json -> 평가용 규칙 목록. 잘못된 규칙은 ValueError"""
+    rules = data.get("rules") if isinstance(data, dict) else data
+    if not isinstance(rules, list): raise ValueError("rules must be a list")
+    out, seen = [], set()
+    for i, r in enumerate(rules):
+        if not isinstance(r, dict): raise ValueError(f"rules[{i}] must be an object")
+        rid = str(r.get("id") or f"rule{i + 1}").strip()
+        if rid in seen: raise ValueError(f"duplicate rule id: {rid}")
+        seen.add(rid)
+        c = {"id": rid, "category": str(r.get("category") or "*").strip().lower(), "location": str(r.get("location") or "*").strip().lower(),
+             "ships": sorted({str(x) for x in r["ships"]}) if r.get("ships") else None,
+             "gas": None, "temp": None, "ip": (None, None), "ip_text": "", "prot": 0, "prot_names": []}
+        if r.get("min_gas_group"):
+            c["gas"] = _GAS_RANK.get(re.sub(r"\s+", "", str(r["min_gas_group"]).upper()))
+            if c["gas"] is None: raise ValueError(f"rule {rid}: min_gas_group must be one of {', '.join(_GAS_NAMES)}")
+        if r.get("min_temp_class"):
+            m = re.fullmatch(r"T?([1-6])", str(r["min_temp_class"]).strip().upper())
+            if not m: raise ValueError(f"rule {rid}: min_temp_class must be T1..T6")
+            c["temp"] = int(m.group(1))
+        if r.get("min_ip"):
+            m = re.fullmatch(r"(?:IP)?([0-6X])([0-9X])", str(r["min_ip"]).strip().upper())
+            if not m or m.group(0).endswith("XX"): raise ValueError(f"rule {rid}: min_ip must look like IP56 / IPX6")
+            c["ip"] = tuple(None if d == "X" else int(d) for d in m.groups()); c["ip_text"] = "IP" + "".join(m.groups())
+        for name in r.get("protection") or []:
+            name = str(name).strip().lower()
+            bits = sum(b for code, b in _EX_PROT_BIT.items() if code.startswith(name)) if name else 0
+            if not bits: raise ValueError(f"rule {rid}: unknown protection type '{name}'")
+            c["prot"] |= bits; c["prot_names"].append(name)
+        if c["gas"] is None and c["temp"] is None and c["ip"] == (None, None) and not c["prot"]:
+            raise ValueError(f"rule {rid}: no requirement (min_gas_group / min_temp_class / min_ip / protection)")
+        out.append(c)
+    return out
+
+_COMPLIANCE_RULES = {"at": 0.0, "rules": [], "raw": {"rules": []}}
+
+def load_compliance_rules() -> list:
+    """COMPLIANCE_RULES_TTL 동안 재사용 (이 프로세스의 규칙 저장은 즉시 무효화)"""
+    r = _COMPLIANCE_RULES
+    if time.time() - r["at"] < COMPLIANCE_RULES_TTL:
+        return r["rules"]
+    raw = s3_get_json(COMPLIANCE_RULES_KEY, default={"rules": []})
+    try:
+        rules = _compile_compliance_rules(raw)
+    except ValueError as e:
+        print("[WARN] invalid compliance rules, ignoring:", e)
+        rules = []
+    r.update(rules=rules, raw=raw, at=time.time())
+    return rules
+
+def _grade_rows(t: FleetTable) -> dict:
+    """행별 해석값 배열. 등급 컬럼에 실제 등장한 풀 문자열만 해석 -> 코드 lookup으로 전 행에 펼침"""
+    n = len(t.pool.values); vals = t.pool.values; nonblank = t.pool.nonblank
+    ex_state = np.zeros(n, dtype=np.int8); gas = np.full(n, -1, dtype=np.int8); temp = np.full(n, -1, dtype=np.int8)
+    prot = np.zeros(n, dtype=np.int64)
+    for c in np.unique(t.cols["ex_proof_grade"]).tolist():
+        if not nonblank[c]: continue
+        p = _parse_ex(vals[c].strip())
+        ex_state[c] = 1 if p["ok"] else 2; gas[c] = p["gas_rank"]; temp[c] = p["temp_rank"]; prot[c] = p["prot_bits"]
+    ip_state = np.zeros(n, dtype=np.int8); solid = np.full(n, -1, dtype=np.int8); water = np.full(n, -1, dtype=np.int8)
+    for c in np.unique(t.cols["ip_grade"]).tolist():
+        if not nonblank[c]: continue
+        p = _parse_ip(vals[c].strip())
+        ip_state[c] = 1 if p["ok"] else 2; solid[c] = p["solid"]; water[c] = p["water"]
+    ex = t.cols["ex_proof_grade"]; ip = t.cols["ip_grade"]
+    return {"ex_state": ex_state[ex], "gas": gas[ex], "temp": temp[ex], "prot": prot[ex],
+            "ip_state": ip_state[ip], "solid": solid[ip], "water": water[ip]}
+
+def _pattern_mask(t: FleetTable, codes, pattern: str):
+    if pattern == "*": return np.ones(len(codes), dtype=bool)
+    lut = np.zeros(len(t.pool.values), dtype=bool)
+    for c in np.unique(codes).tolist():
+        lut[c] = fnmatch.fnmatchcase(t.pool.values[c].lower(), pattern)
+    return lut[codes]
+
+def _compliance_reason(r: dict, kind: str, ex: str, ip: str) -> str:
+    if kind == "ex_unparsed": return f"EX 등급 해석 불가 ({ex})"
+    if kind == "ip_unparsed": return f"IP 등급 해석 불가 ({ip})"
+    if kind == "ip": return f"{_parse_ip(ip.strip())['ip']} < {r['ip_text']}"
+    p = _parse_ex(ex.strip())
+    if kind == "gas": return f"가스그룹 {p['gas_group'] or '없음'} < {_GAS_NAMES[r['gas']]}"
+    if kind == "temp": return f"온도등급 {p['temp_class'] or '없음'} < T{r['temp']}"
+    return f"방폭형식 {'/'.join(p['protection'])} 허용 안 됨 ({', '.join(r['prot_names'])})"
+
+def compliance_evaluate(t: FleetTable, rules: list = None, rows: dict = None) -> list:
+    """전 항목 x 규칙 일괄 평가 -> 위반 항목 목록 [{"ship","category","eq",...,"rules","reasons"}]"""
+    rules = load_compliance_rules() if rules is None else rules
+    if not rules or not len(t): return []
+    g = _grade_rows(t) if rows is None else rows
+    alive = ~t.deleted; hits = {}
+    for r in rules:
+        sel = alive & _pattern_mask(t, t.category, r["category"]) & _pattern_mask(t, t.cols["location"], r["location"])
+        if r["ships"] is not None:
+            sel &= np.isin(t.ship, [t.pool.index[s] for s in r["ships"] if s in t.pool.index])
+        checks = []
+        if r["gas"] is not None or r["temp"] is not None or r["prot"]:
+            checks.append(("ex_unparsed", sel & (g["ex_state"] == 2)))
+            ok = sel & (g["ex_state"] == 1)
+            if r["gas"] is not None: checks.append(("gas", ok & (g["gas"] < r["gas"])))
+            if r["temp"] is not None: checks.append(("temp", ok & (g["temp"] < r["temp"])))
+            if r["prot"]: checks.append(("protection", ok & ((g["prot"] & r["prot"]) == 0)))
+        if r["ip"] != (None, None):
+            checks.append(("ip_unparsed", sel & (g["ip_state"] == 2)))
+            bad = np.zeros(len(t), dtype=bool)
+            if r["ip"][0] is not None: bad |= g["solid"] < r["ip"][0]
+            if r["ip"][1] is not None: bad |= g["water"] < r["ip"][1]
+            checks.append(("ip", sel & (g["ip_state"] == 1) & bad))
+        for kind, mask in checks:
+            for i in np.flatnonzero(mask).tolist():
+                hits.setdefault(i, []).append((r, kind))
+    vals = t.pool.values; cols = t.cols; out = []
+    for i in sorted(hits):
+        ex, ip = vals[cols["ex_proof_grade"][i]], vals[cols["ip_grade"][i]]
+        out.append({"ship": vals[t.ship[i]], "category": vals[t.category[i]], "eq": vals[t.eq[i]],
+                    "location": vals[cols["location"][i]], "ex_proof_grade": ex, "ip_grade": ip,
+                    "rules": sorted({r["id"] for r, _ in hits[i]}),
+                    "reasons": [f"{r['id']}: {_compliance_reason(r, kind, ex, ip)}" for r, kind in hits[i]]})
+    return out
+
+def grade_distribution(t: FleetTable, rows: dict = None) -> dict:
+    """전 호선 등급 분포 (삭제 제외) - 가스그룹/온도등급/방폭형식/IP 별 항목 수"""
+    g = _grade_rows(t) if rows is None else rows
+    alive = ~t.deleted
+    ex_ok = alive & (g["ex_state"] == 1); ip_ok = alive & (g["ip_state"] == 1)
+    gas = np.bincount(g["gas"][ex_ok].astype(np.int64) + 1, minlength=len(_GAS_NAMES) + 1)
+    temp = np.bincount(g["temp"][ex_ok].astype(np.int64) + 1, minlength=8)
+    prot = g["prot"][ex_ok]
+    codes, counts = np.unique((g["solid"][ip_ok].astype(np.int64) + 1) * 11 + (g["water"][ip_ok].astype(np.int64) + 1), return_counts=True)
+    ip = {}
+    for code, n in zip(codes.tolist(), counts.tolist()):
+        s_, w_ = divmod(code, 11)
+        ip["IP" + (str(s_ - 1) if s_ else "X") + (str(w_ - 1) if w_ else "X")] = n
+    state = lambda col, m: {"blank": int((m & (g[col] == 0)).sum()), "parsed": int((m & (g[col] == 1)).sum()),
+                            "unparsed": int((m & (g[col] == 2)).sum())}
+    return {"ex": state("ex_state", alive), "ip": state("ip_state", alive),
+            "gas_group": {"없음": int(gas[0]), **{name: int(gas[i + 1]) for i, name in enumerate(_GAS_NAMES)}},
+            "temp_class": {"없음": int(temp[0]), **{f"T{k}": int(temp[k + 1]) for k in range(1, 7)}},
+            "protection": {c: n for c in _EX_PROTECTIONS if (n := int(np.count_nonzero(prot & _EX_PROT_BIT[c])))},
+            "ip_grade": dict(sorted(ip.items()))}
+
+# ---------- 위반 플래그 (data.db, 저장 시 변경 항목만 재평가) ----------
+_COMPLIANCE_READY = False
+
+def _ensure_compliance_tables():
+    global _COMPLIANCE_READY
+    if _COMPLIANCE_READY: return
+    _db().executescript("""
+        CREATE TABLE IF NOT EXISTS compliance_flags (ship TEXT, category TEXT, eq TEXT, rules TEXT, reasons TEXT,
+            flagged_at TEXT, PRIMARY KEY (ship, category, eq));
+    """)
+    _COMPLIANCE_READY = True
+
+def _flag_rows(violations: list) -> list:
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    return [(v["ship"], v["category"], v["eq"], json.dumps(v["rules"], ensure_ascii=False),
+             json.dumps(v["reasons"], ensure_ascii=False), now) for v in violations]
+
+def compliance_flags_apply(ship_number, catalog: dict, changes: list) -> list:
+    """save_catalog 변경분(항목/카테고리)만 규칙 평가 후 플래그 교체 -> 이번 저장으로 생긴 위반 목록"""
+    _ensure_compliance_tables()
+    ship = str(ship_number); touched = {}
+    for ch in changes or []:
+        category, eq = ch.get("category"), ch.get("eq")
+        if eq is None: touched[category] = None
+        elif not str(eq).startswith("__") and touched.get(category, ()) is not None:
+            touched.setdefault(category, set()).add(eq)
+    if not touched: return []
+    sub = {}
+    for category, eqs in touched.items():
+        block = (catalog or {}).get(category)
+        if isinstance(block, dict):
+            sub[category] = {eq: info for eq, info in block.items() if not str(eq).startswith("__") and (eqs is None or eq in eqs)}
+    rules = load_compliance_rules()
+    violations = compliance_evaluate(FleetTable.from_catalogs({ship: sub}), rules) if rules and sub else []
+    conn = _db()
+    with _db_tx(conn):
+        for category, eqs in touched.items():
+            if eqs is None:
+                conn.execute("DELETE FROM compliance_flags WHERE ship = ? AND category = ?", (ship, category))
+            else:
+                conn.executemany("DELETE FROM compliance_flags WHERE ship = ? AND category = ? AND eq = ?", [(ship, category, eq) for eq in eqs])
+        conn.executemany("INSERT OR REPLACE INTO compliance_flags VALUES (?,?,?,?,?,?)", _flag_rows(violations))
+    return violations
+
+def compliance_flags_replace(violations: list):
+    """전 호선 평가 결과로 플래그 전체 교체 (규칙 변경/함대 리포트 생성 시)"""
+    _ensure_compliance_tables()
+    conn = _db()
+    with _db_tx(conn):
+        conn.execute("DELETE FROM compliance_flags")
+        conn.executemany("INSERT INTO compliance_flags VALUES (?,?,?,?,?,?)", _flag_rows(violations))
+
+def compliance_flags_for(ship_number, category=None) -> dict:
+    """(category, eq) -> 위반 사유 목록"""
+    _ensure_compliance_tables()
+    q, args = "SELECT category, eq, reasons FROM compliance_flags WHERE ship = ?", [str(ship_number)]
+    if category is not None: q += " AND category = ?"; args.append(category)
+    return {(c, e): json.loads(r) for c, e, r in _db().execute(q, args)}
+
+def compliance_report(rules: list = None) -> dict:
+    t0 = time.perf_counter()
+    rules = load_compliance_rules() if rules is None else rules
+    # 스캔 실패를 빈 함대로 바꾸지 않음 -> 예외(503)로 끝나고 기존 플래그는 그대로 유지
+    t = FleetTable.from_catalogs(_load_all_catalogs()); rows = _grade_rows(t)
+    violations = compliance_evaluate(t, rules, rows)
+    try:
+        compliance_flags_replace(violations)
+    except Exception as e:
+        print("[WARN] compliance flags refresh failed:", e)
+    by_ship, by_rule = {}, {}
+    for v in violations:
+        by_ship[v["ship"]] = by_ship.get(v["ship"], 0) + 1
+        for rid in v["rules"]: by_rule[rid] = by_rule.get(rid, 0) + 1
+    return {"generated_at": datetime.datetime.now().isoformat(timespec="seconds"), "rules": [r["id"] for r in rules],
+            "items": int(np.count_nonzero(~t.deleted)), "violations": violations, "by_ship": by_ship, "by_rule": by_rule,
+            "grades": grade_distribution(t, rows), "took_ms": round((time.perf_counter() - t0) * 1000.0, 2)}
+
+def _compliance_xlsx(rep: dict) -> bytes:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Violations"); ws.append(["Ship", "System", "Equipment", "Location", "EX-PROOF GRADE", "IP GRADE", "Rules", "Reasons"])
+    for v in rep["violations"]:
+        ws.append([v["ship"], v["category"], v["eq"], v["location"], v["ex_proof_grade"], v["ip_grade"], ", ".join(v["rules"]), "\n".join(v["reasons"])])
+    ws = wb.create_sheet("Grades"); ws.append(["구분", "값", "항목 수"])
+    for section, counts in rep["grades"].items():
+        for k, n in counts.items(): ws.append([section, k, n])
+    return _office_bytes(wb)
+
+@app.route("/admin/compliance")
+@s3_budget_seconds(None)
+def admin_compliance():
+    _require_admin()
+    return jsonify({"ok": True, **compliance_report()})
+
+@app.route("/admin/compliance.xlsx")
+@s3_budget_seconds(None)
+def admin_compliance_xlsx():
+    _require_admin()
+    rep = compliance_report()
+    return send_file(io.BytesIO(_compliance_xlsx(rep)), mimetype=_REPORT_MIMETYPES["xlsx"], as_attachment=True,
+                     download_name=f"compliance_grades_{datetime.datetime.now():%Y%m%d_%H%M}.xlsx")
+
+@app.route("/admin/compliance/rules", methods=["GET", "POST"])
+@s3_budget_seconds(None)
+def admin_compliance_rules():
+    """GET: 현재 규칙 / POST: JSON {"rules": [...]} 검증 후 교체 -> 전 호선 재평가(플래그 갱신)"""
+    _require_admin()
+    if request.method == "GET":
+        return jsonify({"ok": True, **(s3_get_json(COMPLIANCE_RULES_KEY, default=None) or {"rules": []})})
+    body = request.get_json(silent=True)
+    try:
+        rules = _compile_compliance_rules(body)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    s3_put_json(COMPLIANCE_RULES_KEY, {"rules": body.get("rules") if isinstance(body, dict) else body,
+                                       "updated_by": _current_user_email(), "updated_at": datetime.datetime.now().isoformat(timespec="seconds")})
+    rep = compliance_report(rules)
+    return jsonify({"ok": True, "rules": rep["rules"], "violations": len(rep["violations"]), "by_rule": rep["by_rule"]})
+
+@app.route("/api/compliance/flags")
+@login_required
+def api_compliance_flags():
+    ship = request.args.get("ship")
+    if not ship: return jsonify({"ok": False, "error": "ship is required"}), 400
+    flags = compliance_flags_for(ship, request.args.get("category"))
+    return jsonify({"ok": True, "ship": ship, "flags": [{"category": c, "eq": e, "reasons": r} for (c, e), r in sorted(flags.items())]})
+
+@app.cli.command("compliance-check")
+def compliance_check_command():
+    """전 호선 방폭/IP 규칙 평가 (플래그 갱신) + 위반 요약 출력"""
+    rep = compliance_report()
+    click.echo(json.dumps({k: rep[k] for k in ("rules", "items", "by_ship", "by_rule", "grades", "took_ms")}, ensure_ascii=False, indent=2))
+    click.echo(f"violations: {len(rep['violations'])}")
+
+# ---------- Admin: Excel Import ----------
+_EXCEL_COLUMNS = ["Ship","System(Category)","Equipment","QTY","Maker","Type","Cert No.","EX-PROOF GRADE","IP GRADE","PAGE","LOCATION"]
+_EXCEL_HEADER_MAP = {
+    "ship": "ship", "ship number": "ship", "system(category)": "category", "system": "category", "category": "category",
+    "equipment": "eq", "equipment name": "eq", "qty": "qty", "q'ty": "qty", "maker": "maker", "type": "type",
+    "cert no.": "cert_no", "cert no": "cert_no", "cert.no": "cert_no", "ex-proof grade": "ex_proof_grade",
+    "ip grade": "ip_grade", "page": "page", "location": "location",
+}
+
+def _excel_cell_str(v):
+    if v is None: return None
+    if isinstance(v, float) and v.is_integer(): v = int(v)
+    s = str(v).strip()
+    return s if s else None
+
+def iter_excel_rows(fileobj):
+    """
+    read-only 스트리밍으로 (행번호, {ship, category, eq, 필드...}) 생성
+    첫 시트의 첫 비어있지 않은 행을 헤더로 사용 (export_excel과 같은 컬럼명)
+    """
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        cols = None
+        for row_no, values in enumerate(ws.iter_rows(values_only=True), start=1):
+            if cols is None:
+                if not any(v is not None and str(v).strip() for v in values): continue
+                cols = [_EXCEL_HEADER_MAP.get(str(v or "").strip().lower()) for v in values]
+                if not {"ship", "category", "eq"} <= set(cols):
+                    raise ValueError("header must contain Ship, System(Category), Equipment")
+                continue
+            rec = {}
+            for f, v in zip(cols, values):
+                if f: rec[f] = _excel_cell_str(v)
+            if any(rec.values()):
+                yield row_no, rec
+    finally:
+        wb.close()
+
+def _peek_catalog(ship_number):
+    """부수효과 없는 카탈로그 읽기 (load_catalog와 달리 담당자 자동 배정/저장 안 함) -> 없으면 None"""
+    return _load_shared(_catalog_key(ship_number), {}, resolve_contact_refs) or None
+
+def import_excel(fileobj, dry_run=True, actor="admin", report_limit=500, create_ships=False):
+    """
+    엑셀 행을 ship/category/equipment에 매핑해 현재 카탈로그와 비교
+    빈 셀은 '변경 없음'으로 취급. dry_run=False 이면 변경된 호선마다 save_catalog 1회
+    카탈로그가 없는 호선의 행은 create_ships=True 일 때만 반영 (아니면 행 오류, 오타로 호선이 생기지 않게)
+    """
+    catalogs = {}; changed_items = {}; report = []
+    stats = {"rows": 0, "changed": 0, "unchanged": 0, "created": 0, "errors": 0, "new_ships": 0}
+    for row_no, rec in iter_excel_rows(fileobj):
+        stats["rows"] += 1
+        ship, category, eq = rec.get("ship"), rec.get("category"), rec.get("eq")
+        if not (ship and category and eq) or category.startswith("__") or eq.startswith("__"):
+            stats["errors"] += 1
+            if len(report) < report_limit:
+                report.append({"row": row_no, "error": "ship/category/equipment required"})
+            continue
+        if ship not in catalogs:
+            catalogs[ship] = _peek_catalog(ship)
+            if catalogs[ship] is None and create_ships:
+                catalogs[ship] = {}; stats["new_ships"] += 1
+        catalog = catalogs[ship]
+        if catalog is None:
+            stats["errors"] += 1
+            if len(report) < report_limit:
+                report.append({"row": row_no, "error": f"unknown ship {ship} (no catalog; enable create_ships to create it)"})
+            continue
+        block = catalog.get(category)
+        item = block.get(eq) if isinstance(block, dict) else None
+        new = not isinstance(item, dict)
+        values = {f: rec[f] for f in _ITEM_EDIT_FIELDS if rec.get(f) is not None}
+        diff = {f: {"from": ("" if new else (item.get(f) or "")), "to": v} for f, v in values.items()
+                if new or (item.get(f) or "") != v}
+        if not diff and not new:
+            stats["unchanged"] += 1; continue
+        stats["changed"] += 1
+        if new: stats["created"] += 1
+        if len(report) < report_limit:
+            report.append({"row": row_no, "ship": ship, "category": category, "eq": eq, "new": new, "changes": diff})
+        if dry_run:
+            continue
+        _ensure_item(ship, catalog, category, eq, save=False)
+        item = catalog[category][eq]
+        _ensure_item_extended_fields(item)
+        _apply_item_edit(item, values, actor)
+        changed_items.setdefault(ship, []).append((category, eq))
+
+    if not dry_run:
+        for ship, items in changed_items.items():
+            save_catalog(ship, catalogs[ship])
+            append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": actor,"action": "excel_import",
+                                 "ship": ship, "category": "-", "equipment": "-","result": f"items={len(items)}"})
+            for category, eq in items:
+                _publish_item_event("item_edited", ship, category, eq, catalogs[ship])
+    stats["ships"] = sorted(changed_items.keys()) if not dry_run else sorted({r["ship"] for r in report if "ship" in r})
+    return {"ok": True, "dry_run": dry_run, "stats": stats, "report": report, "report_truncated": stats["changed"] + stats["errors"] > len(report)}
+
+@app.route("/admin/import_excel", methods=["POST"])
+@s3_budget_seconds(None)
+def admin_import_excel():
+    _require_admin()
+    f = request.files.get("file")
+    if not f or not f.filename:
+        return jsonify({"ok": False, "error": "file required"}), 400
+    if not f.filename.lower().endswith((".xlsx", ".xlsm")):
+        return jsonify({"ok": False, "error": "only .xlsx files are supported"}), 400
+    dry_run = (request.form.get("dry_run") or "1") in ("1", "true", "on")
+    create_ships = (request.form.get("create_ships") or "") in ("1", "true", "on")
+    try:
+        res = import_excel(f.stream, dry_run=dry_run, actor=session.get("user",{}).get("email","admin"), create_ships=create_ships)
+    except Exception as e:
+        return jsonify({"ok": False, "error": f"import failed: {e}"}), 400
+    return jsonify(res)
+
+# ================== 도면 뷰어 (타일 피라미드 + 포인트 공간 색인) ==================
+# 도면: drawings/{ship}/{drawing_id}/{z}/{x}_{y}.jpg  (z = max_zoom 이 원본 해상도, 한 단계마다 1/2)
+#       drawings/{ship}/index.json = [{"id", "name", "width", "height", "tile_size", "max_zoom", "created"}]
+# 포인트: 항목 locs / 카테고리 __cat_locs__ = [{"x", "y"}] (도면 원본 픽셀 좌표), 도면 = 카테고리 __cat_photo_key__
+# 공간 색인: data.db spatial_points 에 SPATIAL_CELL_SIZE 격자 셀 단위로 저장 -> 뷰포트 셀 범위만 조회
+_SPATIAL_READY = False
+
+def _drawings_prefix(ship_number): return f"{CATALOG_PREFIX}drawings/{ship_number}/"
+
+def load_drawings(ship_number) -> list:
+    d = s3_get_json(_drawings_prefix(ship_number) + "index.json", default=[])
+    return d if isinstance(d, list) else []
+
+def _find_drawing(ship_number, drawing_id):
+    return next((d for d in load_drawings(ship_number) if d.get("id") == drawing_id), None)
+
+def _check_drawing_size(img):
+    w, h = img.size
+    if w * h > VIZ_MAX_PIXELS:
+        raise ValueError(f"도면이 너무 큽니다 ({w}×{h}, 최대 {VIZ_MAX_PIXELS:,} 픽셀)")
+
+def build_drawing_tiles(ship_number, fileobj, name: str, drawing_id: str = None) -> dict:
+    """업로드 도면 -> JPEG 타일 피라미드 생성 후 S3 병렬 업로드, 모든 타일이 올라간 뒤에만 index.json 등록"""
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    img = Image.open(fileobj)
+    _check_drawing_size(img)        # 헤더만 읽은 상태에서 검사 (디코딩 전)
+    img.load()
+    if img.mode != "RGB":
+        bg = Image.new("RGB", img.size, "white")
+        bg.paste(img, mask=img.convert("RGBA").split()[-1] if "A" in img.getbands() else None)
+        img = bg
+    T = VIZ_TILE_SIZE
+    w, h = img.size
+    max_z = max(0, math.ceil(math.log2(max(w, h) / T))) if max(w, h) > T else 0
+    drawing_id = drawing_id or uuid.uuid4().hex[:12]
+    prefix = f"{_drawings_prefix(ship_number)}{drawing_id}/"
+    s3 = s3_client()
+    def _put(args):
+        key, body = args
+        s3.put_object(Bucket=S3_BUCKET, Key=key, Body=body, ContentType="image/jpeg", CacheControl="private, max-age=31536000, immutable")
+    n = 0
+    try:
+        with ThreadPoolExecutor(max_workers=CATALOG_FETCH_THREADS) as pool:
+            futures = []
+            level = img
+            for z in range(max_z, -1, -1):
+                if z != max_z:
+                    level = level.resize((max(1, (level.width + 1) // 2), max(1, (level.height + 1) // 2)), Image.LANCZOS)
+                for ty in range(math.ceil(level.height / T)):
+                    for tx in range(math.ceil(level.width / T)):
+                        buf = io.BytesIO()
+                        level.crop((tx * T, ty * T, min(level.width, (tx + 1) * T), min(level.height, (ty + 1) * T))).save(
+                            buf, "JPEG", quality=VIZ_TILE_QUALITY, optimize=True)
+                        futures.append(pool.submit(_put, (f"{prefix}{z}/{tx}_{ty}.jpg", buf.getvalue())))
+                        n += 1
+            for f in futures: f.result()
+    except Exception:
+        _delete_prefix(prefix)      # 일부만 올라간 타일 정리 (index에는 아직 없음)
+        raise
+    meta = {"id": drawing_id, "name": name, "width": w, "height": h, "tile_size": T, "max_zoom": max_z, "tiles": n,
+            "created": datetime.datetime.now().isoformat(timespec="seconds")}
+    drawings = load_drawings(ship_number); drawings.append(meta)
+    s3_put_json(_drawings_prefix(ship_number) + "index.json", drawings)
+    return meta
+
+def _delete_prefix(prefix):
+    s3 = s3_client()
+    try:
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET, Prefix=prefix):
+            for o in page.get("Contents", []):
+                s3.delete_object(Bucket=S3_BUCKET, Key=o["Key"])
+    except Exception as e:
+        print(f"[WARN] cleanup failed prefix={prefix}: {e}")
+
+# ---------- 도면 업로드 작업 (백그라운드 타일 생성) ----------
+# 요청에서는 크기 검사 + 작업 등록만 하고 바로 응답. 타일이 모두 올라가면 index.json 등록 후 카테고리에 지정
+# 작업 상태는 data.db drawing_jobs (같은 호스트의 모든 worker가 봄)
+_DRAWING_JOBS_READY = False
+_TILE_POOL = None
+_TILE_POOL_LOCK = threading.Lock()
+_DRAWING_JOB_STALE_SECONDS = 3600      # 이보다 오래 queued/running 이면 worker 재시작 등으로 끊긴 것으로 봄
+
+def _ensure_drawing_jobs_table():
+    global _DRAWING_JOBS_READY
+    if _DRAWING_JOBS_READY: return
+    _db().executescript("""
+        CREATE TABLE IF NOT EXISTS drawing_jobs (id TEXT PRIMARY KEY, ship TEXT, category TEXT, name TEXT, actor TEXT,
+            status TEXT, error TEXT, created REAL, finished REAL);
+        CREATE INDEX IF NOT EXISTS idx_drawing_jobs_ship ON drawing_jobs(ship, created);
+    """)
+    _DRAWING_JOBS_READY = True
+
+def _drawing_job_set(job_id, **fields):
+    _ensure_drawing_jobs_table()
+    _db().execute(f"UPDATE drawing_jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?", (*fields.values(), job_id))
+
+def drawing_jobs(ship_number, category=None, limit=10) -> list:
+    _ensure_drawing_jobs_table()
+    sql = "SELECT id, category, name, status, error, created, finished FROM drawing_jobs WHERE ship = ?"
+    args = [str(ship_number)]
+    if category is not None:
+        sql += " AND category = ?"; args.append(category)
+    now = time.time(); out = []
+    for jid, cat, name, status, error, created, finished in _db().execute(sql + " ORDER BY created DESC LIMIT ?", (*args, limit)):
+        if status in ("queued", "running") and now - created > _DRAWING_JOB_STALE_SECONDS:
+            status, error = "failed", error or "interrupted"
+        out.append({"id": jid, "category": cat, "name": name, "status": status, "error": error,
+                    "created": datetime.datetime.fromtimestamp(created).isoformat(timespec="seconds")})
+    return out
+
+def _tile_pool():
+    global _TILE_POOL
+    with _TILE_POOL_LOCK:
+        if _TILE_POOL is None:
+            _TILE_POOL = ThreadPoolExecutor(max_workers=max(1, VIZ_TILE_JOBS), thread_name_prefix="drawing-tiles")
+        return _TILE_POOL
+
+def submit_drawing_upload(ship_number, category, fileobj, name: str, actor: str) -> str:
+    """크기/형식만 검사하고 작업 등록 -> job id (= 완료 후 drawing id)"""
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    data = fileobj.read()
+    _check_drawing_size(Image.open(io.BytesIO(data)))
+    job_id = uuid.uuid4().hex[:12]
+    _ensure_drawing_jobs_table()
+    _db().execute("INSERT INTO drawing_jobs (id, ship, category, name, actor, status, created) VALUES (?,?,?,?,?,?,?)",
+                  (job_id, str(ship_number), category, name, actor, "queued", time.time()))
+    _tile_pool().submit(_run_drawing_job, job_id, str(ship_number), category, data, name, actor)
+    return job_id
+
+def _run_drawing_job(job_id, ship_number, category, data, name, actor):
+    _drawing_job_set(job_id, status="running")
+    try:
+        build_drawing_tiles(ship_number, io.BytesIO(data), name, drawing_id=job_id)
+        catalog = load_catalog(ship_number) or {}
+        if isinstance(catalog.get(category), dict):
+            catalog[category]["__cat_photo_key__"] = job_id
+            save_catalog(ship_number, catalog)
+            append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": actor,"action": "drawing_set",
+                                 "ship": ship_number, "category": category, "equipment": "-","result": job_id})
+        _drawing_job_set(job_id, status="done", finished=time.time())
+    except Exception as e:
+        print(f"[ERROR] drawing tiles failed job={job_id}: {e}")
+        _drawing_job_set(job_id, status="failed", error=str(e)[:500], finished=time.time())
+
+def _ensure_spatial_tables():
+    global _SPATIAL_READY
+    if _SPATIAL_READY: return
+    _db().executescript("""
+        CREATE TABLE IF NOT EXISTS spatial_points (ship TEXT, drawing TEXT, cx INTEGER, cy INTEGER, x REAL, y REAL,
+            category TEXT, eq TEXT, idx INTEGER, status TEXT);
+        CREATE INDEX IF NOT EXISTS idx_spatial_cell ON spatial_points(ship, drawing, cx, cy);
+        CREATE INDEX IF NOT EXISTS idx_spatial_item ON spatial_points(ship, category, eq);
+        CREATE TABLE IF NOT EXISTS spatial_ships (ship TEXT PRIMARY KEY, indexed_at TEXT);
+    """)
+    _SPATIAL_READY = True
+
+def _valid_locs(locs) -> list:
+    out = []
+    for p in locs if isinstance(locs, list) else []:
+        try:
+            out.append((float(p["x"]), float(p["y"])))
+        except (TypeError, KeyError, ValueError):
+            continue
+    return out
+
+def _spatial_index_category(conn, ship, category, block):
+    conn.execute("DELETE FROM spatial_points WHERE ship = ? AND category = ?", (ship, category))
+    if not isinstance(block, dict) or not block.get("__cat_photo_key__"):
+        return
+    drawing = block["__cat_photo_key__"]; C = SPATIAL_CELL_SIZE
+    rows = [(ship, drawing, int(x // C), int(y // C), x, y, category, "__CATEGORY__", i, "")
+            for i, (x, y) in enumerate(_valid_locs(block.get("__cat_locs__")))]
+    for eq, info in block.items():
+        if str(eq).startswith("__") or not isinstance(info, dict) or info.get("__deleted__"): continue
+        st = _recompute_status(info)
+        rows.extend((ship, drawing, int(x // C), int(y // C), x, y, category, eq, i, st)
+                    for i, (x, y) in enumerate(_valid_locs(info.get("locs"))))
+    conn.executemany("INSERT INTO spatial_points (ship, drawing, cx, cy, x, y, category, eq, idx, status) VALUES (?,?,?,?,?,?,?,?,?,?)", rows)
+
+def spatial_index_apply(ship_number, catalog: dict, changes: list):
+    """save_catalog 변경분이 닿은 카테고리만 다시 색인 (처음 보는 호선은 전체)"""
+    _ensure_spatial_tables()
+    conn = _db(); ship = str(ship_number)
+    with _db_tx(conn):
+        if conn.execute("SELECT 1 FROM spatial_ships WHERE ship = ?", (ship,)).fetchone() is None:
+            conn.execute("DELETE FROM spatial_points WHERE ship = ?", (ship,))
+            cats = [c for c, b in catalog.items() if isinstance(b, dict)]
+            conn.execute("INSERT INTO spatial_ships (ship, indexed_at) VALUES (?, ?)", (ship, datetime.datetime.now().isoformat(timespec="seconds")))
+        else:
+            cats = {ch.get("category") for ch in changes or []}
+        for category in cats:
+            _spatial_index_category(conn, ship, category, catalog.get(category))
+
+def _spatial_ensure_ship(ship_number):
+    """아직 색인되지 않은 호선(기능 도입 전 저장분)은 1회 전체 색인"""
+    _ensure_spatial_tables()
+    if _db().execute("SELECT 1 FROM spatial_ships WHERE ship = ?", (str(ship_number),)).fetchone() is None:
+        spatial_index_apply(ship_number, load_catalog(ship_number) or {}, [])
+
+def spatial_query(ship_number, drawing, x0, y0, x1, y1, limit=None) -> dict:
+    """뷰포트(원본 픽셀 좌표) 안 포인트. limit 초과 시 격자 셀별 클러스터(개수/중심)로 반환"""
+    _ensure_spatial_tables()
+    limit = limit or SPATIAL_MAX_POINTS; C = SPATIAL_CELL_SIZE
+    where = "ship = ? AND drawing = ? AND cx BETWEEN ? AND ? AND cy BETWEEN ? AND ? AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?"
+    args = (str(ship_number), drawing, int(x0 // C), int(x1 // C), int(y0 // C), int(y1 // C), x0, x1, y0, y1)
+    conn = _db()
+    n = conn.execute(f"SELECT COUNT(*) FROM spatial_points WHERE {where}", args).fetchone()[0]
+    if n <= limit:
+        cols = ("x", "y", "category", "eq", "idx", "status")
+        pts = [dict(zip(cols, r)) for r in conn.execute(f"SELECT {', '.join(cols)} FROM spatial_points WHERE {where}", args)]
+        return {"mode": "points", "total": n, "points": pts}
+    # 셀 크기를 화면에 맞춰 키워 클러스터 수가 limit 이하가 되도록
+    span = max(x1 - x0, y1 - y0, 1)
+    g = max(1, 2 ** math.ceil(math.log2(span / math.sqrt(limit))))
+    clusters = [{"x": cx_, "y": cy_, "n": k} for cx_, cy_, k in conn.execute(
+        f"SELECT AVG(x), AVG(y), COUNT(*) FROM spatial_points WHERE {where} GROUP BY CAST(x / ? AS INTEGER), CAST(y / ? AS INTEGER)",
+        args + (g, g))]
+    return {"mode": "clusters", "total": n, "cell": g, "clusters": clusters}
+
 @app.route("/viz/manage/<ship_number>/<category>/<eq>")
 def viz_manage(ship_number, category, eq):
-    # 포인트 관리 화면 구현 이전: 일단 Edit로 연결
-    return redirect(url_for("edit", ship_number=ship_number, category=category, eq=eq))
+    catalog = load_catalog(ship_number) or {}
+    block = catalog.get(category)
+    if not isinstance(block, dict) or (eq != "__CATEGORY__" and eq not in block):
+        abort(404)
+    drawing = _find_drawing(ship_number, block.get("__cat_photo_key__") or "")
+    return render_template("viz.html", ship_number=ship_number, category=category, eq=eq, drawing=drawing,
+                           drawings=load_drawings(ship_number), pillow=Image is not None,
+                           jobs=drawing_jobs(ship_number, category, limit=5))
+
+@app.route("/viz/drawing/<ship_number>/<category>", methods=["POST"])
+@s3_budget_seconds(None)
+@login_required
+def viz_drawing_set(ship_number, category):
+    """카테고리 도면 지정: 새 이미지 업로드(타일 생성) 또는 기존 도면 id 선택"""
+    catalog = load_catalog(ship_number) or {}
+    if not isinstance(catalog.get(category), dict):
+        abort(404)
+    f = request.files.get("file")
+    if f and f.filename:
+        # 타일 생성은 백그라운드: 끝나면 도면 등록 + 이 카테고리에 지정
+        try:
+            job_id = submit_drawing_upload(ship_number, category, f.stream, secure_filename(f.filename) or "drawing",
+                                           session.get("user",{}).get("email","guest"))
+        except Exception as e:
+            print("[ERROR] drawing upload rejected:", e)
+            flash(f"도면 처리 실패: {e}")
+            return redirect(request.referrer or url_for("home"))
+        flash(f"도면 업로드 접수 ({job_id}): 타일 생성이 끝나면 이 카테고리에 자동 지정됩니다.")
+        return redirect(request.form.get("next") or url_for("home", ship_number=ship_number, category=category))
+    drawing_id = (request.form.get("drawing_id") or "").strip()
+    if not _find_drawing(ship_number, drawing_id):
+        abort(400)
+    catalog[category]["__cat_photo_key__"] = drawing_id
+    save_catalog(ship_number, catalog)
+    append_activity_log({"ts": datetime.datetime.now().isoformat(),"actor": session.get("user",{}).get("email","guest"),
+                         "action": "drawing_set","ship": ship_number, "category": category, "equipment": "-","result": drawing_id})
+    return redirect(request.form.get("next") or url_for("home", ship_number=ship_number, category=category))
+
+@app.route("/viz/tile/<ship_number>/<drawing>/<int:z>/<int:x>/<int:y>.jpg")
+@cache_policy("view")
+def viz_tile(ship_number, drawing, z, x, y):
+    """200만 장기 캐시(immutable). 없는 타일 404 / 저장소 장애 503 은 캐시 금지 (장애가 브라우저에 1년 남지 않게)"""
+    key = f"{_drawings_prefix(ship_number)}{secure_filename(drawing)}/{z}/{x}_{y}.jpg"
+    try:
+        body = s3_client().get_object(Bucket=S3_BUCKET, Key=key)["Body"].read()
+    except Exception as e:
+        if _s3_missing(e):
+            return Response(status=404, headers=_CACHE_POLICIES["no-store"])
+        if not _s3_transient(e):
+            raise
+        print(f"[WARN] tile fetch failed key={key}: {e}")
+        return Response(status=503, headers={**_CACHE_POLICIES["no-store"], "Retry-After": str(int(S3_BREAKER_COOLDOWN_SECONDS))})
+    return Response(body, mimetype="image/jpeg", headers=_CACHE_POLICIES["private-immutable"])
+
+@app.route("/api/viz/<ship_number>/<drawing>/points")
+@login_required
+def api_viz_points(ship_number, drawing):
+    """?bbox=x0,y0,x1,y1 (도면 원본 픽셀 좌표)"""
+    try:
+        x0, y0, x1, y1 = (float(v) for v in (request.args.get("bbox") or "").split(","))
+    except ValueError:
+        return jsonify({"ok": False, "error": "bbox=x0,y0,x1,y1 required"}), 400
+    t0 = time.perf_counter()
+    _spatial_ensure_ship(ship_number)
+    res = spatial_query(ship_number, drawing, min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    return jsonify({"ok": True, **res, "took_ms": round((time.perf_counter() - t0) * 1000, 2)})
+
+@app.route("/api/viz/<ship_number>/<category>/<eq>/points", methods=["POST"])
+@login_required
+def api_viz_point_edit(ship_number, category, eq):
+    """{"op": "add", "x", "y"} | {"op": "remove", "idx"} -> 항목(eq=__CATEGORY__ 이면 카테고리) 포인트 수정"""
+    p = request.get_json(silent=True) or {}
+    catalog = load_catalog(ship_number) or {}
+    block = catalog.get(category)
+    if not isinstance(block, dict) or not block.get("__cat_photo_key__"):
+        return jsonify({"ok": False, "error": "category has no drawing"}), 400
+    if eq == "__CATEGORY__":
+        locs = block.setdefault("__cat_locs__", [])
+    elif isinstance(block.get(eq), dict):
+        locs = block[eq].setdefault("locs", [])
+    else:
+        return jsonify({"ok": False, "error": "unknown equipment"}), 404
+    if p.get("op") == "add":
+        try:
+            locs.append({"x": round(float(p["x"]), 1), "y": round(float(p["y"]), 1)})
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"ok": False, "error": "x, y required"}), 400
+    elif p.get("op") == "remove" and isinstance(p.get("idx"), int) and 0 <= p["idx"] < len(locs):
+        locs.pop(p["idx"])
+    else:
+        return jsonify({"ok": False, "error": "invalid op"}), 400
+    save_catalog(ship_number, catalog)
+    return jsonify({"ok": True, "locs": locs})
 
 # ---------- 진단/헬스 ----------
 def _require_token():
@@ -1449,15 +5343,161 @@ def diag_s3_put():
     except Exception as e:
         return jsonify({"ok": False, "error": str(e), "key": key}), 500
 
+@app.route("/diag/serialization")
+def diag_serialization():
+    """카탈로그/연락처 JSON의 포맷별 바이트 크기·인코딩/디코딩 시간 리포트"""
+    if not _require_token(): return jsonify({"ok": False, "error": "unauthorized"}), 401
+    docs = {}
+    for rel in ("config/equipment_catalog.json", "static/config/equipment_catlog.json"):
+        path = os.path.join(app.root_path, rel)
+        try:
+            with open(path, "rb") as f: docs["local:" + rel] = json_loads_bytes(f.read())
+        except Exception:
+            pass
+    try:
+        for sh, catalog in _load_all_catalogs().items():
+            docs[_catalog_key(sh)] = catalog
+        docs[CONTACTS_KEY] = get_contacts()
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify({"ok": True, "gzip_enabled": S3_JSON_GZIP, **serialization_report(docs)})
+
+@app.route("/diag/s3/resilience")
+def diag_s3_resilience():
+    """서킷 브레이커 상태, hedge 횟수/승리, 최근 GET 지연(p50/p95)"""
+    if not _require_token(): return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({"ok": True, **s3_resilience_stats()})
+
+@app.route("/diag/singleflight")
+def diag_singleflight():
+    """load_catalog / get_contacts 실제 S3 fetch(issued) 대비 합쳐진 요청(coalesced) 수"""
+    if not _require_token(): return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({"ok": True, "pid": os.getpid(), **_SINGLE_FLIGHT.stats()})
+
+@app.route("/diag/cache")
+def diag_cache():
+    """공유 캐시 항목 수/크기/적중률 (모든 worker 합산)"""
+    if not _require_token(): return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({"ok": True, "enabled": SHARED_CACHE_ENABLED, **shared_cache_stats()})
+
+@app.route("/diag/compression")
+def diag_compression():
+    """압축 전/후 바이트, 스트리밍 응답의 평균 첫 바이트 시간(ms) (worker 프로세스별)"""
+    if not _require_token(): return jsonify({"ok": False, "error": "unauthorized"}), 401
+    with _COMPRESS_LOCK:
+        s = dict(_COMPRESS_STATS, by_encoding=dict(_COMPRESS_STATS["by_encoding"]))
+    s["saved_pct"] = round(100.0 * (1 - s["bytes_out"] / s["bytes_in"]), 1) if s["bytes_in"] else 0.0
+    s["avg_ttfb_ms"] = round(s.pop("ttfb_ms_sum") / s["streamed"], 1) if s["streamed"] else None
+    return jsonify({"ok": True, "pid": os.getpid(), "brotli": brotli is not None, **s})
+
+# ---------- 부트 워밍업 / readiness ----------
+# gunicorn worker 기동 직후(gunicorn.conf.py post_worker_init) 백그라운드로 실행:
+# S3/SMTP 연결 예열, 카탈로그 미러·연락처·색인 로드, 템플릿 컴파일, 정적 파일 해시.
+# /ready 는 진행 상황과 저장소 지연을 보고하고, 끝나기 전에는 503 (Render health check 경로로 사용)
+_WARMUP = {"started_at": None, "finished_at": None, "steps": {}}
+_WARMUP_LOCK = threading.Lock()
+
+def _s3_configured() -> bool:
+    return bool(S3_BUCKET and AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and S3_REGION)
+
+def _warm_s3():
+    s3_client().head_bucket(Bucket=S3_BUCKET)
+
+def _warm_smtp():
+    with smtplib.SMTP(SMTP_SERVER, timeout=5) as s:
+        s.noop()
+
+def _warm_templates():
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+
+def _warm_static():
+    for root, _, files in os.walk(app.static_folder):
+        for fn in files:
+            asset_hash(os.path.relpath(os.path.join(root, fn), app.static_folder).replace(os.sep, "/"))
+
+def _warm_catalog_cache():
+    keys = [o["Key"] for o in _list_catalog_objects()]
+    with ThreadPoolExecutor(max_workers=CATALOG_FETCH_THREADS) as pool:
+        list(pool.map(lambda k: s3_get_json_cached(k, default=None), keys))
+
+def _warm_search():
+    if not _search_index_built():
+        search_index_rebuild()
+
+_WARMUP_STEPS = [
+    ("s3_connect", _warm_s3, True),
+    ("smtp_connect", _warm_smtp, False),
+    ("contacts", get_contacts, True),
+    ("catalog_cache", _warm_catalog_cache, True),
+    ("catalog_mirror", mirror_reconcile, True),
+    ("search_index", _warm_search, True),
+    ("suggest_index", lambda: _SUGGEST.built_at or suggest_index_rebuild(), True),
+    ("templates", _warm_templates, False),
+    ("static_assets", _warm_static, False),
+]
+
+def run_warmup():
+    """(name, fn, S3 필요 여부) 순서대로 실행. 실패해도 다음 단계 진행"""
+    _WARMUP["started_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    for name, _, _ in _WARMUP_STEPS:
+        _WARMUP["steps"][name] = {"status": "pending"}
+    for name, fn, needs_s3 in _WARMUP_STEPS:
+        st = _WARMUP["steps"][name]
+        if needs_s3 and not _s3_configured():
+            st["status"] = "skipped"; continue
+        st["status"] = "running"
+        t0 = time.perf_counter()
+        try:
+            fn()
+            st["status"] = "ok"
+        except Exception as e:
+            st["status"] = "error"; st["error"] = str(e)
+            print(f"[WARMUP] {name} failed: {e}")
+        st["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    _WARMUP["finished_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    print("[WARMUP] done:", {k: v["status"] for k, v in _WARMUP["steps"].items()})
+
+def start_warmup():
+    """프로세스당 1회, 데몬 스레드로 시작 (요청 처리는 바로 가능)"""
+    with _WARMUP_LOCK:
+        if _WARMUP["started_at"] is not None:
+            return False
+        _WARMUP["started_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()
+    start_digest_flusher()
+    return True
+
+@app.route("/ready")
+def ready():
+    """워밍업 완료 + S3 응답 시 200, 아니면 503. storage_ms = 연락처 HEAD 왕복 시간"""
+    storage = {"ok": False, "ms": None}
+    if _s3_configured():
+        t0 = time.perf_counter()
+        try:
+            s3_client().head_object(Bucket=S3_BUCKET, Key=CONTACTS_KEY)
+            storage["ok"] = True
+        except ClientError as e:
+            storage["ok"] = e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey")
+            if not storage["ok"]: storage["error"] = str(e)
+        except Exception as e:
+            storage["error"] = str(e)
+        storage["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    steps = _WARMUP["steps"]
+    done = _WARMUP["finished_at"] is not None
+    critical_ok = all(steps.get(n, {}).get("status") in ("ok", "skipped") for n, _, needs_s3 in _WARMUP_STEPS if needs_s3)
+    is_ready = done and critical_ok and (storage["ok"] or not _s3_configured())
+    return jsonify({"ready": is_ready, "pid": os.getpid(), "started_at": _WARMUP["started_at"],
+                    "finished_at": _WARMUP["finished_at"], "progress": f"{sum(1 for s in steps.values() if s['status'] not in ('pending', 'running'))}/{len(_WARMUP_STEPS)}",
+                    "steps": steps, "storage": storage}), (200 if is_ready else 503)
+
 @app.route("/health")
+@cache_policy("revalidate")
 def health():
     return "ok", 200
 
 if __name__ == "__main__":
-    def _s3_ready():
-        return bool(S3_BUCKET and AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY and S3_REGION)
-
-    if _s3_ready():
+    if _s3_configured():
         seed_contacts()
         cleanup_contacts_unified_email()
         update_catalog_responsibles()
@@ -1467,5 +5507,6 @@ if __name__ == "__main__":
     else:
         print("[WARN] S3 env not set or partial. Skipping contacts/catalog cleanup.")
 
+    start_warmup()
     print("[BOOT] S3_BUCKET=", S3_BUCKET, " S3_REGION=", S3_REGION, " PREFIX=", CATALOG_PREFIX, " AUTO_CREATE_CATALOG=", AUTO_CREATE_CATALOG, " ADMIN_ENABLED=", ADMIN_ENABLED, " AUTO_QTY_ENABLED=", AUTO_QTY_ENABLED)
     app.run(host="0.0.0.0", port=5000, debug=True)
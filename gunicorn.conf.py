@@ -0,0 +1,13 @@
+# gunicorn이 작업 디렉터리의 이 파일을 자동으로 읽음 (Procfile: gunicorn app:app)
+import os
+
+# 관리자 실시간 갱신(SSE /admin/events)은 연결당 최대 SSE_MAX_SECONDS 동안 요청 1개를 점유
+# -> sync worker 대신 스레드 worker: SSE는 스레드 1개만 잡고 나머지 스레드/worker가 일반 요청 처리
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+def post_worker_init(worker):
+    # worker마다 S3/SMTP 연결 예열 + 카탈로그/연락처/색인/템플릿 로드 (진행 상황: /ready)
+    from app import start_warmup
+    start_warmup()
@@ -1,4 +1,5 @@
-import os, boto3, json, smtplib, time, datetime
+import os, boto3, json, smtplib, time, datetime, argparse
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.utils import formataddr
 from dotenv import load_dotenv
@@ -15,6 +16,16 @@ S3_BUCKET = os.getenv("S3_BUCKET")
 S3_REGION = os.getenv("S3_REGION", "ap-northeast-2")
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+SUBMISSIONS_PREFIX = os.getenv("SUBMISSIONS_PREFIX", "submissions/")
+
+# ================== 스케줄러 설정 ==================
+# cron 형식: "분 시 일 월 요일" (기본: 매일 16:00)
+WORKER_CRON = os.getenv("WORKER_CRON", "0 16 * * *")
+# 마지막 실행 시각 + S3 객체 manifest(ETag/LastModified/파싱결과) 저장 파일
+WORKER_STATE_FILE = os.getenv("WORKER_STATE_FILE", "worker_state.json")
+WORKER_FETCH_THREADS = int(os.getenv("WORKER_FETCH_THREADS", "8"))
+# 놓친 실행을 따라잡는 최대 기간(시간). 이보다 오래된 누락분은 무시
+WORKER_CATCHUP_HOURS = int(os.getenv("WORKER_CATCHUP_HOURS", "24"))
 
 s3 = boto3.client(
     "s3",
@@ -41,31 +52,161 @@ def send_mail(to_addr, subject, body):
         server.sendmail(FROM_ADDR, [to_addr], msg.as_string())
         print(f"메일 전송 성공 → {to_addr}")
 
-# ================== S3 파일 확인 후 메일 전송 ==================
-def process_and_send():
-    resp = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix="submissions/")
-    if "Contents" not in resp:
-        print("DEBUG: submissions/ 없음")
-        return
+# ================== cron 트리거 ==================
+def _parse_cron_field(expr, lo, hi):
+    """'*', '5', '1,3', '9-17', '*/15', '0-30/5', '5/10'(=5-hi/10) -> 허용 값 set"""
+    out = set()
+    for part in expr.split(","):
+        step = 1
+        stepped = "/" in part
+        if stepped:
+            part, step_s = part.split("/", 1)
+            step = int(step_s)
+        if part in ("*", ""):
+            start, end = lo, hi
+        elif "-" in part:
+            a, b = part.split("-", 1)
+            start, end = int(a), int(b)
+        else:
+            start = int(part)
+            end = hi if stepped else start
+        if start < lo or end > hi or start > end or step < 1:
+            raise ValueError(f"invalid cron field: {expr}")
+        out.update(range(start, end + 1, step))
+    return out
 
-    # 담당자별 미입력 장비 모으기
-    pending_by_person = {p["email"]: [] for p in responsibles}
+class CronTrigger:
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr}")
+        self.expr = expr
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours   = _parse_cron_field(fields[1], 0, 23)
+        self.days    = _parse_cron_field(fields[2], 1, 31)
+        self.months  = _parse_cron_field(fields[3], 1, 12)
+        # 요일: 0=일요일 (7도 일요일로 허용)
+        self.weekdays = {d % 7 for d in _parse_cron_field(fields[4], 0, 7)}
+        # 표준 cron: 일/요일이 둘 다 제한('*'로 시작하지 않음)이면 OR, 아니면 제한된 쪽만 적용
+        self.day_or = not fields[2].startswith("*") and not fields[4].startswith("*")
 
-    for obj in resp["Contents"]:
-        if not obj["Key"].endswith(".json"):
-            continue
+    def _day_matches(self, t):
+        dom = t.day in self.days
+        dow = ((t.weekday() + 1) % 7) in self.weekdays
+        return (dom or dow) if self.day_or else (dom and dow)
+
+    def next_after(self, t):
+        """t 이후(초과) 첫 실행 시각"""
+        t = t.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = t + datetime.timedelta(days=366)
+        while t < limit:
+            if t.month not in self.months or not self._day_matches(t):
+                t = (t + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if t.hour not in self.hours:
+                t = (t + datetime.timedelta(hours=1)).replace(minute=0)
+                continue
+            if t.minute in self.minutes:
+                return t
+            t += datetime.timedelta(minutes=1)
+        raise ValueError(f"cron expression never fires: {self.expr}")
+
+    def missed_between(self, last_run, now):
+        """(last_run, now] 구간에서 놓친 가장 최근 실행 시각 (없으면 None)"""
+        if last_run is None:
+            return None
+        last_run = max(last_run, now - datetime.timedelta(hours=WORKER_CATCHUP_HOURS))
+        missed = None
+        t = self.next_after(last_run)
+        while t <= now:
+            missed = t
+            t = self.next_after(t)
+        return missed
 
-        data = s3.get_object(Bucket=S3_BUCKET, Key=obj["Key"])["Body"].read()
-        rows = json.loads(data)
+# ================== 상태/manifest ==================
+def load_state():
+    try:
+        with open(WORKER_STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception:
+        state = {}
+    state.setdefault("last_run", None)
+    state.setdefault("manifest", {})
+    # 실행(예정 시각)별 이미 발송한 수신자 -> 중간 실패 후 재시도 때 중복 발송 방지
+    state.setdefault("sent", {"run": None, "emails": []})
+    return state
 
-        for row in rows:
-            if row.get("status") != "done":  # 미입력 상태
-                person = row["responsible"]["email"]
+def save_state(state):
+    tmp = WORKER_STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, WORKER_STATE_FILE)
+
+def _list_submission_objects():
+    """페이지네이션으로 submissions/ 전체 목록"""
+    out = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET, Prefix=SUBMISSIONS_PREFIX):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith(".json"):
+                out.append(obj)
+    return out
+
+def _fetch_rows(key):
+    data = s3.get_object(Bucket=S3_BUCKET, Key=key)["Body"].read()
+    rows = json.loads(data)
+    return rows if isinstance(rows, list) else []
+
+def scan_submissions(manifest):
+    """
+    변경된 객체(ETag/LastModified 기준)만 병렬로 다시 읽고, 나머지는 manifest의 파싱 결과 재사용
+    -> (rows 전체, 새 manifest, 통계)
+    """
+    objects = _list_submission_objects()
+    new_manifest = {}
+    changed = []
+    for obj in objects:
+        key = obj["Key"]
+        etag = obj.get("ETag", "")
+        lm = obj["LastModified"].isoformat() if hasattr(obj.get("LastModified"), "isoformat") else str(obj.get("LastModified", ""))
+        prev = manifest.get(key)
+        if prev and prev.get("etag") == etag and prev.get("last_modified") == lm:
+            new_manifest[key] = prev
+        else:
+            new_manifest[key] = {"etag": etag, "last_modified": lm, "rows": []}
+            changed.append(key)
+
+    errors = 0
+    if changed:
+        with ThreadPoolExecutor(max_workers=WORKER_FETCH_THREADS) as pool:
+            for key, fut in [(k, pool.submit(_fetch_rows, k)) for k in changed]:
+                try:
+                    new_manifest[key]["rows"] = fut.result()
+                except Exception as e:
+                    errors += 1
+                    print(f"[WARN] {key} 읽기 실패: {e}")
+                    # 다음 실행에서 다시 읽도록 etag 비움
+                    new_manifest[key]["etag"] = ""
+
+    rows = []
+    for key in sorted(new_manifest):
+        rows.extend(new_manifest[key]["rows"])
+    stats = {"objects": len(objects), "fetched": len(changed), "reused": len(objects) - len(changed), "errors": errors}
+    return rows, new_manifest, stats
+
+# ================== S3 파일 확인 후 메일 전송 ==================
+def build_pending_mails(rows):
+    # 담당자별 미입력 장비 모으기
+    pending_by_person = {p["email"]: [] for p in responsibles}
+    for row in rows:
+        if row.get("status") != "done":  # 미입력 상태
+            person = ((row.get("responsible") or {}).get("email") or "")
+            if person in pending_by_person:
                 pending_by_person[person].append(
                     (row.get("ship_number"), row.get("category"), row.get("equipment_name"))
                 )
 
-    # 담당자별 메일 발송 (중복 없이)
+    # 담당자별 메일 (중복 없이)
+    mails = []
     for person in responsibles:
         email = person["email"]
         tasks = pending_by_person[email]
@@ -77,15 +218,84 @@ def process_and_send():
         for ship, cat, eq in tasks:
             body += f"- Ship {ship} / {cat} / {eq}\n"
         body += "\n이 메일은 매일 오후 4시에 자동 발송됩니다.\n감사합니다."
+        mails.append((email, subject, body, len(tasks)))
+    return mails
 
+def process_and_send(state=None, dry_run=False, run_id=None):
+    """run_id: 같은 실행의 재시도면 state["sent"]에 기록된 수신자는 건너뜀"""
+    state = state if state is not None else load_state()
+    t0 = time.perf_counter()
+    rows, manifest, stats = scan_submissions(state.get("manifest") or {})
+    scan_sec = time.perf_counter() - t0
+    state["manifest"] = manifest
+    print(f"[SCAN] objects={stats['objects']} fetched={stats['fetched']} reused={stats['reused']} "
+          f"errors={stats['errors']} rows={len(rows)} ({scan_sec:.2f}s)")
+    if stats["errors"] and not dry_run:
+        # 일부만 읽힌 상태로 보내면 빠진 객체의 담당자는 그날 알림을 못 받음 -> 실패로 끝내 같은 run_id로 재시도
+        save_state(state)
+        raise RuntimeError(f"{stats['errors']} submission objects could not be read; not sending")
+
+    mails = build_pending_mails(rows)
+    sent = state["sent"] if run_id is not None and state["sent"].get("run") == run_id else {"run": run_id, "emails": []}
+    skipped = 0
+    for email, subject, body, n in mails:
+        if dry_run:
+            print(f"[DRY-RUN] → {email}: 미입력 {n}건")
+            continue
+        if email in sent["emails"]:
+            skipped += 1
+            continue
         send_mail(email, subject, body)
+        if run_id is not None:
+            sent["emails"].append(email)
+            state["sent"] = sent
+            save_state(state)  # 발송 직후 기록 (다음 수신자에서 실패해도 재시도 때 건너뜀)
+    return {"scan_sec": round(scan_sec, 3), "mails": len(mails), "skipped": skipped, **stats}
 
 # ================== 메인 루프 ==================
-if __name__ == "__main__":
-    print("Local Worker 실행 중 (매일 16:00 자동 발송) ...")
+def run_scheduled(trigger, state, now, dry_run=False, run_id=None):
+    """1회 실행. dry-run이 아니면 last_run 기록 (manifest는 항상 갱신). 읽기 실패가 있으면 예외 -> last_run 미기록"""
+    process_and_send(state, dry_run=dry_run, run_id=run_id)
+    if not dry_run:
+        state["last_run"] = now.isoformat()
+    save_state(state)
+
+def main():
+    ap = argparse.ArgumentParser(description="미입력 장비 자동 알림 워커")
+    ap.add_argument("--once", action="store_true", help="스케줄 무시하고 즉시 1회 실행")
+    ap.add_argument("--dry-run", action="store_true", help="메일은 보내지 않고 대상/스캔 시간만 출력")
+    ap.add_argument("--cron", default=WORKER_CRON, help="cron 표현식 (기본: WORKER_CRON)")
+    args = ap.parse_args()
+
+    trigger = CronTrigger(args.cron)
+    state = load_state()
+
+    if args.once or args.dry_run:
+        run_scheduled(trigger, state, datetime.datetime.now(), dry_run=args.dry_run)
+        return
+
+    print(f"Local Worker 실행 중 (cron='{trigger.expr}') ...")
+    started = datetime.datetime.now()
     while True:
         now = datetime.datetime.now()
-        if now.hour == 16 and now.minute == 0:  # 오후 4시 정각
-            process_and_send()
-            time.sleep(60)  # 중복 발송 방지 (1분 대기)
-        time.sleep(5)
+        # 처음 기동(상태 없음)이면 기동 시각 이후만 대상, 이후엔 마지막 성공 실행 이후 누락분을 따라잡음
+        since = datetime.datetime.fromisoformat(state["last_run"]) if state.get("last_run") else started
+        missed = trigger.missed_between(since, now)
+        if missed:
+            if (now - missed).total_seconds() >= 60:
+                print(f"[CATCH-UP] 놓친 실행 {missed.isoformat()} → 지금 실행")
+            try:
+                run_scheduled(trigger, state, now, run_id=missed.isoformat())
+            except Exception as e:
+                # last_run 미기록 → 60초 뒤 재시도 (WORKER_CATCHUP_HOURS 이내)
+                print("[ERROR] 실행 실패:", e)
+                time.sleep(60)
+            continue
+        nxt = trigger.next_after(now)
+        print(f"[NEXT] {nxt.isoformat()}")
+        # busy-poll 대신 다음 실행 시각까지 sleep (시계 변경/절전 복귀 대비 최대 60초 단위)
+        while datetime.datetime.now() < nxt:
+            time.sleep(min(60.0, max(0.5, (nxt - datetime.datetime.now()).total_seconds())))
+
+if __name__ == "__main__":
+    main()